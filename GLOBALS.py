@@ -7,4 +7,8 @@ Import this module to access these values in any other module.
 
 # Week layout constants
 WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-HOUR_HEIGHT = 4
\ No newline at end of file
+HOUR_HEIGHT = 4
+# minutes that start and end of events are rounded to in the week view
+RESOLUTION_MINUTES = 15
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
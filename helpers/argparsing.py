@@ -3,6 +3,10 @@ import sys
 from pathlib import Path
 from datetime import datetime
 from helpers import general_helpers as gh
+from helpers.caldav_sync import CalDavCalendar
+from helpers.feeds import Feed
+from helpers.sqlite_store import is_sqlite
+from helpers import timezones as tz
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -24,7 +28,7 @@ Date format examples:
     parser.add_argument(
         'ical_path',
         type=str,
-        help='Path to the .ical/.ics calendar file'
+        help='Path to the .ical/.ics calendar file, or to an SQLite calendar (.sqlite/.db, created if missing)'
     )
     
     parser.add_argument(
@@ -34,25 +38,151 @@ Date format examples:
         default=datetime.now().strftime('%Y-%m-%d'),
         help='Date to display the week for (various formats supported). Defaults to today.'
     )
+
+    parser.add_argument(
+        '-c', '--calendar',
+        type=str,
+        action='append',
+        default=[],
+        dest='calendars',
+        help='Path to another .ics calendar file to show alongside the first one. Can be given multiple times.'
+    )
+
+    parser.add_argument(
+        '--caldav',
+        type=str,
+        action='append',
+        default=[],
+        metavar='URL',
+        help='URL of a CalDAV calendar to show alongside the files, synced in the background. '
+             'The user name and password are read from the URL or from ~/.netrc. Can be given multiple times.'
+    )
+
+    parser.add_argument(
+        '--feed',
+        type=str,
+        action='append',
+        default=[],
+        dest='feeds',
+        metavar='URL',
+        help='URL of an .ics calendar to subscribe to (http, https or webcal), downloaded again in the background '
+             'when it changed. Can be given multiple times.'
+    )
+
+    parser.add_argument(
+        '--import-ics',
+        type=str,
+        default=None,
+        metavar='ICS',
+        help='Import the events of an .ics file into the SQLite calendar before starting, '
+             'replacing the events with the same UIDs.'
+    )
+
+    parser.add_argument(
+        '--export-ics',
+        type=str,
+        default=None,
+        metavar='ICS',
+        help='Write the SQLite calendar to an .ics file and exit.'
+    )
+
+    parser.add_argument(
+        '--timezone',
+        type=str,
+        default=None,
+        help='Time zone to show the calendar in, e.g. Europe/Berlin. Defaults to the local time zone.'
+    )
+
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        help='Memory-map the calendar and only parse the events of the shown week. '
+             'Uses much less memory for very large files.'
+    )
+
+    parser.add_argument(
+        '--canvas',
+        action='store_true',
+        help='Paint the week on a single canvas instead of a widget per event. '
+             'Much faster for weeks with hundreds of events.'
+    )
     
     return parser.parse_args()
 
 
 def validate_arguments(args):
     """Validate the parsed arguments."""
-    # Validate iCal file path
-    ics_path = Path(args.ical_path)
-    if not ics_path.exists():
-        print(f"Error: iCal file '{ics_path}' does not exist.", file=sys.stderr)
+    # Validate iCal file paths
+    ics_paths = [Path(path) for path in [args.ical_path, *args.calendars]]
+    for ics_path in ics_paths:
+        if is_sqlite(ics_path):
+            # SQLite calendars are created on first use
+            if ics_path.exists() and not ics_path.is_file():
+                print(f"Error: '{ics_path}' is not a file.", file=sys.stderr)
+                sys.exit(1)
+            continue
+
+        if not ics_path.exists():
+            print(f"Error: iCal file '{ics_path}' does not exist.", file=sys.stderr)
+            sys.exit(1)
+
+        if not ics_path.is_file():
+            print(f"Error: '{ics_path}' is not a file.", file=sys.stderr)
+            sys.exit(1)
+
+        if not ics_path.suffix.lower() in ['.ics', '.ical']:
+            print(f"Warning: '{ics_path}' does not have a typical iCal extension (.ics or .ical)")
+
+    if (args.import_ics or args.export_ics) and not is_sqlite(ics_paths[0]):
+        print("Error: --import-ics and --export-ics need an SQLite calendar (.sqlite/.db) as first calendar.",
+              file=sys.stderr)
         sys.exit(1)
-    
-    if not ics_path.is_file():
-        print(f"Error: '{ics_path}' is not a file.", file=sys.stderr)
+    if args.import_ics and not Path(args.import_ics).is_file():
+        print(f"Error: iCal file '{args.import_ics}' does not exist.", file=sys.stderr)
+        sys.exit(1)
+
+    # CalDAV calendars are shown from local mirrors
+    remotes = []
+    for url in args.caldav:
+        try:
+            remotes.append(CalDavCalendar(url))
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    for remote in remotes:
+        try:
+            remote.prepare()
+        except OSError as e:
+            print(f"Error: can't create the mirror of '{remote.url}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+    # subscribed calendars are shown from their last download
+    feeds = []
+    for url in args.feeds:
+        try:
+            feeds.append(Feed(url))
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    for feed in feeds:
+        try:
+            feed.prepare()
+        except OSError as e:
+            print(f"Error: can't create the download of '{feed.url}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+    all_paths = [*ics_paths, *(remote.path for remote in remotes), *(feed.path for feed in feeds)]
+    if len(set(path.resolve() for path in all_paths)) < len(all_paths):
+        print("Error: the same calendar is given more than once.", file=sys.stderr)
         sys.exit(1)
     
-    if not ics_path.suffix.lower() in ['.ics', '.ical']:
-        print(f"Warning: '{ics_path}' does not have a typical iCal extension (.ics or .ical)")
-    
+    # Validate time zone, times without a zone are read in it
+    try:
+        tz.set_display_timezone(args.timezone)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
     # Validate date format
     try:
         week_start = gh.get_week_start_from_date(args.date)
@@ -60,4 +190,4 @@ def validate_arguments(args):
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
     
-    return ics_path, week_start
\ No newline at end of file
+    return ics_paths, remotes, feeds, week_start
\ No newline at end of file
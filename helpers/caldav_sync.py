@@ -0,0 +1,264 @@
+"""
+Keeping local copies of CalDAV calendars up to date.
+
+A CalDAV calendar is shown from a mirror, an .ics file in the data directory
+that is loaded into an EventStore like any other calendar. A sync asks the
+server what changed since the last sync with a sync-collection REPORT
+(RFC 6578): the server answers with the resources whose ETag changed or that
+were removed, and a new sync token. Only the changed resources are
+downloaded, with a calendar-multiget REPORT, and their events replace the
+ones with the same UID in the store, see EventStore.replace_events(). A
+resource holds all events of one UID (a series and its overrides).
+
+The sync token and the ETag and UID of every resource are kept next to the
+mirror (`<mirror>.sync`). Without a valid token the server lists all
+resources, and only those whose ETag differs from the stored one are
+downloaded.
+
+Requests to a server go over one kept-alive connection, shared by all its
+calendars, see http_pool.client_for(). Changes made in the app are not uploaded, they
+stay in the journal of the mirror.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from icalendar import Calendar, Event
+
+from helpers import http_pool as hp
+
+DAV = "{DAV:}"
+CALDAV = "{urn:ietf:params:xml:ns:caldav}"
+
+# resources downloaded per calendar-multiget REPORT
+MULTIGET_BATCH = 100
+
+SYNC_REPORT = """<?xml version="1.0" encoding="utf-8"?>
+<D:sync-collection xmlns:D="DAV:">
+  <D:sync-token>{token}</D:sync-token>
+  <D:sync-level>1</D:sync-level>
+  <D:prop><D:getetag/></D:prop>
+</D:sync-collection>"""
+
+MULTIGET_REPORT = """<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-multiget xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop><D:getetag/><C:calendar-data/></D:prop>
+  {hrefs}
+</C:calendar-multiget>"""
+
+EMPTY_CALENDAR = b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//termcal//CalDAV mirror//EN\r\nEND:VCALENDAR\r\n"
+
+
+class SyncError(Exception):
+    """The server answered a request with an error."""
+
+
+def data_dir() -> Path:
+    """Get the directory the mirrors are stored in ($XDG_DATA_HOME/termcal/caldav)."""
+    base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return Path(base) / "termcal" / "caldav"
+
+
+class SyncState(NamedTuple):
+    """What the mirror of a calendar holds."""
+    # the sync token of the last sync, None before the first one
+    token: Optional[str]
+    # href -> ETag and UID of every resource
+    resources: Dict[str, Tuple[str, str]]
+
+    @classmethod
+    def load(cls, path: Path) -> "SyncState":
+        """Read the state of a mirror, an empty state if there is none (yet)."""
+        try:
+            with open(path, "rb") as f:
+                data = json.load(f)
+            return cls(data["token"], {href: tuple(value) for href, value in data["resources"].items()})
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls(None, {})
+
+    def save(self, path: Path) -> None:
+        """Write the state of a mirror, replacing the old one at once."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"token": self.token, "resources": self.resources}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class CalDavCalendar:
+    """A calendar on a CalDAV server and its mirror."""
+
+    def __init__(self, url: str) -> None:
+        """Initialize the calendar.
+
+        Args:
+            url: URL of the calendar collection. The user name and password can
+                be given in the URL or in ~/.netrc.
+
+        Raises:
+            ValueError: If the URL isn't an http(s) URL
+        """
+        location = hp.parse_url(url)
+        # the collection, with a trailing slash as servers list its members relative to it
+        self.collection = location.path.split("?")[0].rstrip("/") + "/"
+        location = location._replace(path=self.collection)
+        # without the password
+        self.url = urlunsplit((location.scheme, location.netloc, self.collection, "", ""))
+        self.client = hp.client_for(location)
+        self.path = data_dir() / f"{hp.local_name(location)}.ics"
+        self.state_path = self.path.with_name(self.path.name + ".sync")
+
+    def prepare(self) -> None:
+        """Create an empty mirror if there is none yet, so it can be loaded before the first sync."""
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_bytes(EMPTY_CALENDAR)
+
+    def fetch_changes(self) -> Tuple[Dict[str, List[Event]], SyncState]:
+        """
+        Download what changed on the server since the last sync.
+
+        Runs in a worker thread. The new state should be saved with
+        SyncState.save() once the changes are in the journal of the mirror,
+        see Week._sync().
+
+        Returns:
+            Tuple[Dict[str, List[Event]], SyncState]: UID -> its VEVENTs now ([] if it
+                was removed), and the state of the mirror with these changes
+
+        Raises:
+            SyncError: If the server answered with an error
+            OSError: If the server can't be reached
+        """
+        state = SyncState.load(self.state_path)
+        token, listed, removed = self._sync_collection(state)
+
+        resources = dict(state.resources)
+        events: Dict[str, List[Event]] = {}
+        for href in removed:
+            old = resources.pop(href, None)
+            if old is not None:
+                events.setdefault(old[1], [])
+
+        outdated = [href for href, etag in listed.items() if etag is None or resources.get(href, ("",))[0] != etag]
+        fetched = self._multiget(outdated)
+        for href in outdated:
+            old = resources.pop(href, None)
+            if old is not None:
+                events.setdefault(old[1], [])
+            if href not in fetched:
+                # removed since it was listed
+                continue
+            etag, data = fetched[href]
+            vevents = [c for c in Calendar.from_ical(data).subcomponents if c.name == "VEVENT"]
+            if not vevents:
+                continue
+            uid = str(vevents[0].get("UID", ""))
+            events[uid] = vevents
+            resources[href] = (etag or "", uid)
+        return events, SyncState(token, resources)
+
+    def _sync_collection(self, state: SyncState) -> Tuple[str, Dict[str, Optional[str]], Set[str]]:
+        """Ask for the resources that changed since the last sync, all of them before the first one.
+
+        Returns:
+            Tuple[str, Dict[str, Optional[str]], Set[str]]: the new token, href -> ETag
+                of the changed resources and the hrefs of the removed ones
+        """
+        changed: Dict[str, Optional[str]] = {}
+        removed: Set[str] = set()
+        token = state.token
+        full = token is None
+        while True:
+            body = SYNC_REPORT.format(token=escape(token or "")).encode("utf-8")
+            response = self.client.request("REPORT", self.collection, body,
+                                           {"Content-Type": "application/xml; charset=utf-8", "Depth": "0"})
+            if response.status in (403, 409) and token and b"valid-sync-token" in response.body:
+                # the server forgot the token, start over with a full listing
+                token, full = None, True
+                changed.clear()
+                removed.clear()
+                continue
+            if response.status != 207:
+                raise SyncError(f"Sync of {self.url} failed: HTTP {response.status}")
+
+            root = _parse_xml(response.body)
+            truncated = False
+            for href, code, props in _responses(root):
+                if href.rstrip("/") == self.collection.rstrip("/"):
+                    # 507: there are more changes, ask again with the new token
+                    truncated = truncated or code == 507
+                elif code == 404:
+                    removed.add(href)
+                    changed.pop(href, None)
+                elif code == 200:
+                    etag = props.get(DAV + "getetag")
+                    changed[href] = etag.text if etag is not None else None
+                    removed.discard(href)
+            new_token = root.findtext(DAV + "sync-token")
+            if not new_token:
+                raise SyncError(f"Sync of {self.url} failed: no sync token")
+            token = new_token
+            if not truncated:
+                break
+
+        if full:
+            # a full listing also tells which resources are gone
+            removed.update(href for href in state.resources if href not in changed)
+        return token, changed, removed
+
+    def _multiget(self, hrefs: List[str]) -> Dict[str, Tuple[Optional[str], bytes]]:
+        """Download resources, MULTIGET_BATCH at a time.
+
+        Returns:
+            Dict[str, Tuple[Optional[str], bytes]]: href -> ETag and calendar data
+        """
+        fetched = {}
+        for i in range(0, len(hrefs), MULTIGET_BATCH):
+            batch = "".join(f"<D:href>{escape(quote(href))}</D:href>" for href in hrefs[i:i + MULTIGET_BATCH])
+            response = self.client.request("REPORT", self.collection,
+                                           MULTIGET_REPORT.format(hrefs=batch).encode("utf-8"),
+                                           {"Content-Type": "application/xml; charset=utf-8", "Depth": "1"})
+            if response.status != 207:
+                raise SyncError(f"Download from {self.url} failed: HTTP {response.status}")
+            for href, code, props in _responses(_parse_xml(response.body)):
+                calendar_data = props.get(CALDAV + "calendar-data")
+                if code == 200 and calendar_data is not None and calendar_data.text:
+                    etag = props.get(DAV + "getetag")
+                    fetched[href] = (etag.text if etag is not None else None, calendar_data.text.encode("utf-8"))
+        return fetched
+
+
+def _parse_xml(data: bytes) -> ElementTree.Element:
+    try:
+        return ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise SyncError(f"Invalid answer from the server: {e}")
+
+
+def _responses(root: ElementTree.Element) -> Iterator[Tuple[str, int, Dict[str, ElementTree.Element]]]:
+    """Get the href, status and (found) properties of every response of a multistatus."""
+    for response in root.iterfind(DAV + "response"):
+        href = unquote(urlsplit(response.findtext(DAV + "href", "")).path)
+        status = response.findtext(DAV + "status")
+        props: Dict[str, ElementTree.Element] = {}
+        for propstat in response.iterfind(DAV + "propstat"):
+            code = _status_code(propstat.findtext(DAV + "status"))
+            if code == 200:
+                status = status or propstat.findtext(DAV + "status")
+                for prop in propstat.iterfind(DAV + "prop/*"):
+                    props[prop.tag] = prop
+            elif status is None and code is not None:
+                status = propstat.findtext(DAV + "status")
+        yield href, _status_code(status) or 0, props
+
+
+def _status_code(status: Optional[str]) -> Optional[int]:
+    """Get the code of a status line like "HTTP/1.1 200 OK"."""
+    parts = (status or "").split()
+    return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
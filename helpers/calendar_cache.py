@@ -0,0 +1,197 @@
+"""
+On-disk cache of parsed calendars.
+
+Parsing a large .ics file is slow, but usually the file hasn't changed since
+the last start. The records of the event store are cached column-wise (one list
+per field, in index order), which pickle reads back in a fraction of the time
+it takes to parse the file, and the index doesn't have to be sorted again.
+
+A cache entry is only used if the path, mtime, size and a fingerprint of the
+content of the .ics file still match, so saving the calendar or editing it with
+another program invalidates it. So does showing it in another time zone.
+
+Stores of memory-mapped files (lazy mode) only cache where each event is in the
+file instead of its text.
+
+The file holds two pickles: a small header that says which content the cache
+belongs to, followed by the data, so checking a cache doesn't read all of it.
+"""
+import os
+import pickle
+from array import array
+from hashlib import blake2b
+from pathlib import Path
+from typing import Optional, Tuple
+
+from icalendar import Calendar, Event
+
+from helpers import timezones as tz
+from helpers.event_record import EventRecord
+from helpers.ical_mmap import MappedCalendar
+from helpers.interval_index import IntervalIndex
+
+# bump whenever the layout of the cached data changes
+CACHE_VERSION = 4
+
+# bytes at the start and end of the file that go into the fingerprint
+FINGERPRINT_BYTES = 1 << 16
+
+
+def cache_dir() -> Path:
+    """Get the directory the caches are stored in ($XDG_CACHE_HOME/termcal)."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "termcal"
+
+
+def cache_path(ical_path: Path) -> Path:
+    """Get the path of the cache file of a calendar."""
+    name = blake2b(str(Path(ical_path).resolve()).encode(), digest_size=16).hexdigest()
+    return cache_dir() / f"{name}.cache"
+
+
+def file_key(ical_path: Path) -> Tuple[int, int, str]:
+    """
+    Identify the current content of a file without reading all of it.
+
+    Args:
+        ical_path: Path to the ICS calendar file
+
+    Returns:
+        Tuple[int, int, str]: mtime in ns, size and a hash of the first and last 64 KiB
+    """
+    stat = os.stat(ical_path)
+    digest = blake2b(digest_size=16)
+    with open(ical_path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if stat.st_size > FINGERPRINT_BYTES:
+            f.seek(max(stat.st_size - FINGERPRINT_BYTES, FINGERPRINT_BYTES))
+            digest.update(f.read())
+    return stat.st_mtime_ns, stat.st_size, digest.hexdigest()
+
+
+def save(store, ical_path: Path) -> None:
+    """
+    Write the cache of a store that matches the current content of ical_path.
+
+    Errors are ignored, the cache is only an optimization.
+
+    Args:
+        store: the EventStore to cache
+        ical_path: Path to the ICS calendar file the store was loaded from/saved to
+    """
+    starts, ends, records = store.index.columns()
+    series_starts, series_ends, masters = store.series_index.columns()
+    header = _header(ical_path, store.lazy)
+    data = {
+        "calendar": store.calendar.to_ical(),
+        "unindexed": store.unindexed,
+        "events": {
+            "start": array("q", starts),
+            "end": array("q", ends),
+            "uid": [r.uid for r in records],
+            "summary": [r.summary for r in records],
+            "location": [r.location for r in records],
+            "recurrence_id": [r.recurrence_id for r in records],
+            "raw": [r.raw if r.raw is not None or r.offset >= 0 else r.component.to_ical() for r in records],
+            "offset": array("q", [r.offset for r in records]),
+            "length": array("q", [r.length for r in records]),
+        },
+        "series": {
+            "start": series_starts,
+            "end": series_ends,
+            "raw": [m.raw if m.raw is not None else m.component.to_ical() for m in masters],
+        },
+    }
+
+    path = cache_path(ical_path)
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def _header(ical_path: Path, lazy: bool) -> dict:
+    """Describe the content a cache of ical_path is valid for."""
+    return {
+        "version": CACHE_VERSION,
+        "key": file_key(ical_path),
+        "lazy": lazy,
+        # floating times and dates depend on the display zone
+        "timezone": tz.display_timezone_key(),
+    }
+
+
+def _read_header(f, ical_path: Path, lazy: bool) -> bool:
+    """Read the header of an open cache file and check whether it is still valid."""
+    try:
+        return pickle.load(f) == _header(ical_path, lazy)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return False
+
+
+def is_fresh(ical_path: Path, lazy: bool) -> bool:
+    """
+    Check whether ical_path has a valid cache, without loading it.
+
+    Args:
+        ical_path: Path to the ICS calendar file
+        lazy: whether the calendar is loaded in lazy mode
+
+    Returns:
+        bool: True if load() would fill a store from the cache
+    """
+    try:
+        with open(cache_path(ical_path), "rb") as f:
+            return _read_header(f, ical_path, lazy)
+    except OSError:
+        return False
+
+
+def load(store, ical_path: Path) -> bool:
+    """
+    Fill an empty store from the cache of ical_path, if there is a valid one.
+
+    Args:
+        store: an empty EventStore
+        ical_path: Path to the ICS calendar file
+
+    Returns:
+        bool: True if the store was filled, False if the file has to be parsed
+    """
+    try:
+        with open(cache_path(ical_path), "rb") as f:
+            if not _read_header(f, ical_path, store.lazy):
+                return False
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError, ValueError):
+        return False
+
+    # parsing the calendar also registers its VTIMEZONEs
+    store.calendar = Calendar.from_ical(data["calendar"])
+    store.unindexed = data["unindexed"]
+    if store.lazy:
+        store.source = MappedCalendar(ical_path)
+
+    events = data["events"]
+    records = [
+        EventRecord(uid, start, end, summary, location, recurrence_id, raw=raw, offset=offset, length=length)
+        for uid, start, end, summary, location, recurrence_id, raw, offset, length in zip(
+            events["uid"], events["start"], events["end"], events["summary"], events["location"],
+            events["recurrence_id"], events["raw"], events["offset"], events["length"])
+    ]
+    for record in records:
+        if record.recurrence_id is not None:
+            store.overrides[(record.uid, record.recurrence_id)] = record
+    store.index = IntervalIndex.from_sorted(events["start"], events["end"], records)
+
+    series = data["series"]
+    masters = [EventRecord.from_event(Event.from_ical(raw)) for raw in series["raw"]]
+    for master in masters:
+        store.masters[master.uid] = master
+    store.series_index = IntervalIndex.from_sorted(series["start"], series["end"], masters)
+    return True
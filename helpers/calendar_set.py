@@ -0,0 +1,161 @@
+"""
+Several calendars shown together.
+
+Every calendar keeps its own EventStore with its own sorted indexes (or a
+SqliteStore for calendars in a database, see open_store()), changes are saved
+to the file the event came from. Queries ask every visible store
+and merge the results, which are sorted already, with a k-way merge.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from heapq import merge
+from itertools import chain, islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+from helpers import calendar_cache as cc
+from helpers import general_helpers as gh
+from helpers import parallel_parse as pp
+from helpers import timezones as tz
+from helpers.day_index import DayStats
+from helpers.event_record import EventRecord
+from helpers.event_store import EventStore
+from helpers.sqlite_store import SqliteStore, is_sqlite
+
+# the storage backends of calendars
+Store = Union[EventStore, SqliteStore]
+
+
+def _warm_cache(ical_path: Path, lazy: bool, timezone: Optional[str]) -> None:
+    """Parse a calendar and write its cache (runs in a worker process)."""
+    tz.set_display_timezone(timezone)
+    EventStore.from_path(ical_path, lazy=lazy, processes=1)
+
+
+def open_store(path: Path, lazy: bool = False) -> Store:
+    """Open a calendar with the backend its file calls for: SQLite databases by suffix, .ics files otherwise."""
+    if is_sqlite(path):
+        return SqliteStore.from_path(path)
+    return EventStore.from_path(path, lazy=lazy)
+
+
+class CalendarSet:
+    """The calendars of the app, see the module docstring.
+
+    Has the generation and week_events() of an EventStore, so the week
+    layouts work the same for one and for several calendars.
+    """
+
+    def __init__(self, stores: List[Store]) -> None:
+        """Initialize the set.
+
+        Args:
+            stores: the store of every calendar; the first one is where new events go
+        """
+        self.stores = stores
+        self.visible = [True] * len(stores)
+        # incremented by every change of the visibility
+        self._toggles = 0
+
+    @classmethod
+    def from_paths(cls, ical_paths: List[Path], lazy: bool = False) -> "CalendarSet":
+        """Load calendars.
+
+        Calendars that have to be parsed (no valid cache) are parsed in
+        parallel by worker processes, which write their caches, while this
+        process parses one of them. The other stores are then read from the
+        caches, which is much faster than parsing, so with enough cores
+        starting takes about as long as parsing the largest calendar. A single
+        calendar that has to be parsed is split among the cores instead.
+
+        Args:
+            ical_paths: Paths to the ICS calendar files (or SQLite databases)
+            lazy: see EventStore.from_path()
+
+        Returns:
+            CalendarSet: the calendars
+        """
+        stale = [path for path in ical_paths if not is_sqlite(path) and not cc.is_fresh(path, lazy)]
+        loaded = {}
+        cpus = pp.available_cpus()
+        if len(stale) > 1 and cpus > 1:
+            with ProcessPoolExecutor(max_workers=min(len(stale) - 1, cpus - 1)) as pool:
+                parsing = [pool.submit(_warm_cache, path, lazy, tz.display_timezone_name()) for path in stale[1:]]
+                # meanwhile this process parses one of them itself
+                loaded[stale[0]] = EventStore.from_path(stale[0], lazy=lazy, processes=1)
+                for future in parsing:
+                    future.result()
+        return cls([loaded.get(path) or open_store(path, lazy) for path in ical_paths])
+
+    @property
+    def generation(self) -> int:
+        """Incremented by every change of the events that are shown, see EventStore.generation."""
+        return sum(store.generation for store in self.stores) + self._toggles
+
+    def names(self) -> List[str]:
+        """Get the names of the calendars (their file names)."""
+        return [store.path.stem for store in self.stores]
+
+    def toggle(self, index: int) -> bool:
+        """Show or hide a calendar.
+
+        Args:
+            index: the index of the calendar
+
+        Returns:
+            bool: whether the calendar is shown now
+        """
+        self.visible[index] = not self.visible[index]
+        self._toggles += 1
+        return self.visible[index]
+
+    def _visible_stores(self) -> List[Store]:
+        return [store for store, visible in zip(self.stores, self.visible) if visible]
+
+    def week_events(self, week_start: datetime) -> List[EventRecord]:
+        """Get the events of the visible calendars in the week starting at week_start, sorted by start."""
+        return list(merge(*(store.week_events(week_start) for store in self._visible_stores()),
+                          key=lambda r: r.start))
+
+    def store_of(self, record: EventRecord) -> Store:
+        """Get the store of the calendar an event belongs to."""
+        for store in self.stores:
+            if store.owns(record):
+                return store
+        raise KeyError(f"Event {record.uid} is not in any calendar")
+
+    def is_master(self, record: EventRecord) -> bool:
+        """Check whether a record is the master of a series, see EventStore.is_master()."""
+        return any(store.is_master(record) for store in self.stores)
+
+    def color_slot(self, record: EventRecord) -> int:
+        """Get the colour of an event: by summary for one calendar, by calendar for several."""
+        if len(self.stores) == 1:
+            return gh.summary_to_color_slot(record.summary)
+        index = next(i for i, store in enumerate(self.stores) if store.owns(record))
+        # 7 and the number of colours have no common divisor, so neighbours get distant hues
+        return index * 7 % len(gh.PALETTE_HUES)
+
+    def days(self, first: date, count: int) -> List[DayStats]:
+        """Get the aggregates of consecutive days over the visible calendars, see DayIndex.days()."""
+        merged = [DayStats()] * count
+        for store in self._visible_stores():
+            for i, stats in enumerate(store.days.days(first, count)):
+                if not stats.count:
+                    continue
+                other = merged[i]
+                if not other.count:
+                    merged[i] = stats
+                else:
+                    merged[i] = DayStats(other.count + stats.count, other.busy_minutes + stats.busy_minutes,
+                                         min(other.first, stats.first), max(other.last, stats.last))
+        return merged
+
+    def search(self, query: str, limit: int = 200) -> List[EventRecord]:
+        """Search the visible calendars, see EventStore.search()."""
+        results = (store.search(query, limit) for store in self._visible_stores())
+        return list(islice(merge(*results, key=lambda r: (r.start, r.uid)), limit))
+
+    def search_index_steps(self) -> Iterator[None]:
+        """Build the search indexes of all calendars, see EventStore.search_index_steps()."""
+        return chain.from_iterable(store.search_index_steps() for store in self.stores)
@@ -0,0 +1,174 @@
+"""
+Per-day aggregates of the events of a calendar, for the month and year views.
+
+Asking the store for the events of every week of a year and counting them
+would touch every event of that year. The DayIndex instead keeps, for every
+day that has events, how many there are, how long they take in total and
+when the first starts and the last ends. The index is built in one pass over
+the interval index when the calendar is loaded and updated with every change
+of the store, so a view of a month or a year only reads one entry per day.
+
+Days are days of the display zone (see timezones). Events that go past
+midnight count on every day they touch, with the part of the event that
+falls on that day.
+
+Recurring series can be endless, so their occurrences are only aggregated
+per year once a view asks for it, and forgotten when a series changes.
+"""
+from datetime import date, datetime, time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from helpers import timezones as tz
+
+# [number of events, busy seconds, first start, last end]
+_Day = List[int]
+
+# busy minutes from which a day with events counts as busier, see density()
+DENSITY_MINUTES = (120, 240, 480)
+
+
+class DayStats(NamedTuple):
+    """The events of a day.
+
+    busy_minutes sums up the durations, so overlapping events count twice.
+    first and last are epoch seconds, cut off at midnight, None without events.
+    """
+    count: int = 0
+    busy_minutes: int = 0
+    first: Optional[int] = None
+    last: Optional[int] = None
+
+
+def density(stats: DayStats) -> int:
+    """Rate how busy a day is, from 0 (no events) to len(DENSITY_MINUTES) + 1."""
+    if not stats.count:
+        return 0
+    return 1 + sum(stats.busy_minutes >= minutes for minutes in DENSITY_MINUTES)
+
+
+class DayIndex:
+    """The events of the calendar aggregated per day."""
+
+    def __init__(self, overlap: Callable[[float, float], list],
+                 series_overlap: Callable[[float, float], list]) -> None:
+        """Initialize an empty index, see add() and build().
+
+        Args:
+            overlap: returns the (non-series) events overlapping [start, end), e.g.
+                EventStore.index.overlap. Used to find the first/last event of a
+                day again once that one was removed.
+            series_overlap: returns the occurrences of all series overlapping
+                [start, end), see EventStore.series_occurrences()
+        """
+        self.overlap = overlap
+        self.series_overlap = series_overlap
+        # ordinal of the day -> _Day
+        self._days: Dict[int, _Day] = {}
+        # year -> the days of that year with occurrences of series
+        self._series_years: Dict[int, Dict[int, _Day]] = {}
+        self._midnights: Dict[int, int] = {}
+
+    def build(self, starts: Iterable[int], ends: Iterable[int]) -> None:
+        """Aggregate the events of the calendar in one pass.
+
+        Args:
+            starts: start of every event as epoch seconds, e.g. a column of the store's index
+            ends: end of every event as epoch seconds
+        """
+        self._days = {}
+        for start, end in zip(starts, ends):
+            self._add(self._days, start, end)
+
+    def add(self, start: int, end: int) -> None:
+        """Count an event that was added to the calendar."""
+        self._add(self._days, start, end)
+
+    def remove(self, start: int, end: int) -> None:
+        """Stop counting an event that was removed from the calendar.
+
+        Should be called once the event isn't returned by `overlap` anymore.
+        """
+        for ordinal, piece_start, piece_end in self._pieces(start, end):
+            day = self._days.get(ordinal)
+            if day is None:
+                continue
+            day[0] -= 1
+            day[1] -= piece_end - piece_start
+            if day[0] <= 0:
+                del self._days[ordinal]
+            elif piece_start == day[2] or piece_end == day[3]:
+                # it may have been the first/last one, ask the calendar again
+                midnight, next_midnight = self._midnight(ordinal), self._midnight(ordinal + 1)
+                events = self.overlap(midnight, next_midnight)
+                day[2] = min((max(e.start, midnight) for e in events), default=day[2])
+                day[3] = max((min(e.end, next_midnight) for e in events), default=day[3])
+
+    def invalidate_series(self) -> None:
+        """Forget the aggregated occurrences of the series, e.g. after a series was edited."""
+        self._series_years = {}
+
+    def day(self, day: date) -> DayStats:
+        """Get the aggregate of a day."""
+        return self.days(day, 1)[0]
+
+    def days(self, first: date, count: int) -> List[DayStats]:
+        """Get the aggregates of consecutive days.
+
+        Args:
+            first: the first day
+            count: number of days
+
+        Returns:
+            List[DayStats]: the aggregate of every day
+        """
+        result = []
+        for ordinal in range(first.toordinal(), first.toordinal() + count):
+            day = self._days.get(ordinal)
+            series_day = self._series_year(date.fromordinal(ordinal).year).get(ordinal)
+            if day is not None and series_day is not None:
+                day = [day[0] + series_day[0], day[1] + series_day[1],
+                       min(day[2], series_day[2]), max(day[3], series_day[3])]
+            else:
+                day = day or series_day
+            result.append(DayStats(day[0], day[1] // 60, day[2], day[3]) if day else DayStats())
+        return result
+
+    def _series_year(self, year: int) -> Dict[int, _Day]:
+        days = self._series_years.get(year)
+        if days is None:
+            start = self._midnight(date(year, 1, 1).toordinal())
+            end = self._midnight(date(year + 1, 1, 1).toordinal())
+            days = {}
+            for occurrence in self.series_overlap(start, end):
+                # only the part within the year, the rest belongs to the next/previous one
+                self._add(days, max(occurrence.start, start), min(occurrence.end, end))
+            self._series_years[year] = days
+        return days
+
+    def _add(self, days: Dict[int, _Day], start: int, end: int) -> None:
+        for ordinal, piece_start, piece_end in self._pieces(start, end):
+            day = days.get(ordinal)
+            if day is None:
+                days[ordinal] = [1, piece_end - piece_start, piece_start, piece_end]
+            else:
+                day[0] += 1
+                day[1] += piece_end - piece_start
+                day[2] = min(day[2], piece_start)
+                day[3] = max(day[3], piece_end)
+
+    def _pieces(self, start: int, end: int) -> Iterable[Tuple[int, int, int]]:
+        """Split an event at midnight into (ordinal of the day, start, end)."""
+        ordinal = tz.to_date(start).toordinal()
+        while True:
+            next_midnight = self._midnight(ordinal + 1)
+            yield ordinal, start, min(end, next_midnight)
+            if end <= next_midnight:
+                return
+            ordinal, start = ordinal + 1, next_midnight
+
+    def _midnight(self, ordinal: int) -> int:
+        midnight = self._midnights.get(ordinal)
+        if midnight is None:
+            midnight = int(tz.to_timestamp(datetime.combine(date.fromordinal(ordinal), time())))
+            self._midnights[ordinal] = midnight
+        return midnight
@@ -0,0 +1,102 @@
+from sys import intern
+from typing import Optional
+
+from icalendar import Event
+
+from helpers import ical_helpers as ih
+
+
+class EventRecord:
+    """Compact record of a VEVENT, used on the hot paths instead of the component.
+
+    Reading properties from an icalendar.Event goes through a case-insensitive
+    dict and the property wrappers every time. Records hold just what the week
+    view needs: start/end as epoch seconds and interned strings, so events with
+    the same title share the same string.
+
+    The full component should only be needed by the event screens, see
+    EventStore.component(). Until then, events read from a file only keep their
+    raw text in `raw`, or just where it is in the file (`offset` and `length`)
+    if the file is memory-mapped. Records of mapped files start out without
+    summary and location (None), those are loaded once the event is shown.
+    """
+
+    __slots__ = ("uid", "start", "end", "summary", "location", "recurrence_id", "component", "raw",
+                 "offset", "length")
+
+    def __init__(self, uid: str, start: int, end: int, summary: Optional[str] = "",
+                 location: Optional[str] = "", recurrence_id: Optional[int] = None,
+                 component: Optional[Event] = None, raw: Optional[bytes] = None,
+                 offset: int = -1, length: int = 0) -> None:
+        """Initialize the record.
+
+        Args:
+            uid: UID of the event
+            start: start as epoch seconds
+            end: end as epoch seconds (exclusive)
+            summary: SUMMARY of the event
+            location: LOCATION of the event
+            recurrence_id: epoch seconds of the RECURRENCE-ID, for occurrences of series
+            component: the VEVENT this record was made from. None if it wasn't
+                parsed yet (see raw) and for occurrences of series that were not
+                materialized yet.
+            raw: the unmodified text of the VEVENT as read from the file
+            offset: byte offset of the VEVENT in the mapped file, -1 if not mapped
+            length: length of the VEVENT in the mapped file
+        """
+        self.uid = uid
+        self.start = start
+        self.end = end
+        self.summary = intern(summary) if summary is not None else None
+        self.location = intern(location) if location is not None else None
+        self.recurrence_id = recurrence_id
+        self.component = component
+        self.raw = raw
+        self.offset = offset
+        self.length = length
+
+    @classmethod
+    def from_event(cls, event: Event) -> Optional["EventRecord"]:
+        """Make a record from a VEVENT.
+
+        Args:
+            event: the VEVENT component
+
+        Returns:
+            Optional[EventRecord]: the record, or None if the event has no start or end
+        """
+        record = cls("", 0, 0)
+        return record if record.load(event) else None
+
+    def load(self, event: Event) -> bool:
+        """(Re)read all fields from a VEVENT, e.g. after it was edited.
+
+        This drops the raw text (and position in the mapped file), the record is
+        written from the component from now on.
+
+        Args:
+            event: the VEVENT component
+
+        Returns:
+            bool: False if the event has no start or end
+        """
+        span = ih.event_span(event)
+        if span is None:
+            return False
+        rid = event.get("RECURRENCE-ID")
+        self.uid = str(event.get("UID", ""))
+        self.start, self.end = int(span[0]), int(span[1])
+        self.recurrence_id = int(ih.to_timestamp(rid.dt)) if rid is not None else None
+        self.load_details(event)
+        self.component = event
+        self.raw = None
+        self.offset = -1
+        return True
+
+    def load_details(self, event: Event) -> None:
+        """Read the summary and location from a VEVENT."""
+        self.summary = intern(str(event.get("SUMMARY", "")))
+        self.location = intern(str(event.get("LOCATION", "")))
+
+    def __repr__(self) -> str:
+        return f"EventRecord({self.uid!r}, {self.start}, {self.end}, {self.summary!r})"
@@ -0,0 +1,816 @@
+import io
+import os
+from datetime import datetime, timedelta
+from heapq import nsmallest
+from itertools import chain
+from pathlib import Path
+from sys import intern
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from icalendar import Calendar, Component, Event, vText
+
+from helpers import calendar_cache as cc
+from helpers import file_watch as fw
+from helpers import ical_helpers as ih
+from helpers import ical_stream as ics
+from helpers.ical_mmap import MappedCalendar, index_lines, parse_index_lines, property_value
+from helpers import parallel_parse as pp
+from helpers import recurrence as rc
+from helpers.day_index import DayIndex
+from helpers.event_record import EventRecord
+from helpers.interval_index import IntervalIndex
+from helpers.journal import DELETE, PUT, Entry, Journal
+from helpers.search_index import SEARCH_PROPERTIES, SearchIndex
+
+# the journal is folded into the calendar once it is larger than this share of the calendar...
+COMPACT_RATIO = 0.25
+# ...but not before it has at least this many bytes
+COMPACT_MIN_SIZE = 1 << 18
+# the properties of EventRecord.load_details()
+DETAIL_PROPERTIES = (b"SUMMARY", b"LOCATION")
+# events added to the search index at a time, see search_index_steps()
+SEARCH_CHUNK = 500
+# events changed at a time by update_many()
+UPDATE_CHUNK = 200
+
+
+class EventStore:
+    """The loaded calendar together with the indexes used to query it.
+
+    Queries return compact EventRecords; the full VEVENT of a record is only
+    needed to show or edit it, see component(). All changes to the events of
+    the calendar should go through the store so that the indexes stay in sync
+    with the calendar.
+
+    The VEVENTs are not kept in a Calendar tree, `calendar` only holds the
+    calendar properties and the other components (VTIMEZONE, VTODO, ...).
+    In lazy mode the file is memory-mapped and events are only parsed once
+    they are shown, see from_path().
+
+    Changes are not written to the calendar file right away but to a journal
+    next to it, see save() and compact(). Changes other programs make to the
+    file are merged in with apply_file_changes().
+    """
+
+    def __init__(self, lazy: bool = False) -> None:
+        """Initialize an empty store, see from_path() and load_component().
+
+        Args:
+            lazy: whether the store is backed by a memory-mapped file
+        """
+        self.lazy = lazy
+        # incremented by every change of the events, see layout_helpers.WeekLayoutCache
+        self.generation = 0
+        self.path: Optional[Path] = None
+        self.journal: Optional[Journal] = None
+        # the file as it was loaded or last written, see apply_file_changes()
+        self.file_stat: Optional[fw.FileStat] = None
+        self.file_snapshot: Optional[fw.Snapshot] = None
+        # changes that were not written to the journal yet
+        self._pending: List[Entry] = []
+        self.source: Optional[MappedCalendar] = None
+        self.calendar = Calendar()
+        # VEVENTs without start/end, they can't be shown but are written back as they were
+        self.unindexed: List[bytes] = []
+        # (UID, RECURRENCE-ID) -> record overriding a single occurrence of a series
+        self.overrides: Dict[Tuple[str, int], EventRecord] = {}
+        # UID -> record of the series master
+        self.masters: Dict[str, EventRecord] = {}
+        # UID -> records of its events in the index, so changes find them without scanning the index
+        self.by_uid: Dict[str, List[EventRecord]] = {}
+        # SUMMARY -> records of its events in the index, only built once it is needed, see with_summary()
+        self.by_summary: Optional[Dict[str, List[EventRecord]]] = None
+        self.expander = rc.RecurrenceExpander(self.overrides)
+
+        self.index: IntervalIndex[EventRecord] = IntervalIndex()
+        # series are indexed by the span from their first to their last occurrence
+        self.series_index: IntervalIndex[EventRecord] = IntervalIndex()
+        # spans collected while loading, the indexes are bulk-built from them in finish_loading()
+        self._spans: List[Tuple[float, float, EventRecord]] = []
+        self._series_spans: List[Tuple[float, float, EventRecord]] = []
+        # the index is looked up through self, finish_loading() and the cache replace it
+        self.days = DayIndex(lambda start, end: self.index.overlap(start, end), self.series_occurrences)
+        # only built once it is needed, see search_index_steps()
+        self.search_index = SearchIndex()
+        self._search_build: Optional[Iterator[None]] = None
+
+    @classmethod
+    def from_path(cls, ical_path: Path, lazy: bool = False, processes: Optional[int] = None) -> "EventStore":
+        """Load an .ics file into a new store.
+
+        The file is streamed one component at a time, so neither the whole file
+        nor a tree of all its VEVENTs has to be held in memory while loading.
+        If the file didn't change since it was last loaded, the store is read
+        from the cache instead, see calendar_cache. Changes from the journal of
+        the file are applied on top. Large files are parsed by several
+        processes, see parallel_parse.
+
+        Args:
+            ical_path: Path to the ICS calendar file
+            lazy: memory-map the file and only parse the times of each event.
+                Everything else is parsed when the event is shown, so memory use
+                depends on what is on screen rather than on the size of the file.
+            processes: the most processes that parse the file, None for one per CPU
+
+        Returns:
+            EventStore: the store
+        """
+        store = cls(lazy)
+        # before reading, so changes made while loading are noticed
+        store.file_stat = fw.file_stat(ical_path)
+        if not cc.load(store, ical_path):
+            workers = pp.worker_count(ical_path, processes)
+            if lazy:
+                store._load_mapped(ical_path)
+            elif workers > 1:
+                store._load_parallel(ical_path, workers)
+            else:
+                with open(ical_path, "rb") as f:
+                    for name, raw in ics.iter_components(f):
+                        store.load_component(name, raw)
+            store.finish_loading()
+            cc.save(store, ical_path)
+        store.days.build(*store.index.columns()[:2])
+        store._index_uids()
+
+        store.path = Path(ical_path)
+        store.journal = Journal(ical_path)
+        store._replay(store.journal.replay())
+        return store
+
+    def load_component(self, name: str, raw: bytes) -> None:
+        """Load one component read from a file, see ical_stream.iter_components().
+
+        Args:
+            name: name of the component, e.g. "VEVENT"
+            raw: the raw text of the component
+        """
+        if name == "VCALENDAR":
+            for key, value in Calendar.from_ical(raw).items():
+                self.calendar[key] = value
+            return
+        if name != "VEVENT":
+            # parsing a VTIMEZONE also registers it for the TZIDs of the following VEVENTs
+            self.calendar.add_component(Component.from_ical(raw))
+            return
+
+        event = Event.from_ical(raw)
+        record = EventRecord.from_event(event)
+        if record is None:
+            self.unindexed.append(raw)
+        elif rc.is_recurring(event) and record.recurrence_id is None:
+            # masters stay parsed, they are needed to expand the series
+            self.masters[record.uid] = record
+            self._series_spans.append((*rc.series_span(event), record))
+        else:
+            # only keep the text, the component is parsed again when it is needed
+            record.component = None
+            record.raw = raw
+            self._add_loaded(record)
+
+    def _add_loaded(self, record: EventRecord) -> None:
+        """Add a record that is not a series master while loading, see finish_loading()."""
+        key = rc.recurrence_key(record)
+        if key:
+            self.overrides[key] = record
+        self._spans.append((record.start, record.end, record))
+
+    def _load_mapped(self, ical_path: Path) -> None:
+        """Index a memory-mapped file, parsing only the times of the VEVENTs."""
+        self.source = MappedCalendar(ical_path)
+        blocks, rest = self.source.scan()
+        # calendar properties and VTIMEZONEs first, so the TZIDs are known below
+        for name, raw in ics.iter_components(io.BytesIO(rest)):
+            self.load_component(name, raw)
+
+        for offset, length in blocks:
+            raw = self.source.read(offset, length)
+            lines = list(index_lines(raw))
+            if any(line[:5].upper() in (b"RRULE", b"RDATE") for line in lines):
+                # series masters are always parsed completely
+                self.load_component("VEVENT", raw)
+                continue
+
+            parsed = parse_index_lines(lines)
+            if parsed is not None:
+                uid, start, end, recurrence_id = parsed
+                record = EventRecord(uid, int(start), int(end), None, None,
+                                     int(recurrence_id) if recurrence_id is not None else None)
+            else:
+                # unusual values, let icalendar deal with them
+                record = EventRecord.from_event(Event.from_ical(b"\r\n".join([b"BEGIN:VEVENT", *lines, b"END:VEVENT"])))
+                if record is None:
+                    self.unindexed.append(raw)
+                    continue
+                record.component = None
+                record.summary = record.location = None
+            record.offset, record.length = offset, length
+            self._add_loaded(record)
+
+    def _load_parallel(self, ical_path: Path, workers: int) -> None:
+        """Parse the VEVENTs of a file in worker processes, see parallel_parse."""
+        source = MappedCalendar(ical_path)
+        try:
+            blocks, rest = source.scan()
+            for name, raw in ics.iter_components(io.BytesIO(rest)):
+                self.load_component(name, raw)
+            for (offset, length), fields in zip(blocks, pp.parse_blocks(ical_path, blocks, rest, workers)):
+                raw = source.read(offset, length)
+                if fields is None:
+                    self.load_component("VEVENT", raw)
+                else:
+                    self._add_loaded(EventRecord(*fields, raw=raw))
+        finally:
+            source.close()
+
+    def finish_loading(self) -> None:
+        """Build the indexes from the loaded components."""
+        self.index = IntervalIndex.from_items(self._spans)
+        self.series_index = IntervalIndex.from_items(self._series_spans)
+        self._spans, self._series_spans = [], []
+
+    def _index_uids(self) -> None:
+        """Build by_uid from the index, after loading."""
+        self.by_uid = {}
+        for record in self.index:
+            self.by_uid.setdefault(record.uid, []).append(record)
+
+    def find(self, uid: str, recurrence_id: Optional[int] = None) -> Optional[EventRecord]:
+        """Get the record of an event (or override) by its UID (and RECURRENCE-ID), without scanning the index."""
+        return next((record for record in self.by_uid.get(uid, ()) if record.recurrence_id == recurrence_id), None)
+
+    def with_summary(self, summary: str) -> List[EventRecord]:
+        """Get the events (and series masters) with exactly this title.
+
+        The summary index is built on the first call, which loads the summary
+        of every event of a memory-mapped file.
+        """
+        if self.by_summary is None:
+            self.by_summary = {}
+            for record in self.index:
+                self.load_details(record)
+                self.by_summary.setdefault(record.summary, []).append(record)
+        events = list(self.by_summary.get(summary, ()))
+        events.extend(master for master in self.masters.values() if master.summary == summary)
+        return events
+
+    def week_events(self, week_start: datetime) -> List[EventRecord]:
+        """Get all events of the week starting at week_start, sorted by start.
+
+        Recurring series are expanded into their occurrences of that week.
+        """
+        events = ih.get_week_events(week_start, self.index)
+        for record in events:
+            self.load_details(record)
+
+        window_start = ih.to_timestamp(week_start)
+        window_end = ih.to_timestamp(week_start + timedelta(days=7))
+        occurrences = [
+            occurrence
+            for master in self.series_index.overlap(window_start, window_end)
+            for occurrence in self.expander.occurrences(master, window_start, window_end)
+        ]
+        if occurrences:
+            events = sorted(events + occurrences, key=lambda r: r.start)
+        return events
+
+    def load_details(self, record: EventRecord) -> None:
+        """Load summary and location of a record of a memory-mapped file, once they are needed.
+
+        They are read from their lines, parsing the whole VEVENT would take
+        much longer.
+        """
+        if record.summary is not None:
+            return
+        values = {}
+        for line in index_lines(self.raw(record), DETAIL_PROPERTIES):
+            name = line.split(b";", 1)[0].split(b":", 1)[0].upper()
+            values.setdefault(name, str(vText.from_ical(property_value(line).decode("utf-8", "replace"))))
+        record.summary = intern(values.get(b"SUMMARY", ""))
+        record.location = intern(values.get(b"LOCATION", ""))
+
+    def search(self, query: str, limit: int = 200) -> List[EventRecord]:
+        """Find the events whose SUMMARY, LOCATION and DESCRIPTION contain all words of a query.
+
+        Builds whatever is missing of the search index first.
+
+        Args:
+            query: the words (or starts of words) to search for
+            limit: the maximum number of events returned
+
+        Returns:
+            List[EventRecord]: the first matching events (series by their first
+                occurrence), sorted by start
+        """
+        for _ in self.search_index_steps():
+            pass
+        events = nsmallest(limit, self.search_index.search(query), key=lambda r: (r.start, r.uid))
+        for record in events:
+            self.load_details(record)
+        return events
+
+    def search_index_steps(self) -> Iterator[None]:
+        """Build the search index, yielding after every SEARCH_CHUNK events.
+
+        Parsing the text of every event takes a while on large calendars, so
+        the app builds the index in small steps while it is idle. The index
+        is only built once; the steps are shared, so a search while the app
+        is still building finishes the build. Changes are indexed once the
+        build has started, see _index_record().
+        """
+        if self._search_build is None:
+            self._search_build = self._build_search_index()
+        return self._search_build
+
+    def _build_search_index(self) -> Iterator[None]:
+        records = [*self.index, *self.series_index]
+        for i in range(0, len(records), SEARCH_CHUNK):
+            for record in records[i:i + SEARCH_CHUNK]:
+                # the calendar may have changed between the steps
+                if record in self.index or self.masters.get(record.uid) is record:
+                    self.search_index.add(record, self.search_text(record))
+            yield
+
+    def search_text(self, record: EventRecord) -> str:
+        """Get the searchable text of an event without parsing it, see search_index."""
+        if record.component is not None:
+            return "\n".join(str(record.component.get(name.decode(), "")) for name in SEARCH_PROPERTIES)
+        raw = self.raw(record)
+        if raw is None:
+            return ""
+        values = (property_value(line) for line in index_lines(raw, SEARCH_PROPERTIES))
+        return b"\n".join(values).decode("utf-8", "replace")
+
+    def series_occurrences(self, start: float, end: float) -> List[EventRecord]:
+        """Get the occurrences of all series overlapping [start, end), see DayIndex."""
+        return [
+            occurrence
+            for master in self.series_index.overlap(start, end)
+            for occurrence in self.expander.occurrences(master, start, end)
+        ]
+
+    def owns(self, record: EventRecord) -> bool:
+        """Check whether an event (or occurrence of a series) belongs to this calendar."""
+        if record in self.index:
+            return True
+        master = self.masters.get(record.uid)
+        return master is record or (master is not None and record.recurrence_id is not None)
+
+    def is_master(self, record: EventRecord) -> bool:
+        """Check whether a record is the master of a series of this calendar."""
+        return self.masters.get(record.uid) is record
+
+    def component(self, record: EventRecord) -> Event:
+        """Get the full VEVENT of a record, materializing occurrences of series."""
+        if record.component is None:
+            raw = self.raw(record)
+            if raw is not None:
+                record.component = Event.from_ical(raw)
+            else:
+                master = self.masters[record.uid]
+                record.component = rc.make_occurrence(master.component, record.recurrence_id)
+            if record.summary is None:
+                record.load_details(record.component)
+        return record.component
+
+    def raw(self, record: EventRecord) -> Optional[bytes]:
+        """Get the unmodified text of a record as read from the file, if there is any."""
+        if record.raw is not None:
+            return record.raw
+        if record.offset >= 0:
+            return self.source.read(record.offset, record.length)
+        return None
+
+    def add(self, event: Event) -> Optional[EventRecord]:
+        """Add a new event to the calendar.
+
+        Returns:
+            Optional[EventRecord]: the record of the event, None if it has no start/end
+        """
+        record = self._insert(event)
+        if record is not None:
+            self._log(PUT, record)
+        return record
+
+    def update(self, record: EventRecord, event: Event) -> None:
+        """Re-index an event after it was changed in place.
+
+        Editing an occurrence of a series that isn't stored yet turns it into an
+        override of that occurrence.
+
+        Args:
+            record: the record that was edited
+            event: its (edited) component
+        """
+        if self.is_master(record):
+            self._update_master(record, event)
+            return
+        recurrence_id = record.recurrence_id
+        stored = self._unindex_record(record)
+        if record.load(event):
+            if stored and record.recurrence_id != recurrence_id:
+                # an override moved along with its series, nothing is left at the old RECURRENCE-ID
+                self.generation += 1
+                self._pending.append((DELETE, record.uid, recurrence_id, None))
+            self._index_record(record)
+            self._log(PUT, record)
+
+    def _update_master(self, master: EventRecord, event: Event) -> None:
+        """Re-index a series after its master was changed in place."""
+        self.series_index.remove(master)
+        self.search_index.remove(master)
+        master.load(event)
+        self.series_index.add(*rc.series_span(event), master)
+        self._series_changed(master.uid)
+        if self._search_build is not None:
+            self.search_index.add(master, self.search_text(master))
+        self._log(PUT, master)
+
+    def update_many(self, records: List[EventRecord], edit: Callable[[Event], None]) -> Iterator[int]:
+        """Change many events the same way, e.g. all events with the same title.
+
+        Runs in steps like search_index_steps(), so the app can show the
+        progress of large batches. The changes are saved together, with one
+        save() (or save worker) once all steps ran.
+
+        Args:
+            records: the events (or series masters) to change
+            edit: changes the component of an event in place
+
+        Yields:
+            int: the number of events changed so far, after every UPDATE_CHUNK events
+        """
+        for i in range(0, len(records), UPDATE_CHUNK):
+            for record in records[i:i + UPDATE_CHUNK]:
+                event = self.component(record)
+                edit(event)
+                self.update(record, event)
+            yield min(i + UPDATE_CHUNK, len(records))
+
+    def remove(self, record: EventRecord) -> bool:
+        """Remove an event from the calendar.
+
+        Removing a single occurrence of a series excludes it from the series
+        with an EXDATE (and drops its override, if it has one).
+
+        Args:
+            record: the record of the event to remove
+
+        Returns:
+            bool: True if an event was removed
+        """
+        key = rc.recurrence_key(record)
+        if key:
+            return self._remove_occurrence(key)
+        if not self._unindex_record(record):
+            return False
+        self._log(DELETE, record)
+        return True
+
+    def to_ical(self) -> bytes:
+        """Serialize the calendar.
+
+        Events that weren't changed are written back from their raw text.
+        """
+        return b"".join(self.serialize()[0])
+
+    def save(self) -> None:
+        """Write the changes made since the last save to the journal.
+
+        Only the changed events are written, so saving doesn't depend on the
+        size of the calendar. Once the journal has grown large compared to the
+        calendar, it is folded into the calendar, see compact().
+
+        To save without blocking, the steps of this can be run separately with
+        the file access in another thread, see Week.request_save().
+        """
+        entries = self.take_changes()
+        try:
+            self.write_changes(entries)
+        except BaseException:
+            self.return_changes(entries)
+            raise
+
+        if self.needs_compaction():
+            try:
+                self.compact()
+            except OSError:
+                # the changes are safe in the journal, compacting is tried again on the next save
+                pass
+
+    def take_changes(self) -> List[Entry]:
+        """Take the changes that were not written to the journal yet, see write_changes()."""
+        entries, self._pending = self._pending, []
+        return entries
+
+    def return_changes(self, entries: List[Entry]) -> None:
+        """Put back changes that couldn't be written, before the ones made since."""
+        self._pending[:0] = entries
+
+    def write_changes(self, entries: List[Entry]) -> None:
+        """Append changes to the journal.
+
+        This only writes to the journal and doesn't touch the store, so it may
+        run in another thread.
+        """
+        self.journal.append(entries)
+
+    def needs_compaction(self) -> bool:
+        """Check whether the journal has grown large enough to be folded into the calendar.
+
+        Never while the file has changes of another program that aren't merged
+        yet, writing the calendar would drop them.
+        """
+        if self.file_changed():
+            return False
+        return self.journal.size() > max(COMPACT_MIN_SIZE, os.path.getsize(self.path) * COMPACT_RATIO)
+
+    def compact(self) -> None:
+        """Write the whole calendar to its file and remove the journal.
+
+        The calendar is written to a temporary file that then replaces the
+        calendar, so an error while writing can't leave a half-written calendar
+        behind. This also keeps a memory-mapped file intact while it is written;
+        the new file is mapped afterwards.
+        """
+        # the pending changes are part of the written calendar
+        self._pending = []
+        parts, placements = self.serialize()
+        self.write_calendar(parts)
+        self.remap(placements)
+
+    def write_calendar(self, parts: List[bytes]) -> None:
+        """Replace the calendar file with the output of serialize() and remove the journal.
+
+        Like write_changes(), this only touches files and may run in another thread.
+        """
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.writelines(parts)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.file_changed():
+                raise OSError(f"{self.path} was changed by another program")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self.file_stat = fw.file_stat(self.path)
+        self.file_snapshot = None
+        # replaying the journal again would be harmless, so it's only removed once the calendar is written
+        self.journal.clear()
+
+    def remap(self, placements: List[Tuple[EventRecord, int, int]]) -> None:
+        """Switch to the calendar file written by write_calendar().
+
+        Args:
+            placements: where the events are in the new file, see serialize()
+        """
+        if self.source is not None:
+            self.source.close()
+            self.source = MappedCalendar(self.path)
+            # events changed since serialize() (their changes are pending) keep their component
+            changed = {(uid, recurrence_id) for _, uid, recurrence_id, _ in self._pending}
+            for record, offset, length in placements:
+                if (record.uid, record.recurrence_id) in changed:
+                    continue
+                record.component = record.raw = None
+                record.offset, record.length = offset, length
+        # the old cache is stale now, write one for the new content
+        cc.save(self, self.path)
+
+    def file_changed(self) -> bool:
+        """Check whether the calendar file changed since it was loaded or written by the store."""
+        return fw.file_stat(self.path) != self.file_stat
+
+    def apply_file_changes(self, changes: fw.FileChanges) -> List[Tuple[float, float]]:
+        """Merge changes another program made to the calendar file, see file_watch.
+
+        The events of every changed UID are replaced by their new version from
+        the file. Changes made in this app (the journal and what wasn't saved
+        yet) are applied on top again, as they would be when the calendar is
+        loaded the next time.
+
+        Args:
+            changes: what changed since the last snapshot, see file_watch.read_changes()
+
+        Returns:
+            List[Tuple[float, float]]: start and end of the events (or series)
+                that changed, to lay out just the affected weeks again
+        """
+        self.file_snapshot = changes.snapshot
+        self.file_stat = changes.snapshot.stat
+        if not changes.events and changes.calendar is None:
+            if changes.source is not None:
+                changes.source.close()
+            return []
+
+        self.generation += 1
+        if changes.calendar is not None:
+            self.calendar = changes.calendar
+        uids = set(changes.events)
+        if changes.everything:
+            uids.update(self.by_uid)
+            uids.update(self.masters)
+        spans = self._drop_uids(uids)
+
+        if changes.source is not None:
+            # unchanged events of a mapped file are at the same or a new place in the new file
+            for record in self.index:
+                if record.offset < 0:
+                    continue
+                offset = changes.moved.get(record.offset)
+                if offset is None:
+                    record.raw = self.raw(record)
+                    record.offset = -1
+                else:
+                    record.offset = offset
+            self.source.close()
+            self.source = changes.source
+        for raw, event in chain.from_iterable(changes.events.values()):
+            record = self._insert(event)
+            if record is None:
+                self.unindexed.append(raw)
+                continue
+            spans.append(self._span(record))
+            if self.masters.get(record.uid) is not record:
+                # like loaded events, only keep the text
+                record.component = None
+                record.raw = raw
+
+        self._replay([entry for entry in self.journal.replay() + self._pending if entry[1] in uids])
+        return spans
+
+    def replace_events(self, events: Dict[str, List[Event]]) -> List[Tuple[float, float]]:
+        """Replace all events with the given UIDs, e.g. by their versions on a CalDAV server.
+
+        Unlike apply_file_changes() this is a change like any other, it is
+        written to the journal and replaces changes made in this app.
+
+        Args:
+            events: UID -> its VEVENTs now (the master and overrides of a series), [] to remove it
+
+        Returns:
+            List[Tuple[float, float]]: start and end of the events (or series)
+                that changed, see apply_file_changes()
+        """
+        self.generation += 1
+        spans = self._drop_uids(set(events), log=True)
+        for event in chain.from_iterable(events.values()):
+            record = self._insert(event)
+            if record is not None:
+                self._log(PUT, record)
+                spans.append(self._span(record))
+        return spans
+
+    def _drop_uids(self, uids: Set[str], log: bool = False) -> List[Tuple[float, float]]:
+        """Remove all events with the given UIDs, returns their spans."""
+        spans = []
+        for record in [record for uid in uids for record in self.by_uid.get(uid, ())]:
+            spans.append((record.start, record.end))
+            self._unindex_record(record)
+            if log:
+                self._log(DELETE, record)
+        for uid in uids & self.masters.keys():
+            master = self.masters[uid]
+            spans.append(self._span(master))
+            del self.masters[uid]
+            self.series_index.remove(master)
+            self.search_index.remove(master)
+            if log:
+                self._log(DELETE, master)
+        for uid in uids:
+            self._series_changed(uid)
+        self.unindexed = [raw for raw in self.unindexed if fw.event_uid(raw) not in uids]
+        return spans
+
+    def _span(self, record: EventRecord) -> Tuple[float, float]:
+        """Get the start and end of an event, or of all occurrences of a series."""
+        if self.masters.get(record.uid) is record:
+            return rc.series_span(record.component)
+        return record.start, record.end
+
+    def serialize(self) -> Tuple[List[bytes], List[Tuple[EventRecord, int, int]]]:
+        """Serialize the calendar into parts that are joined to the file.
+
+        Returns:
+            Tuple[List[bytes], List[Tuple[EventRecord, int, int]]]: the parts, and the
+                byte offset and length of every (non-series) event within the file
+        """
+        header = self.calendar.to_ical()
+        # the events go before END:VCALENDAR
+        parts = [header[:header.rindex(b"END:VCALENDAR")]]
+        placements = []
+        offset = len(parts[0])
+        for record in self.index:
+            text = self._text(record)
+            placements.append((record, offset, len(text)))
+            parts.append(text)
+            offset += len(text)
+        # series masters stay parsed, they don't need to know where they are in the file
+        parts.extend(self._text(master) for master in self.series_index)
+        parts.extend(raw if raw.endswith(b"\n") else raw + b"\r\n" for raw in self.unindexed)
+        parts.append(b"END:VCALENDAR\r\n")
+        return parts, placements
+
+    def _text(self, record: EventRecord) -> bytes:
+        text = self.raw(record)
+        if text is None:
+            text = record.component.to_ical()
+        # raw text at the very end of a file may lack its line break
+        return text if text.endswith(b"\n") else text + b"\r\n"
+
+    def _insert(self, event: Event) -> Optional[EventRecord]:
+        """Index a new event, which may also be the master of a series."""
+        record = EventRecord.from_event(event)
+        if record is None:
+            return None
+        if rc.is_recurring(event) and record.recurrence_id is None:
+            self.masters[record.uid] = record
+            self.series_index.add(*rc.series_span(event), record)
+            self._series_changed(record.uid)
+            if self._search_build is not None:
+                self.search_index.add(record, self.search_text(record))
+        else:
+            self._index_record(record)
+        return record
+
+    def _log(self, op: str, record: EventRecord) -> None:
+        """Remember a change for the journal, see save()."""
+        self.generation += 1
+        text = self._text(record) if op == PUT else None
+        self._pending.append((op, record.uid, record.recurrence_id, text))
+
+    def _replay(self, entries: List[Entry]) -> None:
+        """Apply the changes read from the journal."""
+        if not entries:
+            return
+        self.generation += 1
+        for op, uid, recurrence_id, text in entries:
+            old = self.find(uid, recurrence_id)
+            if old is not None:
+                self._unindex_record(old)
+            if recurrence_id is None and uid in self.masters:
+                master = self.masters.pop(uid)
+                self.series_index.remove(master)
+                self.search_index.remove(master)
+            self._series_changed(uid)
+
+            if op == PUT:
+                self._insert(Event.from_ical(text))
+
+    def _index_record(self, record: EventRecord) -> None:
+        key = rc.recurrence_key(record)
+        if key:
+            self.overrides[key] = record
+            self._series_changed(key[0])
+        self.index.add(record.start, record.end, record)
+        self.by_uid.setdefault(record.uid, []).append(record)
+        if self.by_summary is not None:
+            self.by_summary.setdefault(record.summary, []).append(record)
+        self.days.add(record.start, record.end)
+        if self._search_build is not None:
+            self.search_index.add(record, self.search_text(record))
+
+    def _unindex_record(self, record: EventRecord) -> bool:
+        if not self.index.remove(record):
+            return False
+        key = rc.recurrence_key(record)
+        if key and self.overrides.get(key) is record:
+            del self.overrides[key]
+            self._series_changed(key[0])
+        _discard(self.by_uid, record.uid, record)
+        if self.by_summary is not None:
+            _discard(self.by_summary, record.summary, record)
+        self.days.remove(record.start, record.end)
+        self.search_index.remove(record)
+        return True
+
+    def _series_changed(self, uid: str) -> None:
+        """Forget what was derived from the occurrences of a series."""
+        self.expander.invalidate(uid)
+        self.days.invalidate_series()
+
+    def _remove_occurrence(self, key: Tuple[str, int]) -> bool:
+        uid, recurrence_id = key
+        override = self.overrides.pop(key, None)
+        if override is not None:
+            self._unindex_record(override)
+            self._log(DELETE, override)
+        master = self.masters.get(uid)
+        if master is not None:
+            master.component.add("EXDATE", rc.from_timestamp(master.component, recurrence_id))
+            self._log(PUT, master)
+        self._series_changed(uid)
+        return override is not None or master is not None
+
+
+def _discard(records: Dict[str, List[EventRecord]], key: str, record: EventRecord) -> None:
+    """Remove a record from the list of its key in by_uid or by_summary."""
+    others = records.get(key)
+    if others is None:
+        return
+    others[:] = [other for other in others if other is not record]
+    if not others:
+        del records[key]
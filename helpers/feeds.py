@@ -0,0 +1,146 @@
+"""
+Subscribed calendars, .ics files that are downloaded from a URL.
+
+A feed is shown from its last download, an .ics file in the cache directory
+that is loaded into an EventStore like any other calendar. It is downloaded
+again on a schedule with a conditional GET: the ETag and Last-Modified of the
+last download (kept next to it in `<file>.meta`) are sent as If-None-Match and
+If-Modified-Since, and a server whose feed didn't change answers 304 without
+the body, so nothing is written or parsed. A changed feed replaces the file,
+and the store merges the events that changed like it does for any file
+another program changes, see file_watch.
+
+Downloads ask for gzip, which servers usually use for text as large as a
+busy calendar.
+"""
+import gzip
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urljoin
+
+from helpers import http_pool as hp
+from helpers.calendar_cache import cache_dir
+
+# redirects followed per download
+MAX_REDIRECTS = 5
+
+EMPTY_CALENDAR = b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//termcal//Subscribed calendar//EN\r\nEND:VCALENDAR\r\n"
+
+
+class FeedError(Exception):
+    """The server answered with an error or something that isn't a calendar."""
+
+
+class Feed:
+    """A subscribed calendar and its last download."""
+
+    def __init__(self, url: str) -> None:
+        """Initialize the feed.
+
+        Args:
+            url: URL of the .ics file, http(s) or webcal. The user name and
+                password can be given in the URL or in ~/.netrc.
+
+        Raises:
+            ValueError: If the URL isn't an http(s) or webcal URL
+        """
+        self.location = hp.parse_url(url)
+        # without the password
+        self.url = f"{self.location.scheme}://{self.location.netloc}{self.location.path}"
+        self.path = cache_dir() / "feeds" / f"{hp.local_name(self.location)}.ics"
+        self.meta_path = self.path.with_name(self.path.name + ".meta")
+        # the new download, until install() moves it to path
+        self.download_path = self.path.with_name(self.path.name + ".download")
+        self._validators: Dict[str, str] = {}
+
+    def prepare(self) -> None:
+        """Create an empty calendar if the feed wasn't downloaded yet, so it can be loaded before that."""
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_bytes(EMPTY_CALENDAR)
+            # the validators belong to a download that is gone
+            self.meta_path.unlink(missing_ok=True)
+
+    def fetch(self) -> bool:
+        """
+        Download the feed if it changed since the last download.
+
+        Runs in a worker thread. The download is written next to the file of
+        the feed and only replaces it in install(), which the caller does when
+        no save of the store can write the file at the same time.
+
+        Returns:
+            bool: True if the feed changed and was downloaded, False if the
+                server answered 304 Not Modified
+
+        Raises:
+            FeedError: If the server answered with an error
+            OSError: If the server can't be reached
+        """
+        headers = {"Accept-Encoding": "gzip", "Accept": "text/calendar, */*;q=0.5"}
+        validators = self._load_validators()
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        location = self.location
+        for _ in range(MAX_REDIRECTS + 1):
+            response = hp.client_for(location).request("GET", location.path, headers=headers)
+            if response.status in (301, 302, 303, 307, 308) and response.headers.get("Location"):
+                current = f"{location.scheme}://{location.netloc}{location.path}"
+                location = hp.parse_url(urljoin(current, response.headers["Location"]))
+                continue
+            break
+        else:
+            raise FeedError(f"Download of {self.url} failed: too many redirects")
+
+        if response.status == 304:
+            return False
+        if response.status != 200:
+            raise FeedError(f"Download of {self.url} failed: HTTP {response.status}")
+        data = _decode(response)
+        if not data.lstrip(b"\xef\xbb\xbf \t\r\n").upper().startswith(b"BEGIN:VCALENDAR"):
+            raise FeedError(f"{self.url} is not a calendar")
+
+        with open(self.download_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._validators = {key: response.headers[header] for key, header in
+                            (("etag", "ETag"), ("last_modified", "Last-Modified")) if response.headers.get(header)}
+        return True
+
+    def install(self) -> None:
+        """Replace the file of the feed with the last download, and remember its validators."""
+        os.replace(self.download_path, self.path)
+        tmp_path = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._validators, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _load_validators(self) -> Dict[str, str]:
+        try:
+            with open(self.meta_path, "rb") as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return validators if isinstance(validators, dict) else {}
+
+
+def _decode(response: hp.Response) -> bytes:
+    """Undo the content encoding of a response (the transfer encoding is undone by http.client)."""
+    encoding = (response.headers.get("Content-Encoding") or "").strip().lower()
+    if encoding in ("", "identity"):
+        return response.body
+    try:
+        if encoding in ("gzip", "x-gzip"):
+            return gzip.decompress(response.body)
+        if encoding == "deflate":
+            return zlib.decompress(response.body)
+    except (OSError, EOFError, zlib.error) as e:
+        raise FeedError(f"Invalid {encoding} data: {e}")
+    raise FeedError(f"Unsupported content encoding '{encoding}'")
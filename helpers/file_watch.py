@@ -0,0 +1,156 @@
+"""
+Noticing changes that other programs make to calendar files.
+
+Sync tools like vdirsyncer rewrite the .ics file while the calendar is open.
+The files are polled (a stat() per calendar, see file_stat()) and a changed
+file is diffed against a snapshot of the version that was loaded: the VEVENTs
+are grouped by UID, and a UID changed if the content hashes of its VEVENTs
+did. Only the events of changed UIDs are parsed, the store swaps them in with
+EventStore.apply_file_changes().
+
+Snapshots only need the UID of every VEVENT, which is read from its text
+without parsing it. Taking them, diffing and parsing the changed events
+happens in a worker thread, see read_changes().
+"""
+import re
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from icalendar import Calendar, Event, vText
+
+from helpers.ical_mmap import FOLD, MappedCalendar, index_lines, property_value
+
+# inode, mtime in ns and size of a file
+FileStat = Tuple[int, int, int]
+# a VEVENT in a file: offset, length and hash of its text
+Block = Tuple[int, int, bytes]
+
+# the UID line of a VEVENT, or the start of a component nested in it (which may have a UID of its own)
+UID_OR_NESTED = re.compile(rb"^(?:UID[;:]|BEGIN:)", re.MULTILINE | re.IGNORECASE)
+
+
+class Snapshot(NamedTuple):
+    """What a calendar file contained when it was loaded or last diffed."""
+    stat: FileStat
+    # hash of everything that is not a VEVENT (calendar properties, VTIMEZONEs, ...)
+    rest: bytes
+    # UID -> its VEVENTs in file order
+    events: Dict[str, List[Block]]
+
+
+class FileChanges(NamedTuple):
+    """The difference between the snapshot of a file and its current content."""
+    # the stat the store had and the snapshot the changes were made against (None if there was none)
+    loaded: FileStat
+    base: Optional[Snapshot]
+    snapshot: Snapshot
+    # everything that is not a VEVENT, if it changed
+    calendar: Optional[Calendar]
+    # UID -> the text of its VEVENTs now and the parsed VEVENTs, [] if it was removed
+    events: Dict[str, List[Tuple[bytes, Event]]]
+    # whether all events have to be replaced, because there was no snapshot to diff against
+    everything: bool
+    # offset of an unchanged VEVENT in the old file -> its offset in the new one
+    moved: Dict[int, int]
+    # the file, if the caller asked to keep it mapped
+    source: Optional[MappedCalendar]
+
+
+def file_stat(ical_path: Path) -> Optional[FileStat]:
+    """Get the inode, mtime and size of a file, None if it doesn't exist (right now)."""
+    try:
+        stat = Path(ical_path).stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def event_uid(raw: bytes) -> str:
+    """Get the UID of a VEVENT from its raw text without parsing it."""
+    for match in UID_OR_NESTED.finditer(raw, raw.find(b"\n") + 1):
+        if match.group()[:1] in b"Bb":
+            # nested component first, find the UID of the VEVENT itself
+            break
+        end = raw.find(b"\n", match.end())
+        while 0 <= end < len(raw) - 1 and raw[end + 1:end + 2] in (b" ", b"\t"):
+            end = raw.find(b"\n", end + 1)
+        line = FOLD.sub(b"", raw[match.start():end if end >= 0 else len(raw)]).rstrip(b"\r\n")
+        return _decode_uid(line)
+    lines = list(index_lines(raw, (b"UID",)))
+    return _decode_uid(lines[0]) if lines else ""
+
+
+def _decode_uid(line: bytes) -> str:
+    # like str(event.get("UID")), which EventRecord uses
+    return str(vText.from_ical(property_value(line).decode("utf-8", "replace")))
+
+
+def read_changes(ical_path: Path, loaded: FileStat, base: Optional[Snapshot],
+                 keep_mapping: bool = False) -> Optional[FileChanges]:
+    """
+    Find out what changed in a file since its snapshot was taken.
+
+    Runs in a worker thread, it only reads the file and parses the changed
+    events.
+
+    Args:
+        ical_path: Path to the ICS calendar file
+        loaded: the stat of the file when the store was loaded (or last wrote it)
+        base: the snapshot of the file, None if none was taken yet. Without a
+            snapshot a file that is still as it was loaded has no changes, and
+            every event of a changed file counts as changed.
+        keep_mapping: return the mapped file in FileChanges.source, for lazy stores
+
+    Returns:
+        Optional[FileChanges]: the changes, None if the file is missing or was
+            changed while it was read (it's read again on the next poll)
+    """
+    before = file_stat(ical_path)
+    if before is None:
+        return None
+    source = MappedCalendar(ical_path)
+    try:
+        blocks, rest = source.scan()
+        snapshot = Snapshot(before, _hash(rest), {})
+        for offset, length in blocks:
+            raw = source.read(offset, length)
+            snapshot.events.setdefault(event_uid(raw), []).append((offset, length, _hash(raw)))
+
+        # without a snapshot, only a file that is still as it was loaded can be compared
+        everything = base is None and before != loaded
+        if base is None:
+            changed = set(snapshot.events) if everything else set()
+        else:
+            changed = {uid for uid in base.events.keys() | snapshot.events.keys()
+                       if _hashes(base.events.get(uid)) != _hashes(snapshot.events.get(uid))}
+        calendar = None
+        if rest.strip() and (everything or (base is not None and base.rest != snapshot.rest)):
+            # parsing the calendar also registers its VTIMEZONEs for the events below
+            calendar = Calendar.from_ical(rest)
+        events = {uid: [(raw, Event.from_ical(raw)) for raw in
+                        (source.read(offset, length) for offset, length, _ in snapshot.events.get(uid, []))]
+                  for uid in changed}
+        if file_stat(ical_path) != before:
+            source.close()
+            return None
+    except BaseException:
+        source.close()
+        raise
+
+    moved = {}
+    if base is not None:
+        moved = {old[0]: new[0] for uid, blocks in snapshot.events.items() if uid not in changed
+                 for old, new in zip(base.events[uid], blocks)}
+    if not keep_mapping:
+        source.close()
+        source = None
+    return FileChanges(loaded, base, snapshot, calendar, events, everything, moved, source)
+
+
+def _hash(raw: bytes) -> bytes:
+    return blake2b(raw, digest_size=16).digest()
+
+
+def _hashes(blocks: Optional[List[Block]]) -> List[bytes]:
+    return [digest for _, _, digest in blocks or []]
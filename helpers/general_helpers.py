@@ -1,4 +1,8 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Tuple
+from zlib import crc32
+
 from textual.color import Color
 
 
@@ -98,29 +102,68 @@ def validate_date_format(date_input: str, include_time = False) -> datetime:
     
     return parsed_date
     
-def convert_summary_to_color(summary: str) -> Color:
+# hues of the event colours, the same summary always gets the same one
+PALETTE_HUES = (0, 30, 55, 90, 140, 170, 195, 215, 240, 270, 300, 330)
+
+
+@lru_cache(maxsize=None)
+def summary_to_color_slot(summary: str) -> int:
     """
-    Convert a string to a textual Color in r,g,b
+    Get the colour of the eventCells of a summary.
 
     Args:
         summary: the summary of a eventCell
-    
+
+    Returns:
+        int: the index of the colour in PALETTE_HUES
+
+    The checksum is the same on every run (unlike hash()), so events keep their
+    colour. The slot is cached, so each summary is only hashed once no matter
+    how many cells show it.
+    """
+    return crc32(summary.encode("utf-8")) % len(PALETTE_HUES)
+
+
+def color_class(slot: int) -> str:
+    """Get the style class of palette_css() of a colour, see summary_to_color_slot()."""
+    return f"event-color-{slot}"
+
+
+def palette_color(slot: int, dark: bool) -> Tuple[Color, Color]:
+    """
+    Get the background and text colour of a slot of the palette.
+
+    Args:
+        slot: the index of the colour in PALETTE_HUES
+        dark: True for the variant for dark themes
+
     Returns:
-        Color: a textual Color
+        Tuple[Color, Color]: background and text colour
+    """
+    hue = PALETTE_HUES[slot] / 360
+    if dark:
+        return Color.from_hsl(hue, 0.45, 0.32), Color(240, 240, 240)
+    return Color.from_hsl(hue, 0.6, 0.8), Color(16, 16, 16)
+
 
-    This fomula was kinda just invented with the following reasoning:
-    dividing the string into 3 equal length parts, converting to bistring
-    so that we can do math on it and always get same color for same summary.
-    The * 57 should not be too expensive, computationally and randomize the colors
-    of very similar names through a little 
+def palette_css() -> str:
     """
-    bitstring = summary.encode("utf-8")
+    Generate the style classes of the event colours.
 
-    r = (57 * (sum(bitstring[:int(len(bitstring)/3)]) % 255)) % 192
-    g = (57 * (sum(bitstring[int(len(bitstring)/3):int(2*len(bitstring)/3)])) % 255) % 192
-    b = (57 * (sum(bitstring[int(2*len(bitstring)/3):]) % 255)) % 192
+    Every class has a variant for dark and for light themes, so all cells of
+    a colour share one style, and switching themes doesn't restyle each cell.
 
-    return Color(r,g,b)
+    Returns:
+        str: TCSS with a rule per colour and theme brightness
+    """
+    rules = []
+    for slot in range(len(PALETTE_HUES)):
+        for variant, dark in (("dark", True), ("light", False)):
+            background, color = palette_color(slot, dark)
+            rules.append(
+                f"EventCell.event-color-{slot}:{variant} {{ background: {background.hex}; color: {color.hex}; }}"
+            )
+    return "\n".join(rules)
 
 # TODO: move to actual testing files
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+"""
+Kept-alive HTTP connections to the servers calendars are downloaded from.
+
+Every server gets one connection (see client_for()) that is used for all
+requests to it, by every calendar on it, instead of connecting (and doing
+the TLS handshake) again for every request. Only http.client from the
+standard library is used.
+"""
+import http.client
+import netrc
+import re
+import threading
+from base64 import b64encode
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+# seconds to wait for a server
+TIMEOUT = 30
+
+# user name and password
+Credentials = Tuple[str, str]
+
+
+class Response(NamedTuple):
+    """A response that was read completely."""
+    status: int
+    headers: http.client.HTTPMessage
+    body: bytes
+
+
+class Location(NamedTuple):
+    """Where a calendar is on a server, see parse_url()."""
+    scheme: str
+    # host and port
+    netloc: str
+    # path and query
+    path: str
+    credentials: Optional[Credentials]
+
+
+class HttpClient:
+    """A kept-alive connection to a server.
+
+    Requests are sent one at a time over the same connection, which is
+    opened again if the server closed it in between.
+    """
+
+    def __init__(self, scheme: str, netloc: str, credentials: Optional[Credentials]) -> None:
+        """Initialize the client, the connection is opened by the first request.
+
+        Args:
+            scheme: "http" or "https"
+            netloc: host and port of the server
+            credentials: user name and password for basic authentication
+        """
+        self.scheme = scheme
+        self.netloc = netloc
+        self._authorization = None
+        if credentials is not None:
+            self._authorization = "Basic " + b64encode(":".join(credentials).encode()).decode("ascii")
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Response:
+        """
+        Send a request and read the response.
+
+        Args:
+            method: e.g. "GET"
+            path: the path (and query) of the resource
+            body: the body of the request
+            headers: further headers
+
+        Returns:
+            Response: the response
+        """
+        headers = dict(headers or {})
+        if self._authorization is not None:
+            headers["Authorization"] = self._authorization
+        with self._lock:
+            for attempt in range(2):
+                connection = self._connect()
+                try:
+                    connection.request(method, path, body, headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError):
+                    # the server closed the kept-alive connection, once is worth another try
+                    self.close()
+                    if attempt:
+                        raise
+                    continue
+                except BaseException:
+                    self.close()
+                    raise
+                if response.will_close:
+                    self.close()
+                return Response(response.status, response.headers, data)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            self._connection = connection_class(self.netloc, timeout=TIMEOUT)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# (scheme, host and port, user name) -> the client of a server
+_clients: Dict[Tuple[str, str, Optional[str]], HttpClient] = {}
+
+
+def client_for(location: Location) -> HttpClient:
+    """Get the client of a server, so calendars on the same server share its connection."""
+    key = (location.scheme, location.netloc, location.credentials[0] if location.credentials else None)
+    if key not in _clients:
+        _clients[key] = HttpClient(location.scheme, location.netloc, location.credentials)
+    return _clients[key]
+
+
+def parse_url(url: str) -> Location:
+    """
+    Split the URL of a calendar.
+
+    The user name and password can be given in the URL, otherwise they are
+    looked up in ~/.netrc. webcal:// URLs are fetched with https.
+
+    Args:
+        url: the URL
+
+    Returns:
+        Location: where the calendar is
+
+    Raises:
+        ValueError: If the URL isn't an http(s) (or webcal) URL
+    """
+    parts = urlsplit(url)
+    scheme = "https" if parts.scheme == "webcal" else parts.scheme
+    if scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"'{url}' is not an http(s) URL")
+    netloc = parts.hostname + (f":{parts.port}" if parts.port else "")
+    credentials = None
+    if parts.username is not None:
+        credentials = (unquote(parts.username), unquote(parts.password or ""))
+    else:
+        try:
+            login = netrc.netrc().authenticators(parts.hostname)
+        except (OSError, netrc.NetrcParseError):
+            login = None
+        if login is not None:
+            credentials = (login[0], login[2] or "")
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    return Location(scheme, netloc, path, credentials)
+
+
+def local_name(location: Location) -> str:
+    """Get a file name for the local copy of a calendar, e.g. example.org_calendars_work."""
+    return re.sub(r"[^\w.-]+", "_", location.netloc + location.path).strip("_")
@@ -1,61 +1,49 @@
-import icalendar
-from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import Optional, Tuple
 
 from icalendar import Event
 
-from icalendar import Calendar
+from helpers.interval_index import IntervalIndex
+# naive values are in the display zone, see timezones
+from helpers.timezones import to_timestamp
 
-def get_week_events(week_start_utc: datetime, calendar: Calendar) -> List[Event]:
+
+def event_span(event: Event) -> Optional[Tuple[float, float]]:
     """
-    Get all events from the ICS calendar for a given week.
-    
+    Get the [start, end) of a VEVENT as timestamps.
+
     Args:
-        week_start_utc (datetime): The start of the week in UTC (should be a Monday)
-        ics_file_path (Path): Path to the ICS file (defaults to ETH_timetable.ics)
-    
+        event: the VEVENT component
+
     Returns:
-        List[Dict[str, Any]]: List of events with their details
+        Optional[Tuple[float, float]]: start and end, or None if the event has no DTSTART or no DTEND/DURATION
     """
-    # Calculate week end (Sunday 23:59:59)
-    week_end_utc = week_start_utc + timedelta(days=6, hours=23, minutes=59, seconds=59)
-    
-    week_events = []
-    
-    # Iterate through all components in the calendar
-    for component in calendar.walk():
-        if component.name == "VEVENT":
-            event_start = component.get('DTSTART')
-            event_end = component.get('DTEND')
-            
-            if event_start and event_end:
-                # Convert to datetime if needed
-                start_dt = event_start.dt
-                end_dt = event_end.dt
-                
-                # TODO: look over, does this make sense?
-                # Handle date vs datetime objects
-                if hasattr(start_dt, 'date'):
-                    start_date = start_dt.date() if hasattr(start_dt, 'date') else start_dt
-                else:
-                    start_date = start_dt
-                    
-                if hasattr(end_dt, 'date'):
-                    end_date = end_dt.date() if hasattr(end_dt, 'date') else end_dt
-                else:
-                    end_date = end_dt
-                
-                # Check if event falls within the week
-                week_start_date = week_start_utc.date()
-                week_end_date = week_end_utc.date()
-                
-                # Event is in the week if it starts before week ends and ends after week starts
-                #TODO: handle multiweek events
-                if (start_date <= week_end_date and end_date >= week_start_date):
-                    week_events.append(component)
+    event_start = event.get('DTSTART')
+    event_end = event.get('DTEND')
+    event_duration = event.get('DURATION')
+    if not event_start or not (event_end or event_duration):
+        return None
+
+    start = to_timestamp(event_start.dt)
+    if event_end:
+        end = to_timestamp(event_end.dt)
+    else:
+        end = start + event_duration.dt.total_seconds()
+    # zero-length events still have to show up in the week they are in
+    return start, max(end, start + 1)
+
+def get_week_events(week_start: datetime, index: IntervalIndex) -> list:
+    """
+    Get all events from the event index for a given week.
     
-    # Sort events by start time
-    week_events.sort(key=lambda x: x.get('DTSTART').dt)
+    Args:
+        week_start (datetime): The start of the week, naive in the display zone (should be a Monday)
+        index (IntervalIndex): the index of the event records of the calendar
     
-    return week_events
\ No newline at end of file
+    Returns:
+        list: List of event records in the week, sorted by start time
+    """
+    # Event is in the week if it starts before week ends and ends after week starts
+    #TODO: handle multiweek events
+    week_end = week_start + timedelta(days=7)
+    return index.overlap(to_timestamp(week_start), to_timestamp(week_end))
@@ -0,0 +1,188 @@
+import mmap
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from icalendar import vDuration
+
+from helpers import timezones as tz
+
+# a fold is a line break followed by a space or tab
+FOLD = re.compile(rb"\r?\n[ \t]")
+
+# the properties needed to put an event into the index without parsing all of it
+INDEX_PROPERTIES = (b"UID", b"DTSTART", b"DTEND", b"DURATION", b"RECURRENCE-ID", b"RRULE", b"RDATE")
+
+# the value of a content line starts after the first colon that isn't in a quoted parameter
+VALUE_START = re.compile(rb'(?:[^":]|"[^"]*")*:')
+
+# DATE and DATE-TIME values, e.g. 20240916 or 20240916T080000Z
+DATE_TIME = re.compile(rb"(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})(Z)?)?$")
+
+
+
+class MappedCalendar:
+    """An .ics file that is memory-mapped instead of read into memory.
+
+    The file is scanned once for the byte ranges of its VEVENTs; their text is
+    only copied out of the mapping when it's needed, see read().
+    """
+
+    def __init__(self, ical_path: Path) -> None:
+        """Map a file.
+
+        Args:
+            ical_path: Path to the ICS calendar file
+        """
+        self.path = Path(ical_path)
+        self._file = open(ical_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # empty files can't be mapped
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Get the raw text of the component at the given byte range."""
+        return self.map[offset:offset + length]
+
+    def close(self) -> None:
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self._file.close()
+
+    def scan(self) -> Tuple[List[Tuple[int, int]], bytes]:
+        """
+        Find the byte ranges of all VEVENTs.
+
+        Only looks for BEGIN:VEVENT and END:VEVENT at the start of lines, using
+        the (C speed) find of the mapping, nothing is parsed here.
+
+        Returns:
+            Tuple[List[Tuple[int, int]], bytes]: (offset, length) of every VEVENT, and
+                everything that is not a VEVENT (calendar properties, VTIMEZONEs, ...)
+                as one iCalendar text
+        """
+        m = self.map
+        blocks = []
+        rest = []
+        pos = 0
+        while True:
+            begin = self._find_line(b"BEGIN:VEVENT", pos)
+            if begin < 0:
+                rest.append(m[pos:])
+                break
+            end = self._find_line(b"END:VEVENT", begin)
+            if end < 0:
+                # unterminated VEVENT, leave it to the parser to complain
+                rest.append(m[pos:])
+                break
+            eol = m.find(b"\n", end)
+            stop = len(m) if eol < 0 else eol + 1
+            rest.append(m[pos:begin])
+            blocks.append((begin, stop - begin))
+            pos = stop
+        return blocks, b"".join(rest)
+
+    def _find_line(self, needle: bytes, pos: int) -> int:
+        """Find the next line starting with needle (it could also appear within a DESCRIPTION)."""
+        m = self.map
+        while True:
+            i = m.find(needle, pos)
+            if i <= 0 or m[i - 1:i] == b"\n":
+                return i
+            pos = i + 1
+
+
+def index_lines(raw: bytes, properties: Tuple[bytes, ...] = INDEX_PROPERTIES) -> Iterator[bytes]:
+    """
+    Get the unfolded lines of a VEVENT that are needed to index it.
+
+    Args:
+        raw: the raw text of a VEVENT
+        properties: the names of the properties to get
+
+    Yields:
+        bytes: the UID, DTSTART, DTEND, DURATION, RECURRENCE-ID, RRULE and RDATE lines
+            (or the given properties) of the VEVENT itself, not of nested components
+            like VALARM
+    """
+    depth = 0
+    for line in FOLD.sub(b"", raw).splitlines():
+        upper = line[:16].upper()
+        if upper.startswith(b"BEGIN:"):
+            depth += 1
+        elif upper.startswith(b"END:"):
+            depth -= 1
+        elif depth == 1 and upper.split(b";", 1)[0].split(b":", 1)[0] in properties:
+            yield line
+
+
+def property_value(line: bytes) -> bytes:
+    """Get the (still escaped) value of an unfolded content line."""
+    match = VALUE_START.match(line)
+    return line[match.end():] if match else b""
+
+
+def parse_index_lines(lines: List[bytes]) -> Optional[Tuple[str, float, float, Optional[float]]]:
+    """
+    Get the UID, start, end and RECURRENCE-ID from the lines of index_lines().
+
+    Only handles the common forms of these properties; None is returned for
+    anything else, in which case the lines should be parsed with icalendar.
+
+    Args:
+        lines: the unfolded UID, DTSTART, DTEND, DURATION and RECURRENCE-ID lines
+
+    Returns:
+        Optional[Tuple[str, float, float, Optional[float]]]: UID, start and end as
+            timestamps, and the RECURRENCE-ID as timestamp if there is one
+    """
+    uid = ""
+    start = end = recurrence_id = duration = None
+    for line in lines:
+        head, _, value = line.partition(b":")
+        name, *params = head.split(b";")
+        name = name.upper()
+        if name == b"UID":
+            uid = value.decode("utf-8", errors="replace")
+        elif name == b"DURATION":
+            duration = vDuration.from_ical(value.decode("ascii")).total_seconds()
+        else:
+            timestamp = _parse_date_time(value, params)
+            if timestamp is None:
+                return None
+            if name == b"DTSTART":
+                start = timestamp
+            elif name == b"DTEND":
+                end = timestamp
+            elif name == b"RECURRENCE-ID":
+                recurrence_id = timestamp
+
+    if start is None:
+        return None
+    if end is None:
+        if duration is None:
+            return None
+        end = start + duration
+    # zero-length events still have to show up in the week they are in, see ical_helpers.event_span()
+    return uid, start, max(end, start + 1), recurrence_id
+
+
+def _parse_date_time(value: bytes, params: List[bytes]) -> Optional[float]:
+    match = DATE_TIME.match(value.strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, utc = match.groups()
+    if hour is None:
+        return tz.to_timestamp(date(int(year), int(month), int(day)))
+
+    dt = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+    if utc:
+        return dt.replace(tzinfo=timezone.utc).timestamp()
+    tzid = next((p[5:].strip(b'"') for p in params if p[:5].upper() == b"TZID="), None)
+    if tzid is None:
+        # floating time
+        return tz.to_timestamp(dt)
+    zone = tz.resolve(tzid.decode("utf-8", errors="replace"))
+    return dt.replace(tzinfo=zone).timestamp() if zone is not None else None
@@ -0,0 +1,77 @@
+from typing import BinaryIO, Iterator, List, Tuple
+
+
+def iter_content_lines(handle: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Read the content lines of an iCalendar stream one at a time.
+
+    Long lines are folded in .ics files by continuing them on the next line with
+    a leading space or tab. The folds are undone here but the raw lines are kept
+    as well, so components can be written back exactly as they were read.
+
+    Args:
+        handle: a file opened in binary mode
+
+    Yields:
+        Tuple[bytes, bytes]: the unfolded line (without line break) and the raw,
+            still folded line(s) including their line breaks
+    """
+    unfolded: List[bytes] = []
+    raw: List[bytes] = []
+    for line in handle:
+        if line[:1] in (b" ", b"\t") and raw:
+            # folds may split multibyte characters, so unfold before decoding
+            unfolded.append(line[1:].rstrip(b"\r\n"))
+            raw.append(line)
+            continue
+        if raw:
+            yield b"".join(unfolded), b"".join(raw)
+        unfolded = [line.rstrip(b"\r\n")]
+        raw = [line]
+    if raw:
+        yield b"".join(unfolded), b"".join(raw)
+
+
+def iter_components(handle: BinaryIO) -> Iterator[Tuple[str, bytes]]:
+    """
+    Split an iCalendar stream into its components without parsing them.
+
+    Only the current component is held in memory, so this works on files of any
+    size. Components are yielded in file order, which matters for VTIMEZONEs
+    that have to be known before the VEVENTs using them are parsed.
+
+    Args:
+        handle: a file opened in binary mode
+
+    Yields:
+        Tuple[str, bytes]: the name (e.g. "VEVENT", "VTIMEZONE") and raw text of every
+            component directly inside the VCALENDAR. The properties of the VCALENDAR
+            itself are yielded last as ("VCALENDAR", b"BEGIN:VCALENDAR...END:VCALENDAR").
+    """
+    calendar_lines: List[bytes] = []
+    block: List[bytes] = []
+    name = ""
+    depth = 0
+    for line, raw in iter_content_lines(handle):
+        upper = line.upper()
+        if upper.startswith(b"BEGIN:"):
+            depth += 1
+            if depth == 2:
+                name = line[6:].strip().upper().decode("ascii", errors="replace")
+                block = []
+        elif upper.startswith(b"END:"):
+            depth -= 1
+            if depth == 1:
+                block.append(raw)
+                yield name, b"".join(block)
+                block = []
+                continue
+
+        if depth >= 2:
+            block.append(raw)
+        elif line.strip():
+            # BEGIN/END:VCALENDAR and the calendar properties
+            calendar_lines.append(raw)
+
+    if calendar_lines:
+        yield "VCALENDAR", b"".join(calendar_lines)
@@ -0,0 +1,238 @@
+from bisect import bisect_left
+from typing import Any, Dict, Generic, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class IntervalIndex(Generic[T]):
+    """A static-ish interval index over half-open [start, end) intervals.
+
+    The intervals are kept in arrays sorted by start. The sorted array is
+    interpreted as an implicit, perfectly balanced binary search tree (the
+    node at index i of level k has its children at i -/+ 2^(k-1)) where every
+    node is augmented with the max end of its subtree. This is the layout used
+    by cgranges/IITree and allows overlap queries in O(log n + k).
+
+    Removals only empty the slot of an interval (its end becomes -inf, so it
+    never overlaps anything), which keeps the augmentation valid: a max end
+    that is too large only makes a query look at one subtree too many. Inserts
+    go to a small unsorted buffer that queries scan. So editing one event
+    doesn't touch the arrays; they are only rewritten (and the augmentation
+    rebuilt in O(n)) once the buffer is full or too many slots are empty.
+    """
+
+    # subtrees with at most 2^SMALL_LEVEL nodes are scanned linearly
+    SMALL_LEVEL = 3
+    # inserted intervals that are scanned by every query before they are merged into the arrays
+    MAX_ADDED = 64
+    # share of empty slots from which the arrays are rewritten without them
+    MAX_EMPTY_RATIO = 0.25
+
+    def __init__(self) -> None:
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._items: List[T] = []
+        self._max_ends: List[float] = []
+        self._max_level = -1
+        self._dirty = False
+        # id(item) -> (start, end) so that removal doesn't need the caller's keys
+        self._keys: Dict[int, Tuple[float, float]] = {}
+        # (start, end, item) inserted since the arrays were last written, in insertion order
+        self._added: List[Tuple[float, float, T]] = []
+        # slots of removed intervals, see remove()
+        self._empty = 0
+
+    @classmethod
+    def from_items(cls, items: List[Tuple[float, float, T]]) -> "IntervalIndex[T]":
+        """Bulk-build an index from (start, end, item) triples in O(n log n).
+
+        Args:
+            items: the intervals to index, in any order
+
+        Returns:
+            IntervalIndex: the built index
+        """
+        index = cls()
+        items = sorted(items, key=lambda x: (x[0], x[1]))
+        index._starts = [s for s, _, _ in items]
+        index._ends = [e for _, e, _ in items]
+        index._items = [i for _, _, i in items]
+        index._keys = {id(i): (s, e) for s, e, i in items}
+        index._dirty = True
+        return index
+
+    @classmethod
+    def from_sorted(cls, starts: List[float], ends: List[float], items: List[T]) -> "IntervalIndex[T]":
+        """Build an index from columns that are already sorted by start, see columns().
+
+        Args:
+            starts: start of every interval, ascending
+            ends: end of every interval
+            items: the payloads
+
+        Returns:
+            IntervalIndex: the built index
+        """
+        index = cls()
+        index._starts, index._ends, index._items = list(starts), list(ends), list(items)
+        index._keys = {id(i): (s, e) for s, e, i in zip(index._starts, index._ends, index._items)}
+        index._dirty = True
+        return index
+
+    def columns(self) -> Tuple[List[float], List[float], List[T]]:
+        """Get the starts, ends and payloads sorted by start, e.g. to persist them."""
+        self._compact()
+        return self._starts, self._ends, self._items
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, item: Any) -> bool:
+        return id(item) in self._keys
+
+    def __iter__(self) -> Iterator[T]:
+        self._compact()
+        return iter(self._items)
+
+    def add(self, start: float, end: float, item: T) -> None:
+        """Insert an interval.
+
+        Args:
+            start: start of the interval (inclusive)
+            end: end of the interval (exclusive)
+            item: the payload, e.g. an event
+        """
+        self._added.append((start, end, item))
+        self._keys[id(item)] = (start, end)
+        if len(self._added) > self.MAX_ADDED:
+            self._compact()
+
+    def remove(self, item: T) -> bool:
+        """Remove an interval by its payload (identity).
+
+        Args:
+            item: the payload that was passed to add()
+
+        Returns:
+            bool: True if the item was found and removed
+        """
+        key = self._keys.pop(id(item), None)
+        if key is None:
+            return False
+        for j, added in enumerate(self._added):
+            if added[2] is item:
+                del self._added[j]
+                return True
+        start = key[0]
+        i = bisect_left(self._starts, start)
+        while i < len(self._starts) and self._starts[i] == start:
+            if self._items[i] is item:
+                # empty the slot, queries skip it
+                self._ends[i] = float("-inf")
+                self._items[i] = None
+                self._empty += 1
+                if self._empty > len(self._starts) * self.MAX_EMPTY_RATIO:
+                    self._compact()
+                return True
+            i += 1
+        return False
+
+    def _compact(self) -> None:
+        """Merge the inserted intervals into the arrays and drop the empty slots."""
+        if not self._added and not self._empty:
+            return
+        live = [(s, e, i) for s, e, i in zip(self._starts, self._ends, self._items) if i is not None]
+        if self._added:
+            # stable, so equal starts keep insertion order
+            live.extend(self._added)
+            live.sort(key=lambda x: x[0])
+        self._starts = [s for s, _, _ in live]
+        self._ends = [e for _, e, _ in live]
+        self._items = [i for _, _, i in live]
+        self._added = []
+        self._empty = 0
+        self._dirty = True
+
+    def overlap(self, start: float, end: float) -> List[T]:
+        """Return every item whose interval overlaps [start, end), sorted by start.
+
+        Args:
+            start: start of the query window (inclusive)
+            end: end of the query window (exclusive)
+
+        Returns:
+            List[T]: the overlapping payloads
+        """
+        if self._dirty:
+            self._build()
+        added = [(s, item) for s, e, item in self._added if s < end and start < e]
+        n = len(self._starts)
+        if n == 0:
+            return [item for _, item in sorted(added, key=lambda x: x[0])]
+
+        starts, ends, max_ends = self._starts, self._ends, self._max_ends
+        hits: List[int] = []
+        # stack of (level, node index, left child already visited)
+        stack = [(self._max_level, (1 << self._max_level) - 1, False)]
+        while stack:
+            k, x, left_done = stack.pop()
+            if k <= self.SMALL_LEVEL:
+                # small subtree: scan it in order
+                i = x >> k << k
+                i1 = min(i + (1 << (k + 1)) - 1, n)
+                while i < i1 and starts[i] < end:
+                    if start < ends[i]:
+                        hits.append(i)
+                    i += 1
+            elif not left_done:
+                stack.append((k, x, True))
+                left = x - (1 << (k - 1))
+                # left child may be out of range, in that case descend anyway
+                if left >= n or max_ends[left] > start:
+                    stack.append((k - 1, left, False))
+            elif x < n and starts[x] < end:
+                if start < ends[x]:
+                    hits.append(x)
+                stack.append((k - 1, x + (1 << (k - 1)), False))
+
+        hits.sort()
+        if not added:
+            return [self._items[i] for i in hits]
+        # inserted after the intervals in the arrays, so they go after those with the same start
+        merged = [(starts[i], self._items[i]) for i in hits] + added
+        merged.sort(key=lambda x: x[0])
+        return [item for _, item in merged]
+
+    def _build(self) -> None:
+        """Recompute the max-end augmentation of the implicit tree in O(n)."""
+        n = len(self._starts)
+        self._max_ends = list(self._ends)
+        self._dirty = False
+        if n == 0:
+            self._max_level = -1
+            return
+
+        max_ends = self._max_ends
+        # leaves (level 0) are the even indices
+        last_i = (n - 1) & ~1
+        last = max_ends[last_i]
+        k = 1
+        while (1 << k) <= n:
+            x = 1 << (k - 1)
+            i0 = (x << 1) - 1
+            step = x << 2
+            for i in range(i0, n, step):
+                left = max_ends[i - x]
+                right = max_ends[i + x] if i + x < n else last
+                m = max_ends[i]
+                if left > m:
+                    m = left
+                if right > m:
+                    m = right
+                max_ends[i] = m
+            # the rightmost node of this level, used as the right child of out-of-range nodes
+            last_i = last_i - x if (last_i >> k) & 1 else last_i + x
+            if last_i < n and max_ends[last_i] > last:
+                last = max_ends[last_i]
+            k += 1
+        self._max_level = k - 1
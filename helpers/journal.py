@@ -0,0 +1,142 @@
+"""
+Append-only journal of the changes made to a calendar.
+
+Rewriting the whole .ics file on every edit makes saving O(file size), and an
+error in the middle of the write leaves a broken calendar behind. Instead, each
+change is appended to a journal next to the calendar (`<calendar>.journal`)
+and fsync'd, and the journal is replayed on top of the calendar when it is
+loaded. Now and then the changes are folded into the calendar itself and the
+journal is removed, see EventStore.compact().
+
+Every line of the journal is one JSON entry keyed by the UID and RECURRENCE-ID
+of an event: either the full new text of the event ("put") or its removal
+("delete"). Entries replace whatever is stored under their key, so replaying
+them twice (e.g. after a crash between writing the calendar and removing the
+journal) gives the same result. A line that was only partly written is
+dropped.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+PUT = "put"
+DELETE = "delete"
+
+# (operation, UID, RECURRENCE-ID as epoch seconds, text of the VEVENT for puts)
+Entry = Tuple[str, str, Optional[int], Optional[bytes]]
+
+
+def journal_path(ical_path: Path) -> Path:
+    """Get the path of the journal of a calendar."""
+    ical_path = Path(ical_path)
+    return ical_path.with_name(ical_path.name + ".journal")
+
+
+class Journal:
+    """The journal of one calendar file."""
+
+    def __init__(self, ical_path: Path) -> None:
+        """Initialize the journal, the file is only created by the first append().
+
+        Args:
+            ical_path: Path to the ICS calendar file
+        """
+        self.path = journal_path(ical_path)
+
+    def replay(self) -> List[Entry]:
+        """
+        Read all entries of the journal.
+
+        A partly written last entry is cut off the file, so new entries are not
+        appended to it.
+
+        Returns:
+            List[Entry]: the entries in the order they were written
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        entries: List[Entry] = []
+        valid = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+                text = entry["ical"]
+                entries.append((entry["op"], entry["uid"], entry["rid"],
+                                text.encode("utf-8", "surrogateescape") if text is not None else None))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                break
+            valid += len(line)
+
+        if valid < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+        return entries
+
+    def append(self, entries: Iterable[Entry]) -> None:
+        """
+        Append entries to the journal and wait until they are on disk.
+
+        Args:
+            entries: the entries to write
+        """
+        lines = [
+            json.dumps({
+                "op": op,
+                "uid": uid,
+                "rid": recurrence_id,
+                "ical": text.decode("utf-8", "surrogateescape") if text is not None else None,
+            }).encode("utf-8") + b"\n"
+            for op, uid, recurrence_id, text in entries
+        ]
+        if not lines:
+            return
+        new = not self.path.exists()
+        # unbuffered, so a failed write can be undone right away
+        with open(self.path, "ab", buffering=0) as f:
+            size = f.tell()
+            try:
+                f.write(b"".join(lines))
+                os.fsync(f.fileno())
+            except OSError:
+                # don't leave a partial entry behind, it would hide everything appended after it
+                f.truncate(size)
+                raise
+        if new:
+            _fsync_dir(self.path.parent)
+
+    def size(self) -> int:
+        """Get the size of the journal in bytes, 0 if there is none."""
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def clear(self) -> None:
+        """Remove the journal, once its changes are part of the calendar file."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            return
+        _fsync_dir(self.path.parent)
+
+
+def _fsync_dir(path: Path) -> None:
+    """Make the creation/removal of a file in path durable (not possible on every OS)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,103 +1,221 @@
-from math import floor
-
-from icalendar import Event
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from heapq import heappop, heappush
+from datetime import datetime, timedelta
 
 from textual.app import App
 
-from typing import List
+from typing import List, Sequence, Tuple
+
+from helpers import ical_helpers as ih
+from helpers.event_record import EventRecord
 
+import GLOBALS
 
-def overlap_list(daylist: List[Event]) -> List[List[Event]]:
-    """Return columns of non-overlapping icalendar.Event components.
+# an event of a day and the rows of its cell: (top, bottom, event)
+CellSpan = Tuple[int, int, EventRecord]
+# the events of a day: (event, top, height, lane, lane span, lanes of its overlap cluster)
+DayLayout = List[Tuple[EventRecord, int, int, int, int, int]]
 
-    Filters out any items that are not VEVENTs or that are missing DTSTART/DTEND/UID,
-    so downstream code (EventCell) can rely on SUMMARY/UID existing.
+
+def cell_layout(starts: Sequence[int], ends: Sequence[int],
+                midnights: Sequence[int]) -> Tuple[List[int], List[int], List[int]]:
     """
-    # Keep only proper VEVENTs with required properties
-    events: List[Event] = [
-        e for e in daylist
-        if isinstance(e, Event)
-        and e.get("DTSTART") is not None
-        and e.get("DTEND") is not None
-        and e.get("UID") is not None
-    ]
-    if not events:
-        return []
-
-    # Sort chronologically by DTSTART
-    events.sort(key=lambda e: getattr(e.get("DTSTART"), "dt", None))
-
-    columns: List[List[Event]] = []
-    for ev in events:
-        placed = False
-        for col in columns:
-            if not collides_with(col[-1], ev):
-                col.append(ev)
-                placed = True
-                break
-        if not placed:
-            columns.append([ev])
+    Calculate the day, top and height of the cells of many events in one go.
+
+    Start and end are both rounded to the resolution (GLOBALS.RESOLUTION_MINUTES)
+    before they are turned into rows, so an event that ends when the next
+    one starts ends on the row the next one starts on. Converting the rounded
+    duration instead let the following cells drift by a row.
+    Only integer math is used, and events are cut off at the start and end of
+    their day.
+
+    Args:
+        starts: start of every event as epoch seconds, e.g. a column of the store's index
+        ends: end of every event as epoch seconds (exclusive)
+        midnights: the midnights of the days, and of the day after the last one, ascending
+
+    Returns:
+        Tuple[List[int], List[int], List[int]]: the index of the day (in midnights) the
+            event starts on, and the top and height of its cell in rows
+    """
+    slot = GLOBALS.RESOLUTION_MINUTES * 60
+    half_slot = slot // 2
+    # rows per slot, as a fraction (rows_per_hour * minutes / 60) to stay in integers
+    rows = GLOBALS.HOUR_HEIGHT * GLOBALS.RESOLUTION_MINUTES
+    last_day = len(midnights) - 2
+
+    days, tops, heights = [], [], []
+    for start, end in zip(starts, ends):
+        # events starting before the first day are shown from its start
+        day = min(max(bisect_right(midnights, start) - 1, 0), last_day)
+        midnight = midnights[day]
+        first_slot = (max(start, midnight) - midnight + half_slot) // slot
+        last_slot = (min(end, midnights[day + 1]) - midnight + half_slot) // slot
+        top = first_slot * rows // 60
+        days.append(day)
+        tops.append(top)
+        heights.append(max(last_slot * rows // 60 - top, 1))
+    return days, tops, heights
+
+
+def assign_lanes(spans: List[CellSpan]) -> DayLayout:
+    """
+    Assign overlapping cells to lanes that are shown side by side.
 
-    return columns
+    Sweeps over the cells from top to bottom in O(n log n): a min-heap of the
+    bottoms of the busy lanes frees the lanes of cells that ended, and the
+    lowest free lane is taken. Cells that overlap, directly or through other
+    cells, form a cluster that is as wide as the most lanes it needed at
+    once. Every cell is then widened over the lanes to its right that are
+    free for its whole height.
 
+    Args:
+        spans: the rows of the cells of the events of a day
 
-def collides_with(prev_event: Event, curr_event: Event) -> bool:
-    prev_dtend_prop = prev_event.get("DTEND")
-    curr_dtstart_prop = curr_event.get("DTSTART")
-    if prev_dtend_prop is None or curr_dtstart_prop is None:
-        return False
-    prev_dtend = getattr(prev_dtend_prop, "dt", None)
-    curr_dtstart = getattr(curr_dtstart_prop, "dt", None)
-    if prev_dtend is None or curr_dtstart is None:
-        return False
-    return prev_dtend > curr_dtstart
+    Returns:
+        DayLayout: the events with top, height, lane, lane span and number of lanes
+            of their cluster, from top to bottom
+    """
+    # longer cells first, so they get the lanes further left
+    spans = sorted(spans, key=lambda span: (span[0], -span[1]))
+
+    layout: DayLayout = []
+    cluster: List[Tuple[CellSpan, int]] = []
+    busy: List[Tuple[int, int]] = []  # (bottom, lane)
+    free: List[int] = []
+    lanes = 0
+    for span in spans:
+        while busy and busy[0][0] <= span[0]:
+            heappush(free, heappop(busy)[1])
+        if not busy and cluster:
+            # nothing is running anymore, so nothing further down can overlap this cluster
+            layout.extend(_span_lanes(cluster, lanes))
+            cluster, free, lanes = [], [], 0
+
+        if free:
+            lane = heappop(free)
+        else:
+            lane = lanes
+            lanes += 1
+        heappush(busy, (span[1], lane))
+        cluster.append((span, lane))
+
+    if cluster:
+        layout.extend(_span_lanes(cluster, lanes))
+    return layout
+
+
+def _span_lanes(cluster: List[Tuple[CellSpan, int]], lanes: int) -> DayLayout:
+    """Widen the cells of a cluster over the free lanes to their right."""
+    # the cells of every lane from top to bottom; they don't overlap, so their bottoms are in order too
+    lane_spans: List[List[CellSpan]] = [[] for _ in range(lanes)]
+    for span, lane in cluster:
+        lane_spans[lane].append(span)
+    lane_tops = [[top for top, _, _ in spans] for spans in lane_spans]
+
+    layout = []
+    for (top, bottom, event), lane in cluster:
+        width = 1
+        for other in range(lane + 1, lanes):
+            # the last cell of the other lane starting above the bottom of this one
+            i = bisect_left(lane_tops[other], bottom) - 1
+            if i >= 0 and lane_spans[other][i][1] > top:
+                break
+            width += 1
+        layout.append((event, top, bottom - top, lane, width, lanes))
+    return layout
 
 
-def calc_padding_and_height(daylist: List[Event]):
-    padding = []
-    height = []
+def week_layout(calendars, week_start: datetime) -> List[DayLayout]:
+    """
+    Lay out the events of a week.
 
-    for event, i in zip(daylist, range(len(daylist))):
-        start = event.get("DTSTART").dt
-        end = event.get("DTEND").dt
+    Filters out any records without UID, so downstream code (EventCell) can
+    rely on it existing.
 
-        if i == 0:
-            delta_padding = start - start.replace(hour=0, minute=0)
-        else:
-            delta_padding = start - daylist[i-1].get("DTEND").dt
-    
-        padding.append(int(timedelta_to_cell_height(delta_padding)))
+    Args:
+        calendars: the CalendarSet (or EventStore) of the events
+        week_start: Start date of the week (Monday)
 
-        delta_height = end - start
-        height.append(timedelta_to_cell_height(delta_height))
+    Returns:
+        List[DayLayout]: the layout of every day of the week, Monday first
+    """
+    events = [event for event in calendars.week_events(week_start) if event.uid]
+    midnights = [int(ih.to_timestamp(week_start + timedelta(days=day))) for day in range(8)]
+    days, tops, heights = cell_layout([e.start for e in events], [e.end for e in events], midnights)
 
-    return [height, padding]
+    spans_per_day: List[List[CellSpan]] = [[] for _ in range(7)]
+    for event, day, top, height in zip(events, days, tops, heights):
+        spans_per_day[day].append((top, top + height, event))
+    return [assign_lanes(spans) for spans in spans_per_day]
 
 
-def timedelta_to_cell_height(timedelta, hour_height=4):
-    sec = timedelta.seconds
-    
-    hours = (floor(sec/3600)) * hour_height
-    minutes = round_resolution((1/60) * ((sec/60)%60)) * hour_height
+class WeekLayoutCache:
+    """LRU cache of week_layout() results.
 
-    return max(hours + minutes, 1)
+    Entries are keyed by the week and the generation of the calendars, which
+    every change of the events increments, so edited weeks are laid out
+    again while flipping back and forth between weeks only costs mounting
+    the widgets.
+    """
 
+    def __init__(self, calendars, maxsize: int = 16) -> None:
+        """Initialize the cache.
+
+        Args:
+            calendars: the CalendarSet (or EventStore) of the events
+            maxsize: how many weeks are kept
+        """
+        self.calendars = calendars
+        self.maxsize = maxsize
+        self._cache: OrderedDict = OrderedDict()
+
+    def __contains__(self, week_start: datetime) -> bool:
+        return (week_start, self.calendars.generation) in self._cache
+
+    def get(self, week_start: datetime) -> List[DayLayout]:
+        """Get the layout of a week, laying it out if it isn't cached."""
+        key = (week_start, self.calendars.generation)
+        layout = self._cache.get(key)
+        if layout is not None:
+            self._cache.move_to_end(key)
+            return layout
+
+        # layouts of older generations won't be asked for again
+        if any(generation != key[1] for _, generation in self._cache):
+            self._cache.clear()
+        layout = week_layout(self.calendars, week_start)
+        self._cache[key] = layout
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return layout
+
+    def keep_unchanged(self, generation: int, spans: List[Tuple[float, float]]) -> None:
+        """Keep the layouts of the weeks a change didn't touch, e.g. after a file was reloaded.
+
+        Args:
+            generation: the generation of the calendars before the change
+            spans: start and end (epoch seconds) of everything that changed
+        """
+        kept: OrderedDict = OrderedDict()
+        for (week_start, cached_generation), layout in self._cache.items():
+            if cached_generation == generation and not week_touches(week_start, spans):
+                kept[(week_start, self.calendars.generation)] = layout
+        self._cache = kept
+
+
+def week_touches(week_start: datetime, spans: List[Tuple[float, float]]) -> bool:
+    """Check whether any of the spans (start and end as epoch seconds) overlaps a week."""
+    start = ih.to_timestamp(week_start)
+    end = ih.to_timestamp(week_start + timedelta(days=7))
+    return any(span_start < end and start < span_end for span_start, span_end in spans)
 
-def round_resolution(value, resolution=0.25):
-    # rounds to resolution e.g. round_resolution(4.33) = 4.25
-    return round(value/resolution) * resolution
 
 def pop_all_screens(main_app: App, depth = 1) -> None:
     while len(main_app.screen_stack)>depth:
         main_app.pop_screen()
 
-def refresh_and_restore_scroll(main_app: App) -> None:
-    from weekview.WeekGrid import WeekGrid
-    wg = main_app.query_one(WeekGrid)
-    y = wg.vscroll.scroll_y
-    wg.refresh(recompose=True)
-    wg.call_after_refresh(lambda: wg.vscroll.scroll_to(y=y, animate=False))
-
-# TODO: remove, just for testing atm
-if __name__ == "__main__":
-    print(calc_padding_and_height([]))
\ No newline at end of file
+def refresh_week_grid(main_app: App) -> None:
+    """Show the changes made to the events in the week grid (or canvas)."""
+    main_app.query_one("#week").update_days()
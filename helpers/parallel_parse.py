@@ -0,0 +1,110 @@
+"""
+Parsing one large calendar on several cores.
+
+icalendar parses one VEVENT at a time on one core, which is most of the time
+it takes to load a large file. Instead the file is split at its BEGIN:VEVENT
+lines (see MappedCalendar.scan()) into chunks of consecutive events, and
+worker processes parse the chunks into the fields of their EventRecords.
+Only these fields are sent back, the text of the events is read from the file
+by the process that builds the store.
+
+Every worker parses the rest of the file (calendar properties, VTIMEZONEs)
+once when it starts, so it resolves the TZIDs of its events like the store
+does.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from icalendar import Component, Event
+
+from helpers import ical_stream as ics
+from helpers import recurrence as rc
+from helpers import timezones as tz
+from helpers.event_record import EventRecord
+from helpers.ical_mmap import MappedCalendar
+
+# smaller files are parsed faster than worker processes start
+PARALLEL_MIN_SIZE = 1 << 20
+# chunks per worker; more, smaller chunks even out how long the workers take
+CHUNKS_PER_WORKER = 4
+
+# the fields of an EventRecord: UID, start, end, summary, location, RECURRENCE-ID
+Fields = Tuple[str, int, int, str, str, Optional[int]]
+
+# the file of the calendar, in the worker processes
+_source: Optional[MappedCalendar] = None
+
+
+def available_cpus() -> int:
+    """Get the number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_count(ical_path: Path, processes: Optional[int] = None) -> int:
+    """
+    Decide how many processes should parse a file.
+
+    Args:
+        ical_path: Path to the ICS calendar file
+        processes: the most processes to use, None for one per CPU
+
+    Returns:
+        int: the number of worker processes, 1 if the file should be parsed
+            by the calling process
+    """
+    if os.path.getsize(ical_path) < PARALLEL_MIN_SIZE:
+        return 1
+    return max(1, available_cpus() if processes is None else processes)
+
+
+def parse_blocks(ical_path: Path, blocks: List[Tuple[int, int]], rest: bytes,
+                 workers: int) -> Iterator[Optional[Fields]]:
+    """
+    Parse the VEVENTs of a file in worker processes.
+
+    Args:
+        ical_path: Path to the ICS calendar file
+        blocks: (offset, length) of the VEVENTs, see MappedCalendar.scan()
+        rest: everything that is not a VEVENT, see MappedCalendar.scan()
+        workers: the number of worker processes
+
+    Yields:
+        Optional[Fields]: the fields of the record of every block, in the order of
+            the blocks. None for series masters and events without start or end,
+            which the store has to parse itself (it keeps their components).
+    """
+    size = -(-len(blocks) // (workers * CHUNKS_PER_WORKER)) or 1
+    chunks = [blocks[i:i + size] for i in range(0, len(blocks), size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker,
+                             initargs=(ical_path, rest, tz.display_timezone_name())) as pool:
+        yield from chain.from_iterable(pool.map(_parse_chunk, chunks))
+
+
+def _start_worker(ical_path: Path, rest: bytes, timezone: Optional[str]) -> None:
+    global _source
+    tz.set_display_timezone(timezone)
+    for name, raw in ics.iter_components(io.BytesIO(rest)):
+        if name not in ("VCALENDAR", "VEVENT"):
+            # parsing a VTIMEZONE registers it for the TZIDs of the events
+            Component.from_ical(raw)
+    _source = MappedCalendar(ical_path)
+
+
+def _parse_chunk(blocks: List[Tuple[int, int]]) -> List[Optional[Fields]]:
+    """Parse a chunk of VEVENTs (runs in a worker process)."""
+    parsed: List[Optional[Fields]] = []
+    for offset, length in blocks:
+        event = Event.from_ical(_source.read(offset, length))
+        record = EventRecord.from_event(event)
+        if record is None or (rc.is_recurring(event) and record.recurrence_id is None):
+            parsed.append(None)
+        else:
+            parsed.append((record.uid, record.start, record.end, record.summary, record.location,
+                           record.recurrence_id))
+    return parsed
@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dateutil.rrule import rruleset, rrulestr
+from icalendar import Event, vRecur
+
+from helpers import ical_helpers as ih
+from helpers import timezones as tz
+from helpers.event_record import EventRecord
+
+# properties that describe the series and are not copied onto single occurrences
+SERIES_PROPERTIES = ("DTSTART", "DTEND", "DURATION", "RRULE", "RDATE", "EXDATE", "EXRULE", "RECURRENCE-ID")
+
+
+def is_recurring(event: Event) -> bool:
+    """Whether a VEVENT is the master of a recurring series."""
+    return event.get("RRULE") is not None or event.get("RDATE") is not None
+
+
+def as_list(value) -> list:
+    """Properties that appear multiple times are returned as lists by icalendar."""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def property_dates(event: Event, name: str) -> list:
+    """Get all date(time)s of a (possibly repeated) RDATE/EXDATE property."""
+    return [d.dt for prop in as_list(event.get(name)) for d in prop.dts]
+
+
+def event_duration(event: Event) -> timedelta:
+    """Get the duration of an event from DTEND or DURATION."""
+    start = event.get("DTSTART").dt
+    if event.get("DTEND") is not None:
+        return event.get("DTEND").dt - start
+    if event.get("DURATION") is not None:
+        return event.get("DURATION").dt
+    # RFC 5545: all-day events without end last one day, others are instantaneous
+    return timedelta(days=1) if not isinstance(start, datetime) else timedelta(0)
+
+
+def as_datetime(value) -> datetime:
+    """Turn a date into a datetime at midnight, datetimes are returned as is."""
+    return value if isinstance(value, datetime) else datetime.combine(value, time())
+
+
+def align(value, dtstart: datetime) -> datetime:
+    """Make a date(time) comparable with dtstart (naive vs aware, date vs datetime)."""
+    value = as_datetime(value)
+    if dtstart.tzinfo is not None and value.tzinfo is None:
+        return value.replace(tzinfo=dtstart.tzinfo)
+    if dtstart.tzinfo is None and value.tzinfo is not None:
+        # floating times are in the display zone
+        return tz.to_floating(value)
+    return value
+
+
+def build_rruleset(master: Event) -> rruleset:
+    """Build the dateutil rruleset of a series master.
+
+    Args:
+        master: a VEVENT with RRULE and/or RDATE
+
+    Returns:
+        rruleset: the set of all occurrence starts, as datetimes
+    """
+    dtstart = as_datetime(master.get("DTSTART").dt)
+    rset = rruleset(cache=True)
+
+    for recur in as_list(master.get("RRULE")):
+        # UNTIL is applied separately since dateutil refuses mixing naive and aware values
+        rule = rrulestr(vRecur({k: v for k, v in recur.items() if k != "UNTIL"}).to_ical().decode(),
+                        dtstart=dtstart)
+        if recur.get("UNTIL"):
+            until = recur["UNTIL"][0]
+            if not isinstance(until, datetime):
+                # a date UNTIL includes the whole day
+                until = datetime.combine(until, time.max)
+            rule = rule.replace(until=align(until, dtstart))
+        rset.rrule(rule)
+
+    for rdate in property_dates(master, "RDATE"):
+        rset.rdate(align(rdate, dtstart))
+    for exdate in property_dates(master, "EXDATE"):
+        rset.exdate(align(exdate, dtstart))
+    return rset
+
+
+def series_span(master: Event) -> Tuple[float, float]:
+    """Get the [start, end) timestamps covered by a whole series.
+
+    Series without COUNT or UNTIL are open-ended and end at infinity.
+    """
+    start = ih.to_timestamp(master.get("DTSTART").dt)
+    duration = event_duration(master).total_seconds()
+
+    rules = as_list(master.get("RRULE"))
+    if any(not r.get("UNTIL") and not r.get("COUNT") for r in rules):
+        return start, float("inf")
+
+    # bounded series, including RDATEs: the last occurrence ends the span
+    last = start
+    for occurrence in build_rruleset(master):
+        last = max(last, ih.to_timestamp(occurrence))
+    return start, max(last + duration, start + 1)
+
+
+def from_timestamp(master: Event, timestamp: int):
+    """Convert epoch seconds to a date(time) of the same kind (and zone) as DTSTART of the master."""
+    dtstart = master.get("DTSTART").dt
+    if not isinstance(dtstart, datetime):
+        return tz.to_date(timestamp)
+    return tz.from_timestamp(timestamp, dtstart.tzinfo)
+
+
+def make_occurrence(master: Event, recurrence_id: int) -> Event:
+    """Materialize the VEVENT of a single occurrence of a series.
+
+    Args:
+        master: the VEVENT with the RRULE/RDATE
+        recurrence_id: start of the occurrence as epoch seconds
+
+    Returns:
+        Event: a copy of the master with DTSTART, DTEND and RECURRENCE-ID of the occurrence
+    """
+    start = from_timestamp(master, recurrence_id)
+    occurrence = Event()
+    for key, value in master.items():
+        if key not in SERIES_PROPERTIES:
+            occurrence[key] = value
+    occurrence.add("DTSTART", start)
+    occurrence.add("DTEND", start + event_duration(master))
+    occurrence.add("RECURRENCE-ID", start)
+    return occurrence
+
+
+class RecurrenceExpander:
+    """Lazily expands recurring series into single occurrences.
+
+    Occurrences are only generated for the requested window and memoized per
+    (UID, window) in a bounded LRU cache, so flipping between weeks doesn't
+    expand the same series over and over.
+    """
+
+    def __init__(self, overrides: Dict[Tuple[str, int], EventRecord], maxsize: int = 512) -> None:
+        """Initialize the expander.
+
+        Args:
+            overrides: (UID, RECURRENCE-ID timestamp) -> record of the overriding VEVENT. Occurrences
+                that are overridden are skipped, the override is indexed like a normal event.
+            maxsize: maximum number of (UID, window) entries to keep
+        """
+        self.overrides = overrides
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[Tuple[str, float, float], List[EventRecord]]" = OrderedDict()
+        self._rulesets: Dict[str, rruleset] = {}
+
+    def occurrences(self, master: EventRecord, window_start: float, window_end: float) -> List[EventRecord]:
+        """Get the occurrences of a series overlapping [window_start, window_end).
+
+        Args:
+            master: the record of the VEVENT with the RRULE/RDATE
+            window_start: start of the window as timestamp
+            window_end: end of the window as timestamp
+
+        Returns:
+            List[EventRecord]: one record per occurrence, with recurrence_id set and
+                without component (see make_occurrence())
+        """
+        uid = master.uid
+        key = (uid, window_start, window_end)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        occurrences = self._expand(master, uid, window_start, window_end)
+        self._cache[key] = occurrences
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return occurrences
+
+    def invalidate(self, uid: str) -> None:
+        """Forget everything cached for a series, e.g. after it was edited."""
+        self._rulesets.pop(uid, None)
+        for key in [k for k in self._cache if k[0] == uid]:
+            del self._cache[key]
+
+    def _expand(self, master: EventRecord, uid: str, window_start: float, window_end: float) -> List[EventRecord]:
+        dtstart = master.component.get("DTSTART").dt
+        duration = max(master.end - master.start, 1)
+
+        rset = self._rulesets.get(uid)
+        if rset is None:
+            rset = self._rulesets[uid] = build_rruleset(master.component)
+
+        # rruleset works on datetimes in the zone of DTSTART
+        zone = as_datetime(dtstart).tzinfo
+        after = tz.from_timestamp(window_start - duration, zone)
+        before = tz.from_timestamp(window_end, zone)
+
+        occurrences = []
+        for start in rset.between(after, before, inc=True):
+            start_ts = int(ih.to_timestamp(start))
+            if not (start_ts < window_end and window_start < start_ts + duration):
+                continue
+            if (uid, start_ts) in self.overrides:
+                continue
+            occurrences.append(EventRecord(uid, start_ts, start_ts + duration, master.summary,
+                                           master.location, recurrence_id=start_ts))
+        return occurrences
+
+
+def recurrence_key(record: EventRecord) -> Optional[Tuple[str, int]]:
+    """Get the (UID, RECURRENCE-ID timestamp) of an occurrence or override, if any."""
+    if record.recurrence_id is None:
+        return None
+    return record.uid, record.recurrence_id
@@ -0,0 +1,99 @@
+"""
+Full-text search over the SUMMARY, LOCATION and DESCRIPTION of events.
+
+An inverted index maps every word to the events containing it. The words
+are also kept sorted, so a query word matches every word it is a prefix of
+with a binary search instead of looking at all words. Events match if they
+contain all words of the query.
+"""
+import re
+from bisect import bisect_left
+from typing import Dict, FrozenSet, List, Optional, Set
+
+from helpers.event_record import EventRecord
+
+# the properties that are searched
+SEARCH_PROPERTIES = (b"SUMMARY", b"LOCATION", b"DESCRIPTION")
+
+WORD = re.compile(r"\w+")
+# escaped line breaks of TEXT values, they separate words
+ESCAPED_BREAK = re.compile(r"\\[nN]")
+
+
+def words(text: str) -> FrozenSet[str]:
+    """Split a text into the words that are indexed (case-insensitive)."""
+    return frozenset(WORD.findall(ESCAPED_BREAK.sub(" ", text).casefold()))
+
+
+class SearchIndex:
+    """Inverted index of the words of the events of a calendar.
+
+    The index only references the records; EventStore keeps it in sync and
+    provides the text of the events, see EventStore.search().
+    """
+
+    def __init__(self) -> None:
+        # word -> the events containing it
+        self._postings: Dict[str, Set[EventRecord]] = {}
+        # event -> its words, to remove it again
+        self._words: Dict[EventRecord, FrozenSet[str]] = {}
+        # the words in order, None if it has to be sorted again
+        self._vocabulary: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, record: EventRecord, text: str) -> None:
+        """Index an event, replacing what was indexed for it before.
+
+        Args:
+            record: the record of the event
+            text: everything that should be searchable, see EventStore.search_text()
+        """
+        self.remove(record)
+        record_words = words(text)
+        self._words[record] = record_words
+        for word in record_words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                self._vocabulary = None
+            postings.add(record)
+
+    def remove(self, record: EventRecord) -> None:
+        """Forget an event, if it is indexed."""
+        for word in self._words.pop(record, ()):
+            postings = self._postings[word]
+            postings.discard(record)
+            if not postings:
+                del self._postings[word]
+                self._vocabulary = None
+
+    def search(self, query: str) -> Set[EventRecord]:
+        """Find the events that contain all words of a query.
+
+        Every word of the query also matches words it is the start of, so
+        "alg" finds "Algebra".
+
+        Args:
+            query: the words to search for
+
+        Returns:
+            Set[EventRecord]: the matching events, empty if the query has no words
+        """
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+
+        result: Optional[Set[EventRecord]] = None
+        # longer words first, they usually match fewer events
+        for prefix in sorted(words(query), key=len, reverse=True):
+            matches: Set[EventRecord] = set()
+            i = bisect_left(vocabulary, prefix)
+            while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+                matches.update(self._postings[vocabulary[i]])
+                i += 1
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result or set()
@@ -0,0 +1,743 @@
+"""
+Calendars kept in an SQLite database instead of an .ics file.
+
+An EventStore holds the index of every event in memory, which limits it to
+calendars that fit in RAM. A SqliteStore answers the same queries from a
+table with one row per VEVENT, indexed on (kind, start, end), UID and
+summary: the events of a week are one range query, and only the records that
+were shown are kept in memory. Series masters and overrides are few, they are
+loaded when the store is opened, like the DayIndex, which is built from one
+pass over the start/end columns.
+
+The database is in WAL mode, so several instances of the app can use the same
+calendar: readers don't block the writer. Every change is also appended to the
+`changes` table; the other instances notice the commit (PRAGMA data_version)
+and update their indexes from the changes they haven't seen, see
+apply_external_changes().
+
+Changes made in the app are committed right away, so the write lock is only
+held for as long as a change takes and other instances can write in between.
+Calendars are moved in and out with import_ics() and export_ics().
+"""
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from icalendar import Calendar, Component, Event
+
+from helpers import ical_stream as ics
+from helpers import recurrence as rc
+from helpers import timezones as tz
+from helpers.day_index import DayIndex
+from helpers.event_record import EventRecord
+from helpers.interval_index import IntervalIndex
+from helpers.journal import DELETE, PUT, Entry
+from helpers.search_index import SEARCH_PROPERTIES, words
+
+# file suffixes of SQLite calendars
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+# bump whenever the schema changes
+SCHEMA_VERSION = 1
+# the changes of the last this many writes are kept for other instances, see apply_external_changes()
+CHANGES_KEPT = 10000
+# milliseconds to wait for another instance that is writing
+BUSY_TIMEOUT = 5000
+# rows inserted at a time by import_ics()
+IMPORT_BATCH = 1000
+# events changed at a time by update_many()
+UPDATE_CHUNK = 200
+
+# kinds of rows: single events and overrides, series masters, and VEVENTs without start/end
+EVENT, MASTER, UNINDEXED = 0, 1, 2
+# kind of the row of the changes table that tells the other instances to load everything again
+RELOAD = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS calendar (id INTEGER PRIMARY KEY CHECK (id = 0), ical BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind INTEGER NOT NULL,
+    uid TEXT NOT NULL,
+    recurrence_id INTEGER,
+    -- the span of the event, of all occurrences for series masters, NULL without start/end
+    start INTEGER,
+    "end" INTEGER,
+    summary TEXT NOT NULL DEFAULT '',
+    location TEXT NOT NULL DEFAULT '',
+    -- the words of the searched properties, " word word ", see search()
+    words TEXT NOT NULL DEFAULT '',
+    ical BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_span ON events (kind, start, "end");
+CREATE INDEX IF NOT EXISTS events_uid ON events (uid);
+CREATE INDEX IF NOT EXISTS events_summary ON events (summary);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    writer TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    kind INTEGER NOT NULL,
+    start INTEGER,
+    "end" INTEGER,
+    -- 1 if the row was inserted, 0 if it was deleted
+    added INTEGER NOT NULL
+);
+"""
+
+EMPTY_CALENDAR = b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//termcal//SQLite calendar//EN\r\nEND:VCALENDAR\r\n"
+
+
+def is_sqlite(path: Path) -> bool:
+    """Check whether a calendar path is an SQLite database (by its suffix)."""
+    return Path(path).suffix.lower() in SQLITE_SUFFIXES
+
+
+class SqliteStore:
+    """A calendar in an SQLite database, queried like an EventStore.
+
+    Has the query and change methods of EventStore that the app uses, so
+    CalendarSet and the screens work with both. Records are cached by row,
+    so the same event is always the same record.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Open (or create) the database, see from_path().
+
+        Args:
+            path: Path to the SQLite database
+        """
+        self.path = Path(path)
+        self.lazy = False
+        # incremented by every change of the events, see layout_helpers.WeekLayoutCache
+        self.generation = 0
+        # changes that were committed but not reported to the save worker yet, see take_changes()
+        self._pending: List[Entry] = []
+        # the connection is shared with the worker threads
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=BUSY_TIMEOUT / 1000)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # tells our own rows of the changes table from those of other instances
+        self._writer = uuid.uuid4().hex
+        self._data_version = 0
+        self._seen = 0
+
+        self.calendar = Calendar()
+        # UID -> record of the series master
+        self.masters: Dict[str, EventRecord] = {}
+        self.series_index: IntervalIndex[EventRecord] = IntervalIndex()
+        # (UID, RECURRENCE-ID) -> record overriding a single occurrence of a series
+        self.overrides: Dict[Tuple[str, int], EventRecord] = {}
+        self.expander = rc.RecurrenceExpander(self.overrides)
+        # row id -> its record and id() of a record -> its row, for the records that were queried
+        self._records: Dict[int, EventRecord] = {}
+        self._rows: Dict[int, int] = {}
+        # the longest event, events starting this long before a window can still overlap it
+        self._max_length = 0
+        self.days = DayIndex(self._overlap, self.series_occurrences)
+
+    @classmethod
+    def from_path(cls, path: Path) -> "SqliteStore":
+        """Open an SQLite calendar, creating it if it doesn't exist.
+
+        Loads the calendar properties (registering its VTIMEZONEs), the series
+        masters and overrides, and builds the DayIndex.
+
+        Args:
+            path: Path to the SQLite database
+
+        Returns:
+            SqliteStore: the store
+        """
+        store = cls(path)
+        with store._lock:
+            store._migrate()
+            store._load()
+            store._db.commit()
+        return store
+
+    def _migrate(self) -> None:
+        """Set up a new database, or recompute the spans of one written in another display zone."""
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if int(meta.get("version", SCHEMA_VERSION)) > SCHEMA_VERSION:
+            raise ValueError(f"{self.path} was written by a newer version")
+        # only write if needed, another instance may be writing
+        if not self._db.execute("SELECT COUNT(*) FROM calendar").fetchone()[0]:
+            self._db.execute("INSERT INTO calendar VALUES (0, ?)", (EMPTY_CALENDAR,))
+        self._load_calendar()
+        timezone = tz.display_timezone_key()
+        if meta.get("timezone", timezone) != timezone:
+            # floating times and dates depend on the display zone
+            self._reindex()
+        if meta.get("version") != str(SCHEMA_VERSION) or meta.get("timezone") != timezone:
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                 [("version", str(SCHEMA_VERSION)), ("timezone", timezone)])
+        first, last = self._db.execute("SELECT MIN(seq), MAX(seq) FROM changes").fetchone()
+        if last is not None and last - first >= CHANGES_KEPT:
+            self._db.execute("DELETE FROM changes WHERE seq <= ?", (last - CHANGES_KEPT,))
+
+    def _load_calendar(self) -> None:
+        (ical,), = self._db.execute("SELECT ical FROM calendar")
+        # parsing the calendar also registers its VTIMEZONEs for the events
+        self.calendar = Calendar.from_ical(ical)
+
+    def _load(self) -> None:
+        """Load what is kept in memory, after opening or when another instance changed too much."""
+        self._data_version = self._version()
+        self._seen = self._db.execute("SELECT IFNULL(MAX(seq), 0) FROM changes").fetchone()[0]
+        self._records.clear()
+        self._rows.clear()
+        self.masters.clear()
+        self.overrides.clear()
+        series_spans = []
+        for (ical,) in self._db.execute("SELECT ical FROM events WHERE kind = ?", (MASTER,)):
+            event = Event.from_ical(ical)
+            record = EventRecord.from_event(event)
+            self.masters[record.uid] = record
+            series_spans.append((*rc.series_span(event), record))
+        self.series_index = IntervalIndex.from_items(series_spans)
+        for row in self._db.execute(_SELECT_RECORD + "WHERE kind = ? AND recurrence_id IS NOT NULL", (EVENT,)):
+            record = self._record(row)
+            self.overrides[(record.uid, record.recurrence_id)] = record
+        self._max_length = self._db.execute(
+            'SELECT IFNULL(MAX("end" - start), 0) FROM events WHERE kind = ?', (EVENT,)).fetchone()[0]
+        self.expander = rc.RecurrenceExpander(self.overrides)
+        # one row at a time, the columns aren't held in memory
+        self.days.build((), ())
+        for start, end in self._db.execute('SELECT start, "end" FROM events WHERE kind = ?', (EVENT,)):
+            self.days.add(start, end)
+        self.days.invalidate_series()
+
+    def _reindex(self) -> None:
+        """Compute the span of every event again from its text."""
+        rows = self._db.execute("SELECT id, ical FROM events").fetchall()
+        for row_id, ical in rows:
+            event = Event.from_ical(ical)
+            record = EventRecord.from_event(event)
+            kind, start, end = _placement(event, record)
+            self._db.execute('UPDATE events SET kind = ?, start = ?, "end" = ? WHERE id = ?',
+                             (kind, start, end, row_id))
+
+    def _version(self) -> int:
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def week_events(self, week_start: datetime) -> List[EventRecord]:
+        """Get all events of the week starting at week_start, sorted by start.
+
+        Recurring series are expanded into their occurrences of that week.
+        """
+        window_start = tz.to_timestamp(week_start)
+        window_end = tz.to_timestamp(week_start + timedelta(days=7))
+        events = self._overlap(window_start, window_end)
+        occurrences = self.series_occurrences(window_start, window_end)
+        if occurrences:
+            events = sorted(events + occurrences, key=lambda r: r.start)
+        return events
+
+    def _overlap(self, start: float, end: float) -> List[EventRecord]:
+        """Get the (non-series) events overlapping [start, end), sorted by start."""
+        with self._lock:
+            rows = self._db.execute(
+                _SELECT_RECORD + 'WHERE kind = ? AND start >= ? AND start < ? AND "end" > ? ORDER BY start',
+                (EVENT, int(start) - self._max_length, end, start)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def series_occurrences(self, start: float, end: float) -> List[EventRecord]:
+        """Get the occurrences of all series overlapping [start, end), see DayIndex."""
+        return [
+            occurrence
+            for master in self.series_index.overlap(start, end)
+            for occurrence in self.expander.occurrences(master, start, end)
+        ]
+
+    def search(self, query: str, limit: int = 200) -> List[EventRecord]:
+        """Find the events whose SUMMARY, LOCATION and DESCRIPTION contain all words of a query.
+
+        Every word of the query also matches words it is the start of, like
+        the SearchIndex of an EventStore.
+
+        Args:
+            query: the words (or starts of words) to search for
+            limit: the maximum number of events returned
+
+        Returns:
+            List[EventRecord]: the first matching events (series by their first
+                occurrence), sorted by start
+        """
+        prefixes = words(query)
+        if not prefixes:
+            return []
+        conditions = " AND ".join(["words LIKE ? ESCAPE '\\'"] * len(prefixes))
+        patterns = ["% " + prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                    for prefix in prefixes]
+        with self._lock:
+            rows = self._db.execute(
+                _SELECT_RECORD + f"WHERE kind != ? AND {conditions} ORDER BY start, uid LIMIT ?",
+                (UNINDEXED, *patterns, limit)).fetchall()
+        results = [self.masters.get(row[1]) if row[7] == MASTER else self._record(row) for row in rows]
+        return [record for record in results if record is not None]
+
+    def with_summary(self, summary: str) -> List[EventRecord]:
+        """Get the events (and series masters) with exactly this title, see EventStore.with_summary()."""
+        with self._lock:
+            rows = self._db.execute(_SELECT_RECORD + "WHERE summary = ? AND kind != ? ORDER BY start",
+                                    (summary, UNINDEXED)).fetchall()
+        results = [self.masters.get(row[1]) if row[7] == MASTER else self._record(row) for row in rows]
+        return [record for record in results if record is not None]
+
+    def search_index_steps(self) -> Iterator[None]:
+        """Nothing to build, the database is searched directly."""
+        return iter(())
+
+    def owns(self, record: EventRecord) -> bool:
+        """Check whether an event (or occurrence of a series) belongs to this calendar."""
+        if id(record) in self._rows:
+            return True
+        master = self.masters.get(record.uid)
+        return master is record or (master is not None and record.recurrence_id is not None)
+
+    def is_master(self, record: EventRecord) -> bool:
+        """Check whether a record is the master of a series of this calendar."""
+        return self.masters.get(record.uid) is record
+
+    def component(self, record: EventRecord) -> Event:
+        """Get the full VEVENT of a record, materializing occurrences of series."""
+        if record.component is None:
+            row_id = self._rows.get(id(record))
+            if row_id is not None:
+                with self._lock:
+                    (ical,), = self._db.execute("SELECT ical FROM events WHERE id = ?", (row_id,))
+                record.component = Event.from_ical(ical)
+            else:
+                master = self.masters[record.uid]
+                record.component = rc.make_occurrence(master.component, record.recurrence_id)
+        return record.component
+
+    def add(self, event: Event) -> Optional[EventRecord]:
+        """Add a new event to the calendar.
+
+        Returns:
+            Optional[EventRecord]: the record of the event, None if it has no start/end
+        """
+        record = EventRecord.from_event(event)
+        if record is None:
+            return None
+        with self._lock, self._db:
+            self._store(record, event)
+        self._log(PUT, record)
+        return record
+
+    def update(self, record: EventRecord, event: Event) -> None:
+        """Write an event again after it was changed in place.
+
+        Editing an occurrence of a series that isn't stored yet turns it into an
+        override of that occurrence.
+
+        Args:
+            record: the record that was edited
+            event: its (edited) component
+        """
+        with self._lock, self._db:
+            self._update(record, event)
+
+    def _update(self, record: EventRecord, event: Event) -> None:
+        stored = self._delete(record)
+        if record.load(event):
+            self._store(record, event)
+            self._log(PUT, record)
+        elif stored:
+            # without start/end it can't be shown anymore
+            self._log(DELETE, record)
+
+    def update_many(self, records: List[EventRecord], edit: Callable[[Event], None]) -> Iterator[int]:
+        """Change many events the same way, see EventStore.update_many().
+
+        Every step is committed on its own, so other instances can write in
+        between.
+
+        Yields:
+            int: the number of events changed so far, after every UPDATE_CHUNK events
+        """
+        for i in range(0, len(records), UPDATE_CHUNK):
+            with self._lock, self._db:
+                for record in records[i:i + UPDATE_CHUNK]:
+                    event = self.component(record)
+                    edit(event)
+                    self._update(record, event)
+            yield min(i + UPDATE_CHUNK, len(records))
+
+    def remove(self, record: EventRecord) -> bool:
+        """Remove an event from the calendar.
+
+        Removing a single occurrence of a series excludes it from the series
+        with an EXDATE (and drops its override, if it has one).
+
+        Args:
+            record: the record of the event to remove
+
+        Returns:
+            bool: True if an event was removed
+        """
+        with self._lock, self._db:
+            key = rc.recurrence_key(record)
+            if key:
+                return self._remove_occurrence(key)
+            if not self._delete(record):
+                return False
+        self._log(DELETE, record)
+        return True
+
+    def _remove_occurrence(self, key: Tuple[str, int]) -> bool:
+        uid, recurrence_id = key
+        override = self.overrides.get(key)
+        if override is not None:
+            self._delete(override)
+            self._log(DELETE, override)
+        master = self.masters.get(uid)
+        if master is not None:
+            master.component.add("EXDATE", rc.from_timestamp(master.component, recurrence_id))
+            self._delete(master)
+            self._store(master, master.component)
+            self._log(PUT, master)
+        self._series_changed(uid)
+        return override is not None or master is not None
+
+    def replace_events(self, events: Dict[str, List[Event]]) -> List[Tuple[float, float]]:
+        """Replace all events with the given UIDs, e.g. by their versions on a CalDAV server.
+
+        Args:
+            events: UID -> its VEVENTs now (the master and overrides of a series), [] to remove it
+
+        Returns:
+            List[Tuple[float, float]]: start and end of the events (or series)
+                that changed, see EventStore.apply_file_changes()
+        """
+        spans = []
+        with self._lock, self._db:
+            for uid, vevents in events.items():
+                for row in self._db.execute(_SELECT_RECORD + "WHERE uid = ?", (uid,)).fetchall():
+                    record = self.masters.get(uid) if row[7] == MASTER else self._record(row)
+                    if record is None:
+                        continue
+                    spans.append(self._span(record))
+                    self._delete(record)
+                    self._log(DELETE, record)
+                self._db.execute("DELETE FROM events WHERE uid = ? AND kind = ?", (uid, UNINDEXED))
+                for event in vevents:
+                    record = EventRecord.from_event(event)
+                    if record is None:
+                        self._insert_row(UNINDEXED, uid, None, None, None, event.to_ical())
+                        continue
+                    self._store(record, event)
+                    self._log(PUT, record)
+                    spans.append(self._span(record))
+        return spans
+
+    def _store(self, record: EventRecord, event: Event) -> None:
+        """Insert the row of an event and index it, the record then belongs to the row."""
+        kind, start, end = _placement(event, record)
+        row_id = self._insert_row(kind, record.uid, record.recurrence_id, start, end, event.to_ical(),
+                                  record.summary, record.location, _words(event))
+        record.component = event
+        if kind == MASTER:
+            self.masters[record.uid] = record
+            self.series_index.add(start, end, record)
+            self._series_changed(record.uid)
+            return
+        self._records[row_id] = record
+        self._rows[id(record)] = row_id
+        key = rc.recurrence_key(record)
+        if key:
+            self.overrides[key] = record
+            self._series_changed(key[0])
+        self._max_length = max(self._max_length, end - start)
+        self.days.add(start, end)
+
+    def _insert_row(self, kind: int, uid: str, recurrence_id: Optional[int], start: Optional[float],
+                    end: Optional[float], ical: bytes, summary: str = "", location: str = "",
+                    text: str = "") -> int:
+        cursor = self._db.execute(
+            'INSERT INTO events (kind, uid, recurrence_id, start, "end", summary, location, words, ical) '
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, uid, recurrence_id, start, end, summary, location, text, ical))
+        self._note_change(uid, kind, start, end, True)
+        return cursor.lastrowid
+
+    def _delete(self, record: EventRecord) -> bool:
+        """Delete the row of a record and unindex it, False if it has none."""
+        if self.masters.get(record.uid) is record:
+            span = self._span(record)
+            self._db.execute("DELETE FROM events WHERE uid = ? AND kind = ?", (record.uid, MASTER))
+            self._note_change(record.uid, MASTER, *span, False)
+            del self.masters[record.uid]
+            self.series_index.remove(record)
+            self._series_changed(record.uid)
+            return True
+        row_id = self._rows.pop(id(record), None)
+        if row_id is None:
+            return False
+        del self._records[row_id]
+        self._db.execute("DELETE FROM events WHERE id = ?", (row_id,))
+        self._note_change(record.uid, EVENT, record.start, record.end, False)
+        key = rc.recurrence_key(record)
+        if key and self.overrides.get(key) is record:
+            del self.overrides[key]
+            self._series_changed(key[0])
+        self.days.remove(record.start, record.end)
+        return True
+
+    def _note_change(self, uid: str, kind: int, start: Optional[float], end: Optional[float],
+                     added: bool) -> None:
+        """Tell the other instances about a changed row, see apply_external_changes()."""
+        self.generation += 1
+        self._db.execute('INSERT INTO changes (writer, uid, kind, start, "end", added) VALUES (?, ?, ?, ?, ?, ?)',
+                         (self._writer, uid, kind, start, end, added))
+
+    def _span(self, record: EventRecord) -> Tuple[float, float]:
+        """Get the start and end of an event, or of all occurrences of a series."""
+        if self.masters.get(record.uid) is record:
+            return rc.series_span(record.component)
+        return record.start, record.end
+
+    def _series_changed(self, uid: str) -> None:
+        """Forget what was derived from the occurrences of a series."""
+        self.expander.invalidate(uid)
+        self.days.invalidate_series()
+
+    def _record(self, row: tuple) -> EventRecord:
+        """Get the record of a row of _SELECT_RECORD, the same one every time."""
+        record = self._records.get(row[0])
+        if record is None:
+            record = EventRecord(row[1], row[2], row[3], row[4], row[5], row[6])
+            self._records[row[0]] = record
+            self._rows[id(record)] = row[0]
+        return record
+
+    def _log(self, op: str, record: EventRecord) -> None:
+        """Remember a change for the save worker, see write_changes()."""
+        self.generation += 1
+        self._pending.append((op, record.uid, record.recurrence_id, None))
+
+    def save(self) -> None:
+        """Save the changes made since the last save (they are committed already, see write_changes())."""
+        entries = self.take_changes()
+        try:
+            self.write_changes(entries)
+        except BaseException:
+            self.return_changes(entries)
+            raise
+
+    def take_changes(self) -> List[Entry]:
+        """Take the changes made since the last save, see write_changes()."""
+        entries, self._pending = self._pending, []
+        return entries
+
+    def return_changes(self, entries: List[Entry]) -> None:
+        """Put back changes that couldn't be saved, before the ones made since."""
+        self._pending[:0] = entries
+
+    def write_changes(self, entries: List[Entry]) -> None:
+        """Nothing left to write, the changes were committed when they were made.
+
+        Only there for the save worker, which saves every store the same way.
+        """
+
+    def needs_compaction(self) -> bool:
+        """The database never needs to be compacted, see EventStore.needs_compaction()."""
+        return False
+
+    def file_changed(self) -> bool:
+        """Check whether another instance committed changes since they were last applied."""
+        with self._lock:
+            return self._version() != self._data_version
+
+    def apply_external_changes(self) -> List[Tuple[float, float]]:
+        """Update the indexes with the changes other instances committed.
+
+        Returns:
+            List[Tuple[float, float]]: start and end of the events (or series)
+                that changed, see EventStore.apply_file_changes()
+        """
+        with self._lock:
+            self._data_version = self._version()
+            rows = self._db.execute('SELECT seq, writer, uid, kind, start, "end", added FROM changes '
+                                    "WHERE seq > ? ORDER BY seq", (self._seen,)).fetchall()
+            if not rows:
+                return []
+            self.generation += 1
+            if rows[0][0] > self._seen + 1 or any(row[3] == RELOAD and row[1] != self._writer for row in rows):
+                # the changes were pruned meanwhile or there were too many, start over
+                self._load_calendar()
+                self._load()
+                return [(float("-inf"), float("inf"))]
+            self._seen = rows[-1][0]
+
+            rows = [row for row in rows if row[1] != self._writer]
+            uids = {row[2] for row in rows}
+            self._load_calendar()
+            for row_id in [row_id for row_id, record in self._records.items() if record.uid in uids]:
+                del self._rows[id(self._records.pop(row_id))]
+            for uid in uids:
+                self._reload_series(uid)
+            spans = []
+            for _, _, _, kind, start, end, added in rows:
+                if kind in (UNINDEXED, RELOAD):
+                    continue
+                spans.append((start, end))
+                if kind == EVENT and added:
+                    self._max_length = max(self._max_length, end - start)
+                    self.days.add(start, end)
+                elif kind == EVENT:
+                    self.days.remove(start, end)
+            return spans
+
+    def _reload_series(self, uid: str) -> None:
+        """Read the master and overrides of a UID again."""
+        master = self.masters.pop(uid, None)
+        if master is not None:
+            self.series_index.remove(master)
+        for key in [key for key in self.overrides if key[0] == uid]:
+            del self.overrides[key]
+        for row in self._db.execute("SELECT ical FROM events WHERE uid = ? AND kind = ?", (uid, MASTER)):
+            event = Event.from_ical(row[0])
+            master = EventRecord.from_event(event)
+            self.masters[uid] = master
+            self.series_index.add(*rc.series_span(event), master)
+        for row in self._db.execute(_SELECT_RECORD + "WHERE uid = ? AND kind = ? AND recurrence_id IS NOT NULL",
+                                    (uid, EVENT)):
+            record = self._record(row)
+            self.overrides[(uid, record.recurrence_id)] = record
+        self._series_changed(uid)
+
+    def import_ics(self, ical_path: Path) -> int:
+        """
+        Import the events of an .ics file, replacing the events with the same UIDs.
+
+        The file is streamed one component at a time and committed at once.
+        VTIMEZONEs the calendar doesn't have yet are added to it.
+
+        Args:
+            ical_path: Path to the ICS calendar file
+
+        Returns:
+            int: the number of imported events
+        """
+        count = 0
+        known_zones = {str(c.get("TZID")) for c in self.calendar.subcomponents if c.name == "VTIMEZONE"}
+        seen = set()
+        batch = []
+        with self._lock:
+            try:
+                with open(ical_path, "rb") as f:
+                    for name, raw in ics.iter_components(f):
+                        if name == "VEVENT":
+                            event = Event.from_ical(raw)
+                            uid = str(event.get("UID", ""))
+                            if uid not in seen:
+                                seen.add(uid)
+                                self._db.execute("DELETE FROM events WHERE uid = ?", (uid,))
+                            batch.append(_row(event, raw))
+                            count += 1
+                            if len(batch) >= IMPORT_BATCH:
+                                self._insert_rows(batch)
+                                batch = []
+                        elif name == "VCALENDAR":
+                            for key, value in Calendar.from_ical(raw).items():
+                                self.calendar.setdefault(key, value)
+                        else:
+                            component = Component.from_ical(raw)
+                            if name != "VTIMEZONE" or str(component.get("TZID")) not in known_zones:
+                                self.calendar.add_component(component)
+                self._insert_rows(batch)
+                self._db.execute("UPDATE calendar SET ical = ? WHERE id = 0", (self.calendar.to_ical(),))
+                # one change for all, the other instances load everything again
+                self._db.execute('INSERT INTO changes (writer, uid, kind, start, "end", added) '
+                                 "VALUES (?, '', ?, NULL, NULL, 1)", (self._writer, RELOAD))
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            # everything may have changed
+            self._load()
+        self.generation += 1
+        return count
+
+    def _insert_rows(self, rows: List[tuple]) -> None:
+        self._db.executemany(
+            'INSERT INTO events (kind, uid, recurrence_id, start, "end", summary, location, words, ical) '
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def export_ics(self, ical_path: Path) -> int:
+        """
+        Write the calendar to an .ics file.
+
+        The events are streamed from the database into a temporary file that
+        then replaces ical_path.
+
+        Args:
+            ical_path: Path to the ICS calendar file
+
+        Returns:
+            int: the number of exported events
+        """
+        ical_path = Path(ical_path)
+        tmp_path = ical_path.with_name(ical_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f, self._lock:
+                f.writelines(self._parts())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, ical_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def to_ical(self) -> bytes:
+        """Serialize the calendar."""
+        with self._lock:
+            return b"".join(self._parts())
+
+    def _parts(self) -> Iterator[bytes]:
+        """Serialize the calendar one event at a time, like EventStore.serialize()."""
+        header = self.calendar.to_ical()
+        # the events go before END:VCALENDAR
+        yield header[:header.rindex(b"END:VCALENDAR")]
+        for (ical,) in self._db.execute("SELECT ical FROM events ORDER BY kind, start"):
+            yield ical if ical.endswith(b"\n") else ical + b"\r\n"
+        yield b"END:VCALENDAR\r\n"
+
+
+# the columns EventRecords are made from, see SqliteStore._record()
+_SELECT_RECORD = "SELECT id, uid, start, \"end\", summary, location, recurrence_id, kind FROM events "
+
+
+def _placement(event: Event, record: Optional[EventRecord]) -> Tuple[int, Optional[float], Optional[float]]:
+    """Get the kind of the row of an event and its span (of the whole series for masters)."""
+    if record is None:
+        return UNINDEXED, None, None
+    if rc.is_recurring(event) and record.recurrence_id is None:
+        return MASTER, *rc.series_span(event)
+    return EVENT, record.start, record.end
+
+
+def _words(event: Event) -> str:
+    text = "\n".join(str(event.get(name.decode(), "")) for name in SEARCH_PROPERTIES)
+    return " " + " ".join(sorted(words(text))) + " "
+
+
+def _row(event: Event, raw: bytes) -> tuple:
+    """Get the values of the row of an event, see SqliteStore._insert_rows()."""
+    record = EventRecord.from_event(event)
+    kind, start, end = _placement(event, record)
+    if record is None:
+        return kind, str(event.get("UID", "")), None, None, None, "", "", "", raw
+    return (kind, record.uid, record.recurrence_id, start, end, record.summary, record.location,
+            _words(event), raw)
+
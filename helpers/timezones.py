@@ -0,0 +1,135 @@
+"""
+Time zones of the calendar and of the display.
+
+The times of events are stored as epoch seconds (see EventRecord), which
+are the same in every zone and compare correctly no matter which zone an
+event was written in. Zones only matter where times are read from the
+calendar and where epoch seconds are turned back into days and hours:
+
+- TZIDs are resolved once per TZID, see resolve().
+- Floating times (without zone) and dates are in the display zone, which is
+  the local time of the system unless set with set_display_timezone().
+"""
+import time as _time
+from datetime import date, datetime, time, tzinfo
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from icalendar.timezone import tzp
+
+# None: local time of the system
+_display: Optional[tzinfo] = None
+_display_name: Optional[str] = None
+
+# TZID -> tzinfo (None if unknown)
+_by_tzid: Dict[str, Optional[tzinfo]] = {}
+
+
+def set_display_timezone(name: Optional[str]) -> None:
+    """
+    Set the zone the calendar is shown in.
+
+    Args:
+        name: an IANA zone name like "Europe/Berlin", None for the local time of the system
+
+    Raises:
+        ValueError: If there is no zone with that name
+    """
+    global _display, _display_name
+    if name is None:
+        _display = _display_name = None
+        return
+    try:
+        _display = ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone '{name}'")
+    _display_name = name
+
+
+def display_timezone() -> Optional[tzinfo]:
+    """Get the display zone, None if it is the local time of the system."""
+    return _display
+
+
+def display_timezone_name() -> Optional[str]:
+    """Get the name the display zone was set with, None if it is the local time of the system."""
+    return _display_name
+
+
+def display_timezone_key() -> str:
+    """Identify the display zone, e.g. to invalidate caches of times computed in another zone."""
+    if _display_name is not None:
+        return _display_name
+    return f"local:{_time.tzname}:{_time.timezone}:{_time.altzone}"
+
+
+def resolve(tzid: str) -> Optional[tzinfo]:
+    """
+    Get the zone of a TZID.
+
+    VTIMEZONEs of the calendar are known once they were parsed, everything
+    else is looked up by name (IANA and Windows names).
+
+    Args:
+        tzid: the TZID parameter of a property
+
+    Returns:
+        Optional[tzinfo]: the zone, None if it is unknown
+    """
+    if tzid not in _by_tzid:
+        _by_tzid[tzid] = tzp.timezone(tzid)
+    return _by_tzid[tzid]
+
+
+def to_timestamp(value) -> float:
+    """
+    Convert the value of a DTSTART/DTEND to a POSIX timestamp.
+
+    Args:
+        value: a datetime (naive or aware) or a date. Naive values and dates are
+            in the display zone, dates at midnight.
+
+    Returns:
+        float: seconds since the epoch
+    """
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    if value.tzinfo is None and _display is not None:
+        value = value.replace(tzinfo=_display)
+    return value.timestamp()
+
+
+def from_timestamp(timestamp: float, zone: Optional[tzinfo] = None) -> datetime:
+    """
+    Convert a POSIX timestamp to a datetime.
+
+    Args:
+        timestamp: seconds since the epoch
+        zone: the zone of the result. If None, the result is a naive datetime
+            in the display zone, i.e. a floating time.
+
+    Returns:
+        datetime: the time
+    """
+    if zone is not None:
+        return datetime.fromtimestamp(timestamp, zone)
+    if _display is None:
+        return datetime.fromtimestamp(timestamp)
+    return datetime.fromtimestamp(timestamp, _display).replace(tzinfo=None)
+
+
+def to_display(value):
+    """Convert the value of a DTSTART/DTEND to a naive datetime in the display zone, dates are returned as is."""
+    if not isinstance(value, datetime):
+        return value
+    return from_timestamp(to_timestamp(value))
+
+
+def to_floating(value: datetime) -> datetime:
+    """Convert an aware datetime to a naive one in the display zone."""
+    return value.astimezone(_display).replace(tzinfo=None)
+
+
+def to_date(timestamp: float) -> date:
+    """Get the day of a timestamp in the display zone."""
+    return from_timestamp(timestamp).date()
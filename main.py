@@ -10,14 +10,25 @@ sys.path.insert(0, str(project_root))
 
 from weekview.week import Week
 from helpers import argparsing as ap
+from helpers.sqlite_store import SqliteStore
 
 def main():
     """Main entry point for the terminal calendar application."""
     try:
         args = ap.parse_arguments()
-        ics_path, week_start = ap.validate_arguments(args)
+        ics_paths, remotes, feeds, week_start = ap.validate_arguments(args)
+
+        if args.import_ics or args.export_ics:
+            store = SqliteStore.from_path(ics_paths[0])
+            if args.import_ics:
+                count = store.import_ics(Path(args.import_ics))
+                print(f"Imported {count} events into {ics_paths[0]}")
+            if args.export_ics:
+                count = store.export_ics(Path(args.export_ics))
+                print(f"Exported {count} events to {args.export_ics}")
+                return
         
-        app = Week(ics_path, week_start)
+        app = Week(ics_paths, week_start, lazy=args.lazy, canvas=args.canvas, remotes=remotes, feeds=feeds)
         app.run()
 
     except Exception as e:
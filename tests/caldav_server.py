@@ -0,0 +1,146 @@
+"""
+A stand-in CalDAV server for the tests of caldav_sync.
+
+Answers the two REPORTs a sync sends, sync-collection (RFC 6578) and
+calendar-multiget, over kept-alive HTTP/1.1 connections, from resources
+held in memory. Every change gets a new version; the sync token is the
+version the client has seen.
+"""
+import threading
+from base64 import b64encode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+COLLECTION = "/user/cal/"
+TOKEN_PREFIX = "http://dav.test/sync/"
+USER, PASSWORD = "alice", "secret"
+
+
+class CalDavServer(ThreadingHTTPServer):
+    """The server, and the calendar collection it serves."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.version = 0
+        # href -> ETag and calendar data
+        self.resources: Dict[str, Tuple[str, str]] = {}
+        # (version, href, removed) of every change
+        self.log: List[Tuple[int, str, bool]] = []
+        # tokens older than this are refused as invalid
+        self.forget_before = 0
+        # sync tokens the client sent, "" for none
+        self.tokens: List[str] = []
+        # hrefs downloaded with calendar-multiget
+        self.downloaded: List[str] = []
+        self.connections = 0
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{USER}:{PASSWORD}@{host}:{port}{COLLECTION}"
+
+    def start(self) -> "CalDavServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def put(self, name: str, data: str) -> str:
+        """Add or change a resource of the collection, returns its href."""
+        href = COLLECTION + name
+        self.version += 1
+        self.resources[href] = (f'"{self.version}"', data)
+        self.log.append((self.version, href, False))
+        return href
+
+    def delete(self, name: str) -> str:
+        """Remove a resource of the collection, returns its href."""
+        href = COLLECTION + name
+        self.version += 1
+        del self.resources[href]
+        self.log.append((self.version, href, True))
+        return href
+
+    def sync_collection(self, token: str) -> Optional[bytes]:
+        """Answer a sync-collection REPORT, None if the token is invalid."""
+        self.tokens.append(token)
+        if token:
+            if not token.startswith(TOKEN_PREFIX) or int(token[len(TOKEN_PREFIX):]) < self.forget_before:
+                return None
+            since = int(token[len(TOKEN_PREFIX):])
+            changed = {href: removed for version, href, removed in self.log if version > since}
+        else:
+            changed = {href: False for href in self.resources}
+        parts = []
+        for href, removed in changed.items():
+            if removed or href not in self.resources:
+                parts.append(f"<D:response><D:href>{href}</D:href>"
+                             "<D:status>HTTP/1.1 404 Not Found</D:status></D:response>")
+            else:
+                parts.append(f"<D:response><D:href>{href}</D:href><D:propstat><D:prop>"
+                             f"<D:getetag>{escape(self.resources[href][0])}</D:getetag></D:prop>"
+                             "<D:status>HTTP/1.1 200 OK</D:status></D:propstat></D:response>")
+        return (f'<?xml version="1.0"?><D:multistatus xmlns:D="DAV:">{"".join(parts)}'
+                f"<D:sync-token>{TOKEN_PREFIX}{self.version}</D:sync-token></D:multistatus>").encode()
+
+    def multiget(self, hrefs: List[str]) -> bytes:
+        """Answer a calendar-multiget REPORT."""
+        parts = []
+        for href in hrefs:
+            self.downloaded.append(href)
+            if href in self.resources:
+                etag, data = self.resources[href]
+                parts.append(f"<D:response><D:href>{href}</D:href><D:propstat><D:prop>"
+                             f"<D:getetag>{escape(etag)}</D:getetag>"
+                             f"<C:calendar-data>{escape(data)}</C:calendar-data></D:prop>"
+                             "<D:status>HTTP/1.1 200 OK</D:status></D:propstat></D:response>")
+            else:
+                parts.append(f"<D:response><D:href>{href}</D:href>"
+                             "<D:status>HTTP/1.1 404 Not Found</D:status></D:response>")
+        return ('<?xml version="1.0"?><D:multistatus xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">'
+                f'{"".join(parts)}</D:multistatus>').encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: CalDavServer
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_REPORT(self) -> None:
+        authorization = "Basic " + b64encode(f"{USER}:{PASSWORD}".encode()).decode()
+        if self.headers.get("Authorization") != authorization:
+            return self._send(401)
+        root = ElementTree.fromstring(self.rfile.read(int(self.headers["Content-Length"])))
+        if root.tag == "{DAV:}sync-collection":
+            body = self.server.sync_collection(root.findtext("{DAV:}sync-token") or "")
+            if body is None:
+                return self._send(403, b'<?xml version="1.0"?><D:error xmlns:D="DAV:"><D:valid-sync-token/></D:error>')
+            return self._send(207, body)
+        if root.tag == "{urn:ietf:params:xml:ns:caldav}calendar-multiget":
+            return self._send(207, self.server.multiget([href.text for href in root.iterfind("{DAV:}href")]))
+        self._send(400)
+
+    def _send(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def vcalendar(uid: str, start: str, summary: str, extra: str = "") -> str:
+    """Get a calendar resource with one VEVENT, start like 20240916T090000."""
+    return ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\nBEGIN:VEVENT\r\n"
+            f"UID:{uid}\r\nDTSTART:{start}\r\nDTEND:{start[:9]}235900\r\nSUMMARY:{summary}\r\n{extra}"
+            "END:VEVENT\r\nEND:VCALENDAR\r\n")
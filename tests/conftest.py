@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules are imported from the root of the repository, like main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(autouse=True)
+def user_dirs(tmp_path, monkeypatch):
+    """Keep the caches and CalDAV mirrors the tests write out of the user's directories."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
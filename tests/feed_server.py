@@ -0,0 +1,113 @@
+"""
+A stand-in web server for the tests of feeds.
+
+Serves one calendar at /cal.ics with an ETag and a Last-Modified date,
+answers conditional GETs with 304 when they match, gzips the body when
+asked to, and redirects /old.ics to /cal.ics.
+"""
+import gzip
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+class FeedServer(ThreadingHTTPServer):
+    """The server, and the calendar it serves."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.body = b""
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        # (path, status, request headers) of every request
+        self.requests: List[Tuple[str, int, Dict[str, str]]] = []
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+
+    def url(self, path: str = "/cal.ics") -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self) -> "FeedServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def publish(self, body: bytes, etag: Optional[str], modified: Optional[float]) -> None:
+        """Change the calendar, with its validators (None to leave one out)."""
+        self.body = body
+        self.etag = etag
+        self.last_modified = formatdate(modified, usegmt=True) if modified is not None else None
+
+    @property
+    def statuses(self) -> List[int]:
+        return [status for _, status, _ in self.requests]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FeedServer
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        headers = dict(self.headers.items())
+        if self.path == "/old.ics":
+            self.server.requests.append((self.path, 301, headers))
+            self.send_response(301)
+            self.send_header("Location", "/cal.ics")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path != "/cal.ics":
+            self.server.requests.append((self.path, 404, headers))
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # If-None-Match wins over If-Modified-Since (RFC 9110)
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            not_modified = self.server.etag is not None and if_none_match == self.server.etag
+        else:
+            if_modified_since = self.headers.get("If-Modified-Since")
+            not_modified = if_modified_since is not None and if_modified_since == self.server.last_modified
+        if not_modified:
+            self.server.requests.append((self.path, 304, headers))
+            self.send_response(304)
+            self._validators()
+            self.end_headers()
+            return
+
+        body = self.server.body
+        zipped = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if zipped:
+            body = gzip.compress(body)
+        self.server.requests.append((self.path, 200, headers))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/calendar")
+        self._validators()
+        if zipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _validators(self) -> None:
+        if self.server.etag is not None:
+            self.send_header("ETag", self.server.etag)
+        if self.server.last_modified is not None:
+            self.send_header("Last-Modified", self.server.last_modified)
+
+
+def vcalendar(count: int, title: str = "Event") -> bytes:
+    """Get a calendar with count events on 17.09.2024."""
+    events = "".join(f"BEGIN:VEVENT\r\nUID:feed-{i}\r\nDTSTART:20240917T{9 + i % 8:02d}0000Z\r\n"
+                     f"DTEND:20240917T{10 + i % 8:02d}0000Z\r\nSUMMARY:{title} {i}\r\nEND:VEVENT\r\n"
+                     for i in range(count))
+    return f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\n{events}END:VCALENDAR\r\n".encode()
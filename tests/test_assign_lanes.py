@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from helpers.layout_helpers import assign_lanes
+
+
+def lanes_of(spans):
+    """The layout as {event: (lane, lane span, lanes of its cluster)}."""
+    return {event: (lane, width, lanes) for event, _, _, lane, width, lanes in assign_lanes(spans)}
+
+
+def test_back_to_back_events_share_a_lane():
+    assert lanes_of([(0, 4, "a"), (4, 8, "b"), (8, 96, "c")]) == {"a": (0, 1, 1), "b": (0, 1, 1), "c": (0, 1, 1)}
+
+
+def test_full_overlap():
+    assert lanes_of([(10, 20, "a"), (10, 20, "b"), (10, 20, "c")]) == {
+        "a": (0, 1, 3), "b": (1, 1, 3), "c": (2, 1, 3)}
+
+
+def test_cluster_is_as_wide_as_the_most_cells_at_once():
+    # a overlaps b and b overlaps c, but never all three at once: two lanes, not three
+    assert lanes_of([(0, 4, "a"), (2, 6, "b"), (5, 9, "c")]) == {"a": (0, 1, 2), "b": (1, 1, 2), "c": (0, 1, 2)}
+
+
+def test_longer_cells_go_left_and_cells_widen_over_free_lanes():
+    # cut at midnight by cell_layout, so the last one ends on the last row of the day
+    layout = lanes_of([(0, 2, "short"), (0, 8, "long"), (0, 3, "middle"), (4, 8, "later"), (90, 96, "late")])
+    assert layout == {"long": (0, 1, 3), "middle": (1, 1, 3), "short": (2, 1, 3), "later": (1, 2, 3),
+                      "late": (0, 1, 1)}
+
+
+def test_top_and_height():
+    assert assign_lanes([(4, 6, "b"), (0, 4, "a")]) == [("a", 0, 4, 0, 1, 1), ("b", 4, 2, 0, 1, 1)]
+    assert assign_lanes([]) == []
+
+
+def overlap(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def clusters(spans):
+    """The brute-force clusters: the connected groups of overlapping cells."""
+    groups = []
+    for span in spans:
+        joined = [group for group in groups if any(overlap(span, other) for other in group)]
+        for group in joined:
+            groups.remove(group)
+        groups.append([span] + [other for group in joined for other in group])
+    return groups
+
+
+def most_at_once(group):
+    return max(sum(top <= row < bottom for top, bottom, _ in group) for row, _, _ in group)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    spans = []
+    for i in range(rng.randint(1, 40)):
+        top = rng.randrange(96)
+        spans.append((top, min(top + rng.choice([1, 2, 4, rng.randint(1, 24)]), 96), i))
+
+    layout = assign_lanes(spans)
+    cells = {event: (top, top + height, lane, width, lanes) for event, top, height, lane, width, lanes in layout}
+
+    assert [top for _, top, _, _, _, _ in layout] == sorted(top for top, _, _ in spans)
+    for group in clusters(spans):
+        lanes = {cells[event][4] for _, _, event in group}
+        assert lanes == {most_at_once(group)}
+        for top, bottom, event in group:
+            _, _, lane, width, lanes = cells[event]
+            assert lane + width <= lanes
+            columns = range(lane, lane + width)
+            for other_top, other_bottom, other in group:
+                other_columns = range(cells[other][2], cells[other][2] + cells[other][3])
+                if other != event and overlap((top, bottom), (other_top, other_bottom)):
+                    # overlapping cells never share a column
+                    assert not set(columns) & set(other_columns)
+            if lane + width < lanes:
+                # a cell only stops widening at a lane that is busy next to it
+                assert any(cells[other][2] == lane + width and overlap((top, bottom), (other_top, other_bottom))
+                           for other_top, other_bottom, other in group)
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import pytest
+
+from caldav_server import CalDavServer, vcalendar
+from helpers.caldav_sync import CalDavCalendar, SyncState
+from helpers.event_store import EventStore
+
+WEEK = datetime(2024, 9, 16)
+
+
+@pytest.fixture
+def server():
+    server = CalDavServer().start()
+    for i in range(20):
+        server.put(f"e{i}.ics", vcalendar(f"uid-{i}", f"202409{16 + i % 5}T0{i % 9}0000", f"Event {i}"))
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def calendar(server):
+    calendar = CalDavCalendar(server.url)
+    calendar.prepare()
+    return calendar
+
+
+def sync(calendar, store):
+    """Sync like Week._sync(): the state is only saved once the changes are in the journal."""
+    events, state = calendar.fetch_changes()
+    store.replace_events(events)
+    store.save()
+    state.save(calendar.state_path)
+    return events
+
+
+def summaries(store):
+    return sorted(event.summary for event in store.week_events(WEEK))
+
+
+def test_initial_sync_downloads_everything(server, calendar):
+    store = EventStore.from_path(calendar.path)
+    events = sync(calendar, store)
+
+    assert server.tokens == [""]
+    assert len(events) == 20 and len(server.downloaded) == 20
+    assert summaries(store) == sorted(f"Event {i}" for i in range(20))
+    state = SyncState.load(calendar.state_path)
+    assert state.token.endswith("/20") and len(state.resources) == 20
+    # the requests of a sync share one connection
+    assert server.connections == 1
+
+
+def test_incremental_sync_uses_the_token(server, calendar):
+    store = EventStore.from_path(calendar.path)
+    sync(calendar, store)
+    token = SyncState.load(calendar.state_path).token
+    server.downloaded.clear()
+    server.put("e3.ics", vcalendar("uid-3", "20240917T120000", "Changed 3"))
+
+    events = sync(calendar, store)
+
+    assert server.tokens[-1] == token
+    assert list(events) == ["uid-3"]
+    assert server.downloaded == ["/user/cal/e3.ics"]
+    assert "Changed 3" in summaries(store) and "Event 3" not in summaries(store)
+
+    server.downloaded.clear()
+    assert sync(calendar, store) == {}
+    assert server.downloaded == []
+
+
+def test_deleted_hrefs_remove_their_events(server, calendar):
+    store = EventStore.from_path(calendar.path)
+    sync(calendar, store)
+    server.delete("e4.ics")
+
+    events = sync(calendar, store)
+
+    assert events == {"uid-4": []}
+    assert "Event 4" not in summaries(store)
+    assert "/user/cal/e4.ics" not in SyncState.load(calendar.state_path).resources
+    # the mirror is read back with the journal
+    assert summaries(EventStore.from_path(calendar.path)) == summaries(store)
+
+
+def test_invalid_token_falls_back_to_a_full_listing(server, calendar):
+    store = EventStore.from_path(calendar.path)
+    sync(calendar, store)
+    server.downloaded.clear()
+    server.forget_before = server.version + 1
+    server.put("e5.ics", vcalendar("uid-5", "20240918T120000", "Changed 5"))
+    # gone without the server remembering it, only a full listing tells
+    del server.resources["/user/cal/e6.ics"]
+
+    events = sync(calendar, store)
+
+    # the token is refused, then everything is listed but only what changed is downloaded
+    assert server.tokens[-1] == ""
+    assert server.downloaded == ["/user/cal/e5.ics"]
+    assert sorted(events) == ["uid-5", "uid-6"] and events["uid-6"] == []
+    assert "Changed 5" in summaries(store) and "Event 6" not in summaries(store)
+    assert SyncState.load(calendar.state_path).token.endswith(f"/{server.version}")
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+import GLOBALS
+from helpers.layout_helpers import cell_layout
+
+DAY = 24 * 3600
+MIDNIGHTS = [0, DAY, 2 * DAY, 3 * DAY]
+
+
+def at(day, hour, minute=0):
+    return day * DAY + hour * 3600 + minute * 60
+
+
+@pytest.fixture(autouse=True)
+def resolution(monkeypatch):
+    # four rows per hour, one per 15 minute slot
+    monkeypatch.setattr(GLOBALS, "HOUR_HEIGHT", 4)
+    monkeypatch.setattr(GLOBALS, "RESOLUTION_MINUTES", 15)
+
+
+@pytest.mark.parametrize("start, end, cell", [
+    (at(0, 9), at(0, 10), (0, 36, 4)),
+    (at(1, 0), at(1, 1), (1, 0, 4)),
+    # start and end are rounded to the nearest slot
+    (at(0, 9, 7), at(0, 9, 52), (0, 36, 3)),
+    (at(0, 9, 8), at(0, 9, 53), (0, 37, 3)),
+    # short events still get a row
+    (at(0, 9), at(0, 9, 5), (0, 36, 1)),
+    (at(0, 9), at(0, 9), (0, 36, 1)),
+    # crossing midnight: shown on the day it starts, cut off at its end
+    (at(0, 22), at(1, 2), (0, 88, 8)),
+    (at(1, 23, 30), at(3, 1), (1, 94, 2)),
+    # starting before the first day: shown from its start
+    (at(0, 0) - 3600, at(0, 1), (0, 0, 4)),
+    (at(0, 0) - 3 * DAY, at(1, 12), (0, 0, 96)),
+    # ending after the last day: cut off at the last midnight
+    (at(2, 20), at(2, 20) + 2 * DAY, (2, 80, 16)),
+])
+def test_cells(start, end, cell):
+    days, tops, heights = cell_layout([start], [end], MIDNIGHTS)
+    assert (days[0], tops[0], heights[0]) == cell
+
+
+def test_many_events_in_one_go():
+    starts = [at(2, 8), at(0, 9), at(1, 12, 30)]
+    ends = [at(2, 9, 30), at(0, 9, 45), at(1, 13)]
+    assert cell_layout(starts, ends, MIDNIGHTS) == ([2, 0, 1], [32, 36, 50], [6, 3, 2])
+    assert cell_layout([], [], MIDNIGHTS) == ([], [], [])
+
+
+@pytest.mark.parametrize("hour_height, minutes", [(4, 15), (2, 30), (3, 20), (6, 15), (3, 30), (5, 12)])
+@pytest.mark.parametrize("seed", range(5))
+def test_back_to_back_events_do_not_drift(monkeypatch, hour_height, minutes, seed):
+    """An event ends on the row the next one starts on, however many there are before it."""
+    monkeypatch.setattr(GLOBALS, "HOUR_HEIGHT", hour_height)
+    monkeypatch.setattr(GLOBALS, "RESOLUTION_MINUTES", minutes)
+    rng = random.Random(seed)
+    # at least one slot long, so no cell is stretched to its minimum height
+    bounds = [at(0, 6, rng.randrange(60))]
+    while True:
+        end = bounds[-1] + 60 * rng.randrange(minutes, 100, 5)
+        if end > at(0, 23):
+            break
+        bounds.append(end)
+
+    days, tops, heights = cell_layout(bounds[:-1], bounds[1:], MIDNIGHTS)
+
+    assert len(bounds) > 5 and days == [0] * (len(bounds) - 1)
+    for i in range(len(tops) - 1):
+        assert tops[i] + heights[i] == tops[i + 1]
+    # the last one ends where a cell starting at its end would start
+    assert tops[-1] + heights[-1] == cell_layout([bounds[-1]], [bounds[-1] + 3600], MIDNIGHTS)[1][0]
@@ -0,0 +1,101 @@
+import random
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+from icalendar import Calendar, Event
+
+from helpers import timezones as tz
+from helpers.day_index import DayStats, density
+from helpers.event_store import EventStore
+
+# the clocks go back on the 27th, that day has 25 hours
+FIRST_DAY = date(2024, 10, 21)
+DAYS = 14
+
+
+@pytest.fixture(autouse=True)
+def zurich():
+    tz.set_display_timezone("Europe/Zurich")
+    yield
+    tz.set_display_timezone(None)
+
+
+def random_times(rng):
+    start = datetime(2024, 10, 20, tzinfo=timezone.utc) + timedelta(minutes=15 * rng.randrange(4 * 24 * (DAYS + 1)))
+    # mostly short events, some across midnight or over several days
+    duration = rng.choice([15, 30, 60, 90, rng.randint(1, 24 * 60), rng.randint(1, 3 * 24 * 60)])
+    return start, start + timedelta(minutes=duration)
+
+
+def new_event(rng, uid):
+    event = Event()
+    event.add("UID", uid)
+    event.add("SUMMARY", uid)
+    start, end = random_times(rng)
+    event.add("DTSTART", start)
+    event.add("DTEND", end)
+    return event
+
+
+def expected(events):
+    """The brute-force answer: every event overlapping a day counts on it with the part on that day."""
+    result = []
+    for offset in range(DAYS):
+        day = FIRST_DAY + timedelta(days=offset)
+        midnight = int(tz.to_timestamp(datetime.combine(day, time())))
+        next_midnight = int(tz.to_timestamp(datetime.combine(day + timedelta(days=1), time())))
+        pieces = []
+        for event in events.values():
+            start, end = (int(tz.to_timestamp(event.get(name).dt)) for name in ("DTSTART", "DTEND"))
+            if start < next_midnight and midnight < end:
+                pieces.append((max(start, midnight), min(end, next_midnight)))
+        if pieces:
+            result.append(DayStats(len(pieces), sum(end - start for start, end in pieces) // 60,
+                                   min(start for start, _ in pieces), max(end for _, end in pieces)))
+        else:
+            result.append(DayStats())
+    return result
+
+
+def test_density():
+    assert [density(DayStats(count, minutes)) for count, minutes in [(0, 0), (1, 30), (2, 120), (3, 300), (9, 600)]] \
+        == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_matches_brute_force_under_random_edits(tmp_path, seed):
+    rng = random.Random(seed)
+    calendar = Calendar()
+    calendar.add("VERSION", "2.0")
+    calendar.add("PRODID", "-//test//EN")
+    events = {}
+    for i in range(rng.randint(0, 40)):
+        events[f"loaded-{i}"] = new_event(rng, f"loaded-{i}")
+        calendar.add_component(events[f"loaded-{i}"])
+    path = tmp_path / "calendar.ics"
+    path.write_bytes(calendar.to_ical())
+    store = EventStore.from_path(path)
+    assert store.days.days(FIRST_DAY, DAYS) == expected(events)
+
+    for step in range(100):
+        action = rng.random()
+        if action < 0.3 and events:
+            uid = rng.choice(list(events))
+            assert store.remove(store.find(uid))
+            del events[uid]
+        elif action < 0.6 and events:
+            # moving an event may change the first or last event of the days it leaves
+            uid = rng.choice(list(events))
+            record = store.find(uid)
+            event = store.component(record)
+            start, end = random_times(rng)
+            event["DTSTART"].dt, event["DTEND"].dt = start, end
+            store.update(record, event)
+            events[uid] = event
+        else:
+            uid = f"added-{step}"
+            events[uid] = new_event(rng, uid)
+            store.add(events[uid])
+
+        assert store.days.days(FIRST_DAY, DAYS) == expected(events)
+    assert store.days.day(FIRST_DAY + timedelta(days=3)) == expected(events)[3]
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from textual.widgets import Input
+
+from helpers import timezones as tz
+from helpers.event_store import EventStore
+from weekview.week import Week
+
+CALENDAR = b"""BEGIN:VCALENDAR\r
+VERSION:2.0\r
+PRODID:-//test//EN\r
+BEGIN:VEVENT\r
+UID:zurich\r
+DTSTART;TZID=Europe/Zurich:20240916T080000\r
+DTEND;TZID=Europe/Zurich:20240916T093000\r
+SUMMARY:Zurich\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:utc\r
+DTSTART:20240917T120000Z\r
+DTEND:20240917T130000Z\r
+SUMMARY:UTC\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:floating\r
+DTSTART:20240918T100000\r
+DTEND:20240918T110000\r
+SUMMARY:Floating\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+@pytest.fixture(autouse=True)
+def new_york():
+    tz.set_display_timezone("America/New_York")
+    yield
+    tz.set_display_timezone(None)
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "calendar.ics"
+    path.write_bytes(CALENDAR)
+    return path
+
+
+def times(path, uid):
+    event = EventStore.from_path(path).week_events(datetime(2024, 9, 16))
+    record = next(record for record in event if record.uid == uid)
+    return record.start, record.end
+
+
+def edit(path, uid, change=None):
+    """Open the event in the app, edit it, save it and quit; returns the inputs as they were shown."""
+    shown = {}
+
+    async def run():
+        app = Week([path], datetime(2024, 9, 16))
+        async with app.run_test(size=(160, 50)) as pilot:
+            record = next(record for record in app.store.week_events(app.week_start) if record.uid == uid)
+            app.open_event(record)
+            await pilot.pause()
+            await pilot.press("e")
+            await pilot.pause()
+            start = app.screen.query_one("#eventStartInput", Input)
+            end = app.screen.query_one("#eventEndInput", Input)
+            shown.update(start=start.value, end=end.value)
+            if change is not None:
+                change(start, end)
+            await pilot.press("ctrl+s")
+            await pilot.pause()
+            await app.action_quit()
+    asyncio.run(run())
+    return shown
+
+
+@pytest.mark.parametrize("uid, start, end", [
+    ("zurich", "02:00 16.09.2024", "03:30 16.09.2024"),
+    ("utc", "08:00 17.09.2024", "09:00 17.09.2024"),
+    ("floating", "10:00 18.09.2024", "11:00 18.09.2024"),
+])
+def test_unchanged_event_keeps_its_times(path, uid, start, end):
+    before = times(path, uid)
+
+    shown = edit(path, uid)
+
+    # the inputs show the times of the week grid, in the display zone
+    assert shown == {"start": start, "end": end}
+    assert times(path, uid) == before
+
+
+def test_edited_event_keeps_its_zone(path):
+    start, end = times(path, "zurich")
+
+    edit(path, "zurich", lambda start_input, end_input: setattr(start_input, "value", "03:00 16.09.2024"))
+
+    assert times(path, "zurich") == (start + 3600, end)
+    store = EventStore.from_path(path)
+    record = next(record for record in store.week_events(datetime(2024, 9, 16)) if record.uid == "zurich")
+    dtstart = store.component(record).get("DTSTART")
+    assert dtstart.params["TZID"] == "Europe/Zurich"
+    assert dtstart.dt.hour == 9
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+
+from feed_server import FeedServer, vcalendar
+from helpers import feeds
+from helpers.event_store import EventStore
+from helpers.feeds import Feed, FeedError
+
+WEEK = datetime(2024, 9, 16)
+
+
+@pytest.fixture
+def server():
+    server = FeedServer().start()
+    server.publish(vcalendar(3), '"v1"', 1700000000)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """Count the bodies that are decoded, a 304 must not get that far."""
+    calls = []
+    decode = feeds._decode
+
+    def counting(response):
+        calls.append(response.status)
+        return decode(response)
+    monkeypatch.setattr(feeds, "_decode", counting)
+    return calls
+
+
+def download(feed):
+    changed = feed.fetch()
+    if changed:
+        feed.install()
+    return changed
+
+
+def test_first_download_is_gzipped(server, decoded):
+    feed = Feed(server.url())
+    feed.prepare()
+    assert EventStore.from_path(feed.path).week_events(WEEK) == []
+
+    assert download(feed)
+
+    path, status, headers = server.requests[-1]
+    assert status == 200 and "gzip" in headers["Accept-Encoding"]
+    assert "If-None-Match" not in headers and "If-Modified-Since" not in headers
+    assert decoded == [200]
+    assert feed.path.read_bytes() == vcalendar(3)
+    assert not feed.download_path.exists()
+    assert len(EventStore.from_path(feed.path).week_events(WEEK)) == 3
+
+
+def test_unchanged_feed_is_not_downloaded_again(server, decoded):
+    feed = Feed(server.url())
+    feed.prepare()
+    download(feed)
+    mtime = feed.path.stat().st_mtime_ns
+
+    assert not download(feed)
+
+    path, status, headers = server.requests[-1]
+    assert status == 304
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == server.last_modified
+    # nothing was decoded, written or parsed
+    assert decoded == [200]
+    assert not feed.download_path.exists()
+    assert feed.path.stat().st_mtime_ns == mtime
+
+
+def test_last_modified_alone_is_enough(server, decoded):
+    server.publish(vcalendar(3), None, 1700000000)
+    feed = Feed(server.url())
+    feed.prepare()
+    download(feed)
+
+    assert not download(feed)
+
+    path, status, headers = server.requests[-1]
+    assert status == 304 and "If-None-Match" not in headers
+    assert headers["If-Modified-Since"] == server.last_modified
+    assert decoded == [200]
+
+
+def test_changed_feed_replaces_the_download(server):
+    feed = Feed(server.url())
+    feed.prepare()
+    download(feed)
+    server.publish(vcalendar(5, "New"), '"v2"', 1700000100)
+
+    assert download(feed)
+
+    assert server.requests[-1][2]["If-None-Match"] == '"v1"' and server.statuses[-1] == 200
+    store = EventStore.from_path(feed.path)
+    assert sorted(event.summary for event in store.week_events(WEEK)) == [f"New {i}" for i in range(5)]
+    # the validators of the new download are sent next time
+    assert not download(feed)
+    assert server.requests[-1][2]["If-None-Match"] == '"v2"'
+
+
+def test_redirect_is_followed(server):
+    feed = Feed(server.url("/old.ics"))
+    feed.prepare()
+
+    assert download(feed)
+
+    assert [(path, status) for path, status, _ in server.requests] == [("/old.ics", 301), ("/cal.ics", 200)]
+    assert feed.path.read_bytes() == vcalendar(3)
+
+
+def test_error_keeps_the_last_download(server):
+    feed = Feed(server.url())
+    feed.prepare()
+    download(feed)
+    feed.url = feed.url.replace("/cal.ics", "/missing.ics")
+    feed.location = feed.location._replace(path="/missing.ics")
+
+    with pytest.raises(FeedError):
+        feed.fetch()
+
+    assert feed.path.read_bytes() == vcalendar(3)
@@ -0,0 +1,149 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+from helpers import file_watch as fw
+from helpers import timezones as tz
+from helpers.event_store import EventStore
+
+MONDAY = datetime(2024, 9, 16)
+
+
+def vevent(uid, day, summary):
+    return (f"BEGIN:VEVENT\r\nUID:{uid}\r\nDTSTART:202409{day}T090000Z\r\nDTEND:202409{day}T100000Z\r\n"
+            f"SUMMARY:{summary}\r\nEND:VEVENT\r\n")
+
+
+def calendar(*vevents):
+    return ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\n" + "".join(vevents) + "END:VCALENDAR\r\n").encode()
+
+
+ORIGINAL = calendar(vevent("local", 16, "Local"), vevent("changed", 17, "Changed"), vevent("removed", 18, "Removed"),
+                    vevent("same", 19, "Same"))
+# another program changes "changed" and "local", removes "removed" and adds "added"
+EXTERNAL = calendar(vevent("local", 16, "Local (theirs)"), vevent("changed", 17, "Changed (theirs)"),
+                    vevent("same", 19, "Same"), vevent("added", 20, "Added"))
+
+
+@pytest.fixture(autouse=True)
+def utc():
+    tz.set_display_timezone("UTC")
+    yield
+    tz.set_display_timezone(None)
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "calendar.ics"
+    path.write_bytes(ORIGINAL)
+    return path
+
+
+def write_externally(path, data):
+    """Replace the file like sync tools do, with a new file moved over the old one."""
+    tmp_path = path.with_name(path.name + ".new")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def summaries(store):
+    return {event.uid: event.summary for event in store.week_events(MONDAY)}
+
+
+def edit_locally(store):
+    record = next(event for event in store.week_events(MONDAY) if event.uid == "local")
+    event = store.component(record)
+    event["SUMMARY"] = "Local (mine)"
+    store.update(record, event)
+    store.save()
+
+
+def merge(store):
+    changes = fw.read_changes(store.path, store.file_stat, store.file_snapshot, keep_mapping=store.lazy)
+    assert changes is not None
+    return changes, store.apply_file_changes(changes)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_unchanged_file_has_no_changes(path, lazy):
+    store = EventStore.from_path(path, lazy=lazy)
+    changes, spans = merge(store)
+
+    assert changes.base is None and changes.events == {} and spans == []
+    assert store.file_snapshot is not None
+    assert not store.file_changed()
+    # diffing against the snapshot finds nothing either
+    assert merge(store)[0].events == {}
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_changed_removed_and_added_uids(path, lazy):
+    store = EventStore.from_path(path, lazy=lazy)
+    merge(store)
+    write_externally(path, EXTERNAL)
+
+    assert store.file_changed()
+    changes, spans = merge(store)
+
+    assert sorted(changes.events) == ["added", "changed", "local", "removed"]
+    assert changes.events["removed"] == []
+    assert len(spans) >= 4
+    assert summaries(store) == {"local": "Local (theirs)", "changed": "Changed (theirs)", "same": "Same",
+                                "added": "Added"}
+    assert not store.file_changed()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_local_edit_survives_external_change_and_compaction(path, lazy):
+    store = EventStore.from_path(path, lazy=lazy)
+    merge(store)
+    edit_locally(store)
+    write_externally(path, EXTERNAL)
+
+    merge(store)
+
+    expected = {"local": "Local (mine)", "changed": "Changed (theirs)", "same": "Same", "added": "Added"}
+    assert summaries(store) == expected
+    # the journal still holds the local edit, loading again gives the same
+    assert summaries(EventStore.from_path(path, lazy=lazy)) == expected
+    store.compact()
+    assert not store.journal.path.exists()
+    assert summaries(EventStore.from_path(path, lazy=lazy)) == expected
+    assert b"Local (mine)" in path.read_bytes() and b"Removed" not in path.read_bytes()
+
+
+def test_changed_file_without_snapshot_replaces_everything(path):
+    store = EventStore.from_path(path)
+    edit_locally(store)
+    write_externally(path, EXTERNAL)
+
+    changes, _ = merge(store)
+
+    assert changes.everything
+    assert summaries(store) == {"local": "Local (mine)", "changed": "Changed (theirs)", "same": "Same",
+                                "added": "Added"}
+
+
+def test_app_merges_external_changes(path):
+    from weekview.week import Week
+
+    async def run():
+        app = Week([path], MONDAY)
+        async with app.run_test(size=(160, 50)) as pilot:
+            # the first check only takes the snapshot
+            app.check_files()
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            edit_locally(app.store)
+            await app.workers.wait_for_complete()
+            write_externally(path, EXTERNAL)
+            app.check_files()
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            shown = sorted(cell.event.summary for cell in app.query("EventCell"))
+            await app.action_quit()
+        return shown
+
+    assert asyncio.run(run()) == ["Added", "Changed (theirs)", "Local (mine)", "Same"]
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from helpers.interval_index import IntervalIndex
+
+
+class Item:
+    """An indexed object, compared by identity like EventRecords."""
+
+    def __init__(self, start: float, end: float) -> None:
+        self.start = start
+        self.end = end
+
+
+def random_item(rng: random.Random) -> Item:
+    start = rng.randint(0, 1000)
+    return Item(start, start + rng.choice([0, 1, rng.randint(1, 60), rng.randint(60, 400)]))
+
+
+def expected(live, start, end):
+    """The brute-force answer: everything that overlaps [start, end)."""
+    return sorted((item for item in live if item.start < end and start < item.end), key=id)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_matches_brute_force_under_random_edits(seed):
+    rng = random.Random(seed)
+    live = [random_item(rng) for _ in range(rng.randint(0, 300))]
+    index = IntervalIndex.from_items([(item.start, item.end, item) for item in live])
+
+    for step in range(600):
+        action = rng.random()
+        if action < 0.35 and live:
+            item = live.pop(rng.randrange(len(live)))
+            assert index.remove(item)
+            assert not index.remove(item)
+            assert item not in index
+        elif action < 0.7:
+            item = random_item(rng)
+            index.add(item.start, item.end, item)
+            live.append(item)
+            assert item in index
+        else:
+            start = rng.randint(-50, 1450)
+            end = start + rng.randint(1, 200)
+            found = index.overlap(start, end)
+            assert sorted(found, key=id) == expected(live, start, end)
+            assert [item.start for item in found] == sorted(item.start for item in found)
+        assert len(index) == len(live)
+
+        if step % 97 == 0:
+            assert sorted(index, key=id) == sorted(live, key=id)
+            starts, ends, items = index.columns()
+            assert starts == sorted(starts)
+            assert all(item.start == s and item.end == e for s, e, item in zip(starts, ends, items))
+
+
+def test_removed_and_added_before_compaction():
+    index = IntervalIndex.from_items([(i, i + 10, i) for i in range(100)])
+    for i in range(0, 100, 2):
+        assert index.remove(i)
+    index.add(6, 7, "new")
+
+    assert index.overlap(4, 8) == [1, 3, 5, "new", 7]
+    assert len(index) == 51
+
+
+def test_empty_window_and_empty_index():
+    index = IntervalIndex()
+    assert index.overlap(0, 100) == []
+    index.add(10, 20, "a")
+    # half-open: touching intervals don't overlap
+    assert index.overlap(20, 30) == []
+    assert index.overlap(0, 10) == []
+    assert index.overlap(19, 20) == ["a"]
+
+
+def test_unbounded_intervals():
+    index = IntervalIndex.from_items([(0, float("inf"), "open"), (5, 6, "short")])
+    assert index.overlap(1e12, 1e12 + 1) == ["open"]
+    assert index.overlap(5, 6) == ["open", "short"]
@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+
+import pytest
+from icalendar import Event
+
+from helpers import timezones as tz
+from helpers.event_store import EventStore
+from helpers.journal import DELETE, PUT, Journal
+
+MONDAY = datetime(2024, 9, 16, tzinfo=timezone.utc)
+CALENDAR = b"""BEGIN:VCALENDAR\r
+VERSION:2.0\r
+PRODID:-//test//EN\r
+BEGIN:VEVENT\r
+UID:keep\r
+DTSTART:20240916T090000Z\r
+DTEND:20240916T100000Z\r
+SUMMARY:Keep\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:edit\r
+DTSTART:20240917T090000Z\r
+DTEND:20240917T100000Z\r
+SUMMARY:Edit me\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+@pytest.fixture(autouse=True)
+def utc():
+    tz.set_display_timezone("UTC")
+    yield
+    tz.set_display_timezone(None)
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "calendar.ics"
+    path.write_bytes(CALENDAR)
+    return path
+
+
+def snapshot(store):
+    return sorted((event.uid, event.start, event.summary) for event in store.week_events(MONDAY))
+
+
+def new_event(uid, day):
+    event = Event()
+    event.add("UID", uid)
+    event.add("SUMMARY", uid.capitalize())
+    event.add("DTSTART", datetime(2024, 9, day, 9, tzinfo=timezone.utc))
+    event.add("DTEND", datetime(2024, 9, day, 10, tzinfo=timezone.utc))
+    return event
+
+
+def edit(store):
+    """Make three changes and save each of them, so they are three journal lines."""
+    record = next(event for event in store.week_events(MONDAY) if event.uid == "edit")
+    event = store.component(record)
+    event["SUMMARY"] = "Edited"
+    store.update(record, event)
+    store.save()
+    store.add(new_event("new", 18))
+    store.save()
+    store.remove(next(event for event in store.week_events(MONDAY) if event.uid == "keep"))
+    store.save()
+
+
+def test_edits_go_to_the_journal_and_are_replayed(path):
+    store = EventStore.from_path(path)
+    edit(store)
+
+    assert path.read_bytes() == CALENDAR
+    assert [op for op, *_ in Journal(path).replay()] == [PUT, PUT, DELETE]
+    assert snapshot(EventStore.from_path(path)) == snapshot(store)
+    assert [summary for _, _, summary in snapshot(store)] == ["Edited", "New"]
+
+
+@pytest.mark.parametrize("tail", [b'{"op": "put", "uid"', b'{"op": "delete", "uid": "new", "rid": null, "ical"'])
+def test_truncated_last_line_is_dropped(path, tail):
+    store = EventStore.from_path(path)
+    edit(store)
+    size = Journal(path).size()
+    with open(Journal(path).path, "ab") as f:
+        f.write(tail)
+
+    replayed = EventStore.from_path(path)
+
+    assert snapshot(replayed) == snapshot(store)
+    # the partial line is cut off, so the next entry isn't appended to it
+    assert Journal(path).size() == size
+    replayed.add(new_event("later", 19))
+    replayed.save()
+    assert len(Journal(path).replay()) == 4
+    assert [summary for _, _, summary in snapshot(EventStore.from_path(path))] == ["Edited", "Later", "New"]
+
+
+def test_line_cut_in_the_middle_hides_nothing_before_it(path):
+    store = EventStore.from_path(path)
+    edit(store)
+    journal = Journal(path)
+    data = journal.path.read_bytes()
+    lines = data.splitlines(keepends=True)
+    # the last entry was only written halfway
+    journal.path.write_bytes(b"".join(lines[:2]) + lines[2][:len(lines[2]) // 2])
+
+    replayed = EventStore.from_path(path)
+
+    assert [summary for _, _, summary in snapshot(replayed)] == ["Edited", "Keep", "New"]
+    assert len(journal.replay()) == 2
+
+
+def test_replaying_after_compaction_is_harmless(path):
+    store = EventStore.from_path(path)
+    edit(store)
+    journal = Journal(path).path.read_bytes()
+    expected = snapshot(store)
+    store.compact()
+    assert not Journal(path).path.exists()
+    # a crash between writing the calendar and removing the journal
+    Journal(path).path.write_bytes(journal)
+
+    assert snapshot(EventStore.from_path(path)) == expected
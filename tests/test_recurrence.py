@@ -0,0 +1,125 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from helpers import timezones as tz
+from helpers.event_store import EventStore
+
+UTC = timezone.utc
+SERIES_START = datetime(2024, 9, 2, 10, tzinfo=UTC)
+
+
+@pytest.fixture(autouse=True)
+def utc():
+    tz.set_display_timezone("UTC")
+    yield
+    tz.set_display_timezone(None)
+
+
+def stamp(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def vevent(uid, start, end, summary, *lines):
+    return "\r\n".join(["BEGIN:VEVENT", f"UID:{uid}", f"DTSTART:{stamp(start)}", f"DTEND:{stamp(end)}",
+                        f"SUMMARY:{summary}", *lines, "END:VEVENT"])
+
+
+def load(tmp_path, *vevents) -> EventStore:
+    path = tmp_path / "calendar.ics"
+    path.write_bytes("\r\n".join(["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//test//EN", *vevents,
+                                  "END:VCALENDAR", ""]).encode())
+    return EventStore.from_path(path)
+
+
+def week(store, monday: datetime):
+    return [(event.summary, tz.from_timestamp(event.start, UTC)) for event in store.week_events(monday)]
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_occurrences_match_brute_force(tmp_path, seed):
+    """Random DAILY/WEEKLY series with COUNT or UNTIL, EXDATEs and RDATEs, in random windows."""
+    rng = random.Random(seed)
+    freq, step = rng.choice([("DAILY", timedelta(days=1)), ("WEEKLY", timedelta(weeks=1))])
+    interval = rng.randint(1, 3)
+    count = rng.randint(1, 40)
+    length = timedelta(minutes=rng.choice([30, 90, 60 * 30]))
+    starts = [SERIES_START + i * interval * step for i in range(count)]
+    if rng.random() < 0.5:
+        rule = f"RRULE:FREQ={freq};INTERVAL={interval};COUNT={count}"
+    else:
+        rule = f"RRULE:FREQ={freq};INTERVAL={interval};UNTIL={stamp(starts[-1])}"
+    exdates = rng.sample(starts, rng.randint(0, min(5, count)))
+    rdates = [SERIES_START + timedelta(days=rng.randint(0, 200), hours=rng.randint(0, 8)) for _ in range(3)]
+    lines = [rule, f"RDATE:{','.join(map(stamp, rdates))}"]
+    if exdates:
+        lines.append(f"EXDATE:{','.join(map(stamp, exdates))}")
+    store = load(tmp_path, vevent("series", SERIES_START, SERIES_START + length, "Series", *lines))
+    occurrences = sorted(set(starts + rdates) - set(exdates))
+
+    for _ in range(40):
+        window_start = SERIES_START + timedelta(hours=rng.randint(-48, 24 * 400))
+        window_end = window_start + timedelta(hours=rng.randint(1, 24 * 10))
+        expected = [start for start in occurrences if start < window_end and window_start < start + length]
+        for _ in range(2):
+            # the second time from the cache of the expander
+            found = store.series_occurrences(window_start.timestamp(), window_end.timestamp())
+            assert sorted(tz.from_timestamp(o.start, UTC) for o in found) == expected
+            assert all(o.end - o.start == length.total_seconds() for o in found)
+            assert all(o.recurrence_id == o.start for o in found)
+
+
+def test_override_replaces_its_occurrence(tmp_path):
+    moved_from = SERIES_START + timedelta(weeks=2)
+    moved_to = moved_from + timedelta(days=1, hours=2)
+    store = load(tmp_path,
+                 vevent("s", SERIES_START, SERIES_START + timedelta(hours=1), "Standup", "RRULE:FREQ=WEEKLY;COUNT=5"),
+                 vevent("s", moved_to, moved_to + timedelta(hours=1), "Standup moved",
+                        f"RECURRENCE-ID:{stamp(moved_from)}"))
+
+    assert week(store, datetime(2024, 9, 16, tzinfo=UTC)) == [("Standup moved", moved_to)]
+    assert week(store, datetime(2024, 9, 9, tzinfo=UTC)) == [("Standup", SERIES_START + timedelta(weeks=1))]
+    # an override moved into another week leaves its own week empty
+    late = moved_from + timedelta(weeks=1)
+    store = load(tmp_path,
+                 vevent("s", SERIES_START, SERIES_START + timedelta(hours=1), "Standup", "RRULE:FREQ=WEEKLY;COUNT=5"),
+                 vevent("s", late, late + timedelta(hours=1), "Standup later", f"RECURRENCE-ID:{stamp(moved_from)}"))
+    assert week(store, datetime(2024, 9, 16, tzinfo=UTC)) == []
+    assert sorted(week(store, datetime(2024, 9, 23, tzinfo=UTC))) == [("Standup", late), ("Standup later", late)]
+
+
+def test_exdate_and_removed_occurrence(tmp_path):
+    excluded = SERIES_START + timedelta(days=1)
+    store = load(tmp_path, vevent("s", SERIES_START, SERIES_START + timedelta(hours=1), "Daily",
+                                  "RRULE:FREQ=DAILY", f"EXDATE:{stamp(excluded)}"))
+    monday = datetime(2024, 9, 2, tzinfo=UTC)
+    days = [start.day for _, start in week(store, monday)]
+    assert days == [2, 4, 5, 6, 7, 8]
+
+    # removing an occurrence excludes it with an EXDATE, which is journaled
+    friday = next(event for event in store.week_events(monday) if tz.from_timestamp(event.start, UTC).day == 6)
+    assert store.remove(friday)
+    store.save()
+    assert [start.day for _, start in week(store, monday)] == [2, 4, 5, 7, 8]
+    reloaded = EventStore.from_path(tmp_path / "calendar.ics")
+    assert [start.day for _, start in week(reloaded, monday)] == [2, 4, 5, 7, 8]
+
+
+def test_open_ended_series_far_ahead(tmp_path):
+    store = load(tmp_path, vevent("s", SERIES_START, SERIES_START + timedelta(hours=1), "Weekly",
+                                  "RRULE:FREQ=WEEKLY"))
+    monday = datetime(2034, 9, 4, tzinfo=UTC)
+    assert week(store, monday) == [("Weekly", monday.replace(hour=10))]
+
+
+def test_edited_series_is_expanded_again(tmp_path):
+    store = load(tmp_path, vevent("s", SERIES_START, SERIES_START + timedelta(hours=1), "Weekly",
+                                  "RRULE:FREQ=WEEKLY;COUNT=3"))
+    monday = datetime(2024, 9, 9, tzinfo=UTC)
+    assert len(week(store, monday)) == 1
+    master = store.masters["s"]
+    event = store.component(master)
+    event["RRULE"]["COUNT"] = [1]
+    store.update(master, event)
+    assert week(store, monday) == []
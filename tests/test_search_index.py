@@ -0,0 +1,131 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from icalendar import Event
+
+from helpers import timezones as tz
+from helpers.event_store import EventStore
+from helpers.search_index import SearchIndex, words
+
+VOCABULARY = ["Algebra", "algorithm", "Alge", "lecture", "Lecturer", "room", "Rooms", "café", "Cafeteria", "b2",
+              "meeting", "Meet", "zürich", "ZUERICH", "x"]
+MONDAY = datetime(2024, 9, 16, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def utc():
+    tz.set_display_timezone("UTC")
+    yield
+    tz.set_display_timezone(None)
+
+
+class Item:
+    """An indexed object, compared by identity like EventRecords."""
+
+
+def random_text(rng: random.Random) -> str:
+    separators = [" ", ", ", "\\n", "\n", " - "]
+    return "".join(rng.choice(VOCABULARY) + rng.choice(separators) for _ in range(rng.randint(0, 5)))
+
+
+def random_query(rng: random.Random) -> str:
+    query = []
+    for _ in range(rng.choice([0, 1, 1, 2, 3])):
+        word = rng.choice(VOCABULARY)
+        prefix = word[:rng.randint(1, len(word))]
+        query.append(prefix.swapcase() if rng.random() < 0.3 else prefix)
+    return " ".join(query)
+
+
+def expected(texts, query):
+    """The brute-force answer: every text with a word starting with each word of the query."""
+    query_words = words(query)
+    if not query_words:
+        return set()
+    return {key for key, text in texts.items()
+            if all(any(word.startswith(prefix) for word in words(text)) for prefix in query_words)}
+
+
+def test_words():
+    assert words("Algebra\\nRoom B2, algebra") == {"algebra", "room", "b2"}
+    assert words("ZÜRICH – Café") == {"zürich", "café"}
+    assert words(" ,- ") == frozenset()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_brute_force_under_random_edits(seed):
+    rng = random.Random(seed)
+    index = SearchIndex()
+    texts = {}
+
+    for step in range(250):
+        action = rng.random()
+        if action < 0.25 and texts:
+            item = rng.choice(list(texts))
+            index.remove(item)
+            index.remove(item)
+            del texts[item]
+        elif action < 0.5 and texts:
+            # indexing an event again replaces its old words
+            item = rng.choice(list(texts))
+            texts[item] = random_text(rng)
+            index.add(item, texts[item])
+        else:
+            item = Item()
+            texts[item] = random_text(rng)
+            index.add(item, texts[item])
+
+        assert len(index) == len(texts)
+        for _ in range(2):
+            query = random_query(rng)
+            assert index.search(query) == expected(texts, query), query
+
+
+def new_event(rng, uid):
+    event = Event()
+    event.add("UID", uid)
+    start = MONDAY + timedelta(hours=rng.randrange(7 * 24))
+    event.add("DTSTART", start)
+    event.add("DTEND", start + timedelta(hours=1))
+    describe(rng, event)
+    return event
+
+
+def describe(rng, event):
+    for name in ("SUMMARY", "LOCATION", "DESCRIPTION"):
+        event.pop(name, None)
+        if rng.random() < 0.7:
+            event.add(name, random_text(rng).replace("\\n", "\n"))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_store_search_matches_brute_force(tmp_path, seed):
+    rng = random.Random(seed)
+    path = tmp_path / "calendar.ics"
+    path.write_bytes(b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\nEND:VCALENDAR\r\n")
+    store = EventStore.from_path(path)
+    events = {}
+    for step in range(150):
+        action = rng.random()
+        if action < 0.2 and events:
+            uid = rng.choice(list(events))
+            assert store.remove(store.find(uid))
+            del events[uid]
+        elif action < 0.5 and events:
+            uid = rng.choice(list(events))
+            record = store.find(uid)
+            event = store.component(record)
+            describe(rng, event)
+            store.update(record, event)
+            events[uid] = event
+        else:
+            uid = f"event-{step}"
+            events[uid] = new_event(rng, uid)
+            store.add(events[uid])
+        # the index is only built by the first search, edits before it are found as well
+        if step > 30:
+            texts = {uid: " ".join(str(event.get(name, "")) for name in ("SUMMARY", "LOCATION", "DESCRIPTION"))
+                     for uid, event in events.items()}
+            query = random_query(rng)
+            assert {record.uid for record in store.search(query, limit=1000)} == expected(texts, query), query
@@ -0,0 +1,171 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from icalendar import Event
+
+from helpers import timezones as tz
+from helpers.event_store import EventStore
+from helpers.sqlite_store import SqliteStore
+
+WEEKS = [datetime(2024, 9, 2) + timedelta(weeks=i) for i in range(5)]
+CALENDAR = b"""BEGIN:VCALENDAR\r
+VERSION:2.0\r
+PRODID:-//test//EN\r
+BEGIN:VEVENT\r
+UID:single-1\r
+DTSTART:20240903T090000Z\r
+DTEND:20240903T100000Z\r
+SUMMARY:Dentist\r
+LOCATION:Main street\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:single-2\r
+DTSTART:20240911T230000Z\r
+DTEND:20240912T010000Z\r
+SUMMARY:Night shift\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:series\r
+DTSTART:20240902T100000Z\r
+DTEND:20240902T110000Z\r
+RRULE:FREQ=WEEKLY;COUNT=5\r
+SUMMARY:Standup\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:series\r
+RECURRENCE-ID:20240916T100000Z\r
+DTSTART:20240917T100000Z\r
+DTEND:20240917T110000Z\r
+SUMMARY:Standup moved\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+@pytest.fixture(autouse=True)
+def utc():
+    tz.set_display_timezone("UTC")
+    yield
+    tz.set_display_timezone(None)
+
+
+@pytest.fixture
+def ics(tmp_path):
+    path = tmp_path / "calendar.ics"
+    path.write_bytes(CALENDAR)
+    return path
+
+
+@pytest.fixture
+def db(tmp_path, ics):
+    path = tmp_path / "calendar.sqlite"
+    SqliteStore.from_path(path).import_ics(ics)
+    return path
+
+
+def snapshot(store):
+    return [sorted((event.uid, event.start, event.end, event.summary) for event in store.week_events(week))
+            for week in WEEKS]
+
+
+def new_event(uid, day, summary="New"):
+    event = Event()
+    event.add("UID", uid)
+    event.add("SUMMARY", summary)
+    event.add("DTSTART", datetime(2024, 9, day, 14, tzinfo=timezone.utc))
+    event.add("DTEND", datetime(2024, 9, day, 15, tzinfo=timezone.utc))
+    return event
+
+
+def find(store, uid, week=0):
+    return next(event for event in store.week_events(WEEKS[week]) if event.uid == uid)
+
+
+def test_import_answers_like_an_event_store(db, ics):
+    store = SqliteStore.from_path(db)
+    assert snapshot(store) == snapshot(EventStore.from_path(ics))
+    assert [event.uid for event in store.search("dentist main")] == ["single-1"]
+
+
+def test_changes_reach_a_second_instance(db):
+    writer, reader = SqliteStore.from_path(db), SqliteStore.from_path(db)
+    assert not reader.file_changed()
+
+    writer.add(new_event("added", 4))
+    record = find(writer, "single-1")
+    event = writer.component(record)
+    event["SUMMARY"] = "Dentist (moved)"
+    writer.update(record, event)
+    writer.remove(find(writer, "single-2", 1))
+
+    # committed right away, no save needed
+    assert reader.file_changed()
+    spans = reader.apply_external_changes()
+    assert spans
+    assert not reader.file_changed()
+    assert snapshot(reader) == snapshot(writer)
+    assert "Dentist (moved)" in [event.summary for event in reader.week_events(WEEKS[0])]
+    assert snapshot(SqliteStore.from_path(db)) == snapshot(writer)
+    # a store doesn't see its own commits as changes from outside
+    assert not writer.file_changed()
+
+
+def test_changes_dont_block_other_writers(db):
+    store = SqliteStore.from_path(db)
+    record = find(store, "single-1")
+    event = store.component(record)
+    event["LOCATION"] = "Elsewhere"
+    store.update(record, event)
+
+    other = sqlite3.connect(db, timeout=0.1)
+    other.execute("INSERT INTO meta VALUES ('probe', '1')")
+    other.commit()
+    other.close()
+
+    batch = store.update_many(store.with_summary("Standup"), lambda event: event.add("LOCATION", "Room 1"))
+    next(batch, None)
+    other = sqlite3.connect(db, timeout=0.1)
+    other.execute("INSERT INTO meta VALUES ('probe-2', '1')")
+    other.commit()
+    other.close()
+    list(batch)
+
+
+def test_removing_occurrences(db):
+    writer, reader = SqliteStore.from_path(db), SqliteStore.from_path(db)
+    # a plain occurrence gets an EXDATE, an overridden one loses its override too
+    assert writer.remove(find(writer, "series", 1))
+    assert writer.remove(find(writer, "series", 2))
+    assert [event.uid for event in writer.week_events(WEEKS[1])] == ["single-2"]
+    assert [event.uid for event in writer.week_events(WEEKS[2])] == []
+    assert writer.component(writer.masters["series"]).get("EXDATE") is not None
+
+    reader.apply_external_changes()
+    assert snapshot(reader) == snapshot(writer)
+    assert snapshot(SqliteStore.from_path(db)) == snapshot(writer)
+    assert len([event for week in snapshot(writer) for event in week if event[0] == "series"]) == 3
+
+
+def test_export_round_trip(db, tmp_path):
+    store = SqliteStore.from_path(db)
+    store.add(new_event("added", 20))
+    exported = tmp_path / "exported.ics"
+
+    assert store.export_ics(exported) == 5
+    assert snapshot(EventStore.from_path(exported)) == snapshot(store)
+
+    again = SqliteStore.from_path(tmp_path / "again.sqlite")
+    again.import_ics(exported)
+    assert snapshot(again) == snapshot(store)
+
+
+def test_import_reloads_other_instances(db, ics):
+    writer, reader = SqliteStore.from_path(db), SqliteStore.from_path(db)
+    ics.write_bytes(CALENDAR.replace(b"SUMMARY:Dentist", b"SUMMARY:Doctor"))
+    writer.import_ics(ics)
+
+    assert reader.file_changed()
+    assert reader.apply_external_changes() == [(float("-inf"), float("inf"))]
+    assert "Doctor" in [event.summary for event in reader.week_events(WEEKS[0])]
+    assert snapshot(reader) == snapshot(writer)
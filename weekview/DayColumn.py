@@ -0,0 +1,55 @@
+from typing import Tuple
+
+from textual.containers import Vertical
+from textual.reactive import reactive
+
+from helpers.event_record import EventRecord
+
+from weekview.EventCell import EventCell
+
+import GLOBALS
+
+# an event of the day: the record, its summary when it was laid out, colour, top, height, lane, lane span and lanes
+DayEntry = Tuple[EventRecord, str, int, int, int, int, int, int]
+
+
+class DayColumn(Vertical):
+    """The events of one day of the week.
+
+    Cells are placed absolutely: at their top offset from midnight and,
+    if they overlap other events, in their lane(s) next to them, see
+    layout_helpers.assign_lanes().
+
+    Setting `entries` only mounts the cells of entries that are new and
+    removes the ones that are gone; cells of unchanged entries stay as they
+    are. Since entries also hold the summary, edited events get a new cell.
+    """
+
+    entries: reactive[Tuple[DayEntry, ...]] = reactive(tuple, init=False)
+
+    def on_mount(self) -> None:
+        # the cells don't take up space in the layout, so the height of the day has to be set
+        self.styles.height = 24 * GLOBALS.HOUR_HEIGHT
+
+    def watch_entries(self, entries: Tuple[DayEntry, ...]) -> None:
+        wanted = set(entries)
+        cells = list(self.query_children(EventCell))
+        stale = [cell for cell in cells if cell.entry not in wanted]
+        if stale:
+            self.remove_children(stale)
+
+        shown = {cell.entry for cell in cells}
+        new_cells = [self._make_cell(entry) for entry in entries if entry not in shown]
+        if new_cells:
+            self.mount(*new_cells)
+
+    @staticmethod
+    def _make_cell(entry: DayEntry) -> EventCell:
+        event, _, color_slot, top, height, lane, span, lanes = entry
+        cell = EventCell(event, color_slot)
+        cell.entry = entry
+        cell.styles.height = height
+        cell.styles.width = f"{100 * span / lanes}%"
+        # horizontal offsets in % are relative to the width of the cell itself
+        cell.styles.offset = (f"{100 * lane / span}%", top)
+        return cell
@@ -1,18 +1,25 @@
 from textual.widgets import Button
 from helpers import general_helpers as gh
 
-from icalendar import Event
+from helpers.event_record import EventRecord
 
 class EventCell(Button):
-    """A calendar event"""
+    """A calendar event
 
-    def __init__(self, ical_event: Event) -> None:
+    The colour comes from one of the shared classes of gh.palette_css()
+    instead of an inline style, so cells of a colour share their styles.
+    """
+
+    DEFAULT_CSS = gh.palette_css()
+
+    def __init__(self, event: EventRecord, color_slot: int) -> None:
         """Initialize the event
 
-        Args: TODO
+        Args:
+            event: the record of the event to show
+            color_slot: its colour, see CalendarSet.color_slot()
 
         TODO: get the dates and times from calDav later
         """
-        super().__init__(ical_event.get("SUMMARY"), id="id"+ical_event.get("UID"))
-        self.ical_event = ical_event
-        self.styles.background = gh.convert_summary_to_color(self.ical_event.get("SUMMARY"))
\ No newline at end of file
+        super().__init__(event.summary, classes=gh.color_class(color_slot))
+        self.event = event
@@ -6,10 +6,15 @@ from textual.validation import Length, ValidationResult, Validator
 
 from helpers import general_helpers as gh
 from helpers import layout_helpers as lh
+from helpers import recurrence as rc
+from helpers import timezones as tz
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from icalendar import Calendar, Event, vDatetime
+from icalendar import Event, vDatetime, vDDDLists, vDDDTypes
+
+from helpers.event_record import EventRecord
+from helpers.event_store import EventStore
 
 from pathlib import Path
 
@@ -18,7 +23,7 @@ from weekview.Screens.ConfirmationPopup import ConfirmationPopup
 
 from icalendar import Event
 
-from typing import Optional
+from typing import Callable, Optional, Set, Tuple
 
 from uuid import uuid4
 
@@ -28,22 +33,24 @@ class BaseEditEventScreen(Screen):
     BINDINGS = [
         ("q,escape", "app.pop_screen", "Close"),
         ("ctrl+s", "save_event", "Save Event"),
+        ("ctrl+t", "save_all_events", "Save All With This Title"),
         # TODO: add for edit of  event
         ("d", "delete_event", "Delete Event"),
     ]
 
-    def __init__(self, calendar: Calendar, ical_path: Path, ical_event: Optional[Event] = None) -> None:
+    def __init__(self, store: EventStore, ical_path: Path, event: Optional[EventRecord] = None) -> None:
         """Initialize the screen with Input widgets to add or edit an event.
         
         Args:
-            calendar: The iCalendar object to add the event to
+            store: The event store of the calendar to add the event to
             calendar_path: Optional path to save the calendar file
-            ical_event: an Event object to edit. Optional.
+            event: the record of the event to edit. Optional.
         """
         super().__init__()
-        self.calendar = calendar
+        self.store = store
         self.ical_path = ical_path
-        self.ical_event = ical_event
+        self.event = event
+        self.ical_event = store.component(event) if event else None
 
     def compose(self) -> ComposeResult:
         """Compose the event screen.
@@ -74,7 +81,7 @@ class BaseEditEventScreen(Screen):
                             validators=[isValidDate()],
                             compact=True)
                 if self.ical_event:
-                    ip.value = self.ical_event.get("DTSTART").dt.strftime("%H:%M %d.%m.%Y")
+                    ip.value = _input_time(self.ical_event.get("DTSTART").dt).strftime("%H:%M %d.%m.%Y")
                 else:
                     ip.value = f"8:00 {datetime.today().strftime('%d.%m.%Y')}"
                 yield ip
@@ -86,7 +93,7 @@ class BaseEditEventScreen(Screen):
                             validators=[isValidDate()],
                             compact=True)
                 if self.ical_event:
-                    ip.value=self.ical_event.get("DTEND").dt.strftime("%H:%M %d.%m.%Y")
+                    ip.value = _input_time(_end(self.ical_event)).strftime("%H:%M %d.%m.%Y")
                 else:
                     ip.value = f"9:00 {datetime.today().strftime('%d.%m.%Y')}"
                 yield ip
@@ -97,7 +104,7 @@ class BaseEditEventScreen(Screen):
                             id="eventLocation",
                             compact=True)
                 if self.ical_event:
-                    ip.value = self.ical_event.get("LOCATION")
+                    ip.value = self.ical_event.get("LOCATION", "")
                 yield ip
 
                 # Description
@@ -106,11 +113,13 @@ class BaseEditEventScreen(Screen):
                             id="eventDescription",
                             compact=True)
                 if self.ical_event:
-                    ip.value = self.ical_event.get("DESCRIPTION")
+                    ip.value = self.ical_event.get("DESCRIPTION", "")
                 yield ip
 
             with HorizontalGroup():
                 yield Button("Save Event", id="saveButton", variant="success")
+                if self.ical_event:
+                    yield Button("Save All With This Title", id="saveAllButton", variant="warning")
                 yield Button("Cancel", id="cancelButton", variant="error")
         yield Footer()
 
@@ -131,6 +140,8 @@ class BaseEditEventScreen(Screen):
         """
         if event.button.id == "saveButton":
             self._save_event()
+        elif event.button.id == "saveAllButton":
+            self._save_all_events()
         elif event.button.id == "cancelButton":
             self.app.pop_screen()
 
@@ -138,8 +149,18 @@ class BaseEditEventScreen(Screen):
         """Action to save the event (triggered by Ctrl+S)."""
         self._save_event()
 
-    def _save_event(self) -> None:
-        """Collect input values and save the event."""
+    def action_save_all_events(self) -> None:
+        """Action to apply the changes to every event with this title (triggered by Ctrl+T)."""
+        self._save_all_events()
+
+    def check_action(self, action: str, parameters) -> bool:
+        """Only offer editing all events with the same title when editing an event."""
+        if action == "save_all_events" and not self.ical_event:
+            return False
+        return super().check_action(action, parameters)
+
+    def _read_input(self) -> Optional[dict]:
+        """Collect and validate the input values, shows an error and returns None if they are invalid."""
         # get the data from the input fields
         title_input = self.query_one("#eventTitleInput", Input)
         start_input = self.query_one("#eventStartInput", Input)
@@ -184,12 +205,24 @@ class BaseEditEventScreen(Screen):
             error_popup = ErrorPopup(error_msg)
             self.app.push_screen(error_popup)
             error_field.focus()
+            return None
+        return parsed_input_data
+
+    def _save_event(self) -> None:
+        """Collect input values and save the event."""
+        parsed_input_data = self._read_input()
+        if parsed_input_data is None:
             return
-        
+
         # if self.ical_event we are editing and only want to pop the edit screen
-        if not self.ical_event:
+        is_new = not self.ical_event
+        if is_new:
             self.ical_event = Event()
-            self.calendar.add_component(self.ical_event)
+        else:
+            # the inputs are in the display zone, the event keeps its own
+            for key in ("DTSTART", "DTEND"):
+                parsed_input_data[key] = _event_time(parsed_input_data[key].dt, self.ical_event.get(key))
+            self.ical_event.pop("DURATION", None)
         # overwrite new input
         for key, value in zip(parsed_input_data.keys(), parsed_input_data.values()):
             if key == "UID" and self.ical_event.get("UID"):
@@ -197,21 +230,43 @@ class BaseEditEventScreen(Screen):
             else:
                 self.ical_event[key] = value
 
+        # keep the week index in sync with the new start/end
+        if is_new:
+            self.event = self.store.add(self.ical_event)
+        else:
+            self.store.update(self.event, self.ical_event)
+
         self.save_to_disk()
 
         lh.pop_all_screens(self.app)
-        lh.refresh_and_restore_scroll(self.app)
+        lh.refresh_week_grid(self.app)
     
-    def save_to_disk(self) -> None:
-        try:
-            with open(self.ical_path, 'wb') as f:
-                f.write(self.calendar.to_ical())
-                # self.app.push_screen(ErrorPopup("got here"))
-        except Exception as e:
-            # Show error if saving fails
-            error_popup = ErrorPopup(f"Error saving calendar: {str(e)}")
-            self.app.push_screen(error_popup)
+    def _save_all_events(self) -> None:
+        """Apply the changed fields to every event with the title this event had, and save them at once."""
+        if not self.ical_event:
+            return
+        parsed_input_data = self._read_input()
+        if parsed_input_data is None:
             return
+        title = str(self.ical_event.get("SUMMARY", ""))
+        start_shift, end_shift = _time_shifts(self.ical_event, parsed_input_data)
+        # occurrences of a series are changed through their master
+        records = self.store.with_summary(title)
+        # the overrides of a series that is moved have to move along, whatever their title
+        moved_series = {record.uid for record in records if self.store.is_master(record)} if start_shift else set()
+        listed = {id(record) for record in records}
+        records.extend(override for override in self.store.overrides.values()
+                       if override.uid in moved_series and id(override) not in listed)
+        edit = _edit_changes(self.ical_event, parsed_input_data, start_shift, end_shift, moved_series)
+
+        if not self.app.edit_many(self.store, records, edit):
+            self.app.push_screen(ErrorPopup("Error: another batch edit is still running"))
+            return
+        lh.pop_all_screens(self.app)
+
+    def save_to_disk(self) -> None:
+        # saved in the background, errors are shown by the app
+        self.app.request_save()
 
     
     def action_delete_event(self) -> None:
@@ -220,27 +275,13 @@ class BaseEditEventScreen(Screen):
             return
         # deletion action
         def confirm_delete() -> None:
-            vevent = self.ical_event
-            removed = False
-            # Try by identity
-            try:
-                self.calendar.subcomponents.remove(vevent)
-                removed = True
-            except ValueError:
-                # Fallback by UID
-                uid = str(vevent.get('UID'))
-                for comp in list(self.calendar.walk('VEVENT')):
-                    if str(comp.get('UID')) == uid:
-                        self.calendar.subcomponents.remove(comp)
-                        removed = True
-                        break
-            if not removed:
+            if not self.store.remove(self.event):
                 self.app.push_screen(ErrorPopup("Event not found in calendar"))
                 return
             self.save_to_disk()
             
             lh.pop_all_screens(main_app=self.app)
-            lh.refresh_and_restore_scroll(self.app)
+            lh.refresh_week_grid(self.app)
 
         #cancel action
         def cancel_delete() -> None:
@@ -250,6 +291,106 @@ class BaseEditEventScreen(Screen):
         popup = ConfirmationPopup(on_confirm=confirm_delete, on_cancel=cancel_delete, message="Do you really want to delete this event?")
         self.app.push_screen(popup)
 
+def _input_time(value) -> datetime:
+    """Get the time a DTSTART/DTEND is shown as in the inputs: in the display zone, without seconds."""
+    value = tz.to_display(value)
+    if not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    return value.replace(second=0, microsecond=0)
+
+
+def _end(event: Event):
+    """Get the end of an event, also if it has a DURATION instead of a DTEND."""
+    if event.get("DTEND") is not None:
+        return event.get("DTEND").dt
+    return event.get("DTSTART").dt + rc.event_duration(event)
+
+
+def _event_time(value: datetime, original: Optional[vDDDTypes]) -> vDDDTypes:
+    """Turn an input (a time in the display zone) into a DTSTART/DTEND in the zone of the one it replaces.
+
+    An unchanged input keeps the original as it is, with its seconds or as a
+    date for all-day events.
+    """
+    if original is None:
+        return vDatetime(value)
+    if _input_time(original.dt) == value:
+        return original
+    if isinstance(original.dt, datetime) and original.dt.tzinfo is not None:
+        moved = vDDDTypes(tz.from_timestamp(tz.to_timestamp(value), original.dt.tzinfo))
+        moved.params = original.params
+        return moved
+    return vDatetime(value)
+
+
+def _time_shifts(original: Event, parsed_input_data: dict) -> Tuple[timedelta, timedelta]:
+    """Get how far the user moved the start and the end of an event."""
+    start = _input_time(original.get("DTSTART").dt)
+    end = _input_time(_end(original))
+    return parsed_input_data["DTSTART"].dt - start, parsed_input_data["DTEND"].dt - end
+
+
+def _edit_changes(original: Event, parsed_input_data: dict, start_shift: timedelta, end_shift: timedelta,
+                  moved_series: Set[str]) -> Callable[[Event], None]:
+    """Get a function that makes the changes the user made to an event to another event.
+
+    Only the fields that were changed are copied. A changed start or end
+    moves the start or end of the other events by as much as it was moved,
+    so events on other days keep their day. A series moves with its
+    exceptions: its EXDATEs, RDATEs and UNTIL, and the RECURRENCE-IDs of its
+    overrides.
+
+    Args:
+        original: the event as it was before it was edited
+        parsed_input_data: the input values, see BaseEditEventScreen._read_input()
+        start_shift: how far the start was moved, see _time_shifts()
+        end_shift: how far the end was moved
+        moved_series: UIDs of the series whose master is moved
+    """
+    title = str(original.get("SUMMARY", ""))
+    texts = {key: parsed_input_data[key] for key in ("SUMMARY", "LOCATION", "DESCRIPTION")
+             if parsed_input_data[key] != str(original.get(key, ""))}
+
+    def edit(event: Event) -> None:
+        # overrides with another title only follow their series
+        if str(event.get("SUMMARY", "")) == title:
+            for key, value in texts.items():
+                event[key] = value
+            _shift(event, "DTSTART", start_shift)
+            if event.get("DTEND") is not None:
+                _shift(event, "DTEND", end_shift)
+            elif event.get("DURATION") is not None and end_shift != start_shift:
+                event["DURATION"] = vDDDTypes(event["DURATION"].dt + end_shift - start_shift)
+        if str(event.get("UID")) in moved_series:
+            if event.get("RECURRENCE-ID") is not None:
+                _shift(event, "RECURRENCE-ID", start_shift)
+            else:
+                for key in ("EXDATE", "RDATE"):
+                    if event.get(key) is not None:
+                        event[key] = [_shifted_dates(dates, start_shift) for dates in rc.as_list(event[key])]
+                for recur in rc.as_list(event.get("RRULE")):
+                    if recur.get("UNTIL"):
+                        recur["UNTIL"] = [until + start_shift for until in recur["UNTIL"]]
+        event["DTSTAMP"] = vDatetime(datetime.now(timezone.utc))
+
+    return edit
+
+
+def _shift(event: Event, key: str, shift: timedelta) -> None:
+    """Move a date(time) property, keeping its time zone."""
+    if not shift:
+        return
+    old = event[key]
+    moved = vDDDTypes(old.dt + shift)
+    moved.params = old.params
+    event[key] = moved
+
+
+def _shifted_dates(dates: vDDDLists, shift: timedelta) -> vDDDLists:
+    moved = vDDDLists([value.dt + shift for value in dates.dts])
+    moved.params = dates.params
+    return moved
+
 # validator classes
 class isValidDate(Validator):
     def validate(self, value: str) -> ValidationResult:
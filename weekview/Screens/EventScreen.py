@@ -3,7 +3,10 @@ from textual.screen import Screen
 from textual.widgets import Button, Footer, Label, Rule
 from textual.containers import VerticalScroll, Center, Grid
 
-from icalendar import Event, Calendar
+from helpers import layout_helpers as lh
+from helpers import timezones as tz
+from helpers.event_record import EventRecord
+from helpers.event_store import EventStore
 
 from pathlib import Path
 
@@ -17,15 +20,16 @@ class EventScreen(Screen):
         ("e", "edit_event", "Edit Event"),
     ]
 
-    def __init__(self, ical_event: Event, calendar: Calendar, ical_path: Path) -> None:
+    def __init__(self, event: EventRecord, store: EventStore, ical_path: Path) -> None:
         """Initialize the event screen with event data.
         
         Args:
-            ical_event: The calendar event data to display
+            event: The record of the calendar event to display
         """
         super().__init__()
-        self.ical_event = ical_event
-        self.calendar = calendar
+        self.event = event
+        self.ical_event = store.component(event)
+        self.store = store
         self.ical_path = ical_path
         self.called_edit = False
 
@@ -41,13 +45,15 @@ class EventScreen(Screen):
             with Grid():
                 # Start
                 yield Label("Start:", classes="type")
-                yield Label(f"{GLOBALS.WEEK_DAYS[self.ical_event.get("DTSTART").dt.weekday()]}, the {self.ical_event.get("DTSTART").dt}",
+                start = tz.to_display(self.ical_event.get("DTSTART").dt)
+                yield Label(f"{GLOBALS.WEEK_DAYS[start.weekday()]}, the {start}",
                             id="eventStart",
                             classes="data")
 
                 # End
                 yield Label("End:", classes="type")
-                yield Label(f"{GLOBALS.WEEK_DAYS[self.ical_event.get("DTSTART").dt.weekday()]}, the {self.ical_event.get("DTEND").dt}",
+                end = tz.to_display(self.ical_event.get("DTEND").dt)
+                yield Label(f"{GLOBALS.WEEK_DAYS[end.weekday()]}, the {end}",
                             id="eventEnd",
                             classes="data")
                 
@@ -78,33 +84,17 @@ class EventScreen(Screen):
             # Close this screen first to reveal WeekGrid
             self.app.pop_screen()
             if self.called_edit:
-                self.refresh_and_restore_scroll()
+                lh.refresh_week_grid(self.app)
 
     def action_event_pop_screen(self) -> None:
         # Close this screen first to reveal WeekGrid
         self.app.pop_screen()
         if self.called_edit:
-            self.refresh_and_restore_scroll()
-
-    #TODO: make this a helper function?
-    def refresh_and_restore_scroll(self) -> None: 
-        # Capture current scroll position
-        y_scroll = 0
-        scroll_widget = self.app.query_one("#week-scroll", VerticalScroll)
-        y_scroll = scroll_widget.scroll_y
-
-        # Refresh and restore
-        self.app.refresh(recompose=True)
-
-        def restore_scroll() -> None:
-            new_scroll = self.app.query_one("#week-scroll", VerticalScroll)
-            new_scroll.scroll_to(y=y_scroll, animate=False)
-        
-        self.app.call_after_refresh(restore_scroll)
+            lh.refresh_week_grid(self.app)
 
     def action_edit_event(self):
         """Open the new event screen and handle the returned data."""
         from weekview.Screens.BaseEditEventScreen import BaseEditEventScreen
         self.called_edit = True
-        edit_event_screen = BaseEditEventScreen(self.calendar, self.ical_path, self.ical_event, )
+        edit_event_screen = BaseEditEventScreen(self.store, self.ical_path, self.event)
         self.app.push_screen(edit_event_screen)
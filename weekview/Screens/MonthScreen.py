@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from textual import events
+from textual.app import ComposeResult
+from textual.screen import Screen
+from textual.widgets import Footer, Label, Static
+from textual.containers import Grid
+
+from helpers import timezones as tz
+from helpers.calendar_set import CalendarSet
+from helpers.day_index import DayStats, density
+
+import GLOBALS
+
+# rows of days, enough for every month
+MONTH_WEEKS = 6
+
+
+class MonthDay(Static):
+    """A day of the MonthScreen, clicking it shows its week."""
+
+    def __init__(self) -> None:
+        super().__init__(classes="monthDay")
+        self.day: Optional[date] = None
+
+    def show(self, day: date, stats: DayStats, in_month: bool) -> None:
+        """Show the events of a day.
+
+        Args:
+            day: the day
+            stats: its aggregate, see DayIndex
+            in_month: False for the days of the previous/next month that fill the weeks
+        """
+        self.day = day
+        text = str(day.day)
+        if stats.count:
+            hours, minutes = divmod(stats.busy_minutes, 60)
+            text += f"\n{stats.count} event{'s' if stats.count > 1 else ''}, {hours}:{minutes:02}h"
+            text += f"\n{tz.from_timestamp(stats.first):%H:%M}-{tz.from_timestamp(stats.last):%H:%M}"
+        self.update(text)
+        self.set_classes(f"monthDay density-{density(stats)}" + ("" if in_month else " otherMonth"))
+
+    def on_click(self, event: events.Click) -> None:
+        self.screen.dismiss(self.day)
+
+
+class MonthScreen(Screen[Optional[date]]):
+    """How busy the days of a month are.
+
+    The days are read from the DayIndex of every calendar, so showing a month
+    doesn't depend on the number of events. Dismissed with the day that was
+    clicked, to show its week, or None.
+    """
+
+    BINDINGS = [
+        ("q,escape", "close", "Close"),
+        ("n", "next_month", "Next Month"),
+        ("p", "previous_month", "Previous Month"),
+    ]
+
+    def __init__(self, days: CalendarSet, month: date) -> None:
+        """Initialize the month screen.
+
+        Args:
+            days: the calendars, see CalendarSet.days()
+            month: a day of the month to show
+        """
+        super().__init__()
+        self.days = days
+        self.month = month.replace(day=1)
+        self.title_label = Label(id="monthTitle")
+        self.day_cells = [MonthDay() for _ in range(7 * MONTH_WEEKS)]
+
+    def compose(self) -> ComposeResult:
+        yield self.title_label
+        with Grid(id="monthWeekdays"):
+            for name in GLOBALS.WEEK_DAYS:
+                yield Label(name, classes="monthWeekday")
+        with Grid(id="monthGrid"):
+            yield from self.day_cells
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.show_month()
+
+    def show_month(self) -> None:
+        """Show the weeks of the current month, from Monday to Sunday."""
+        self.title_label.update(f"{GLOBALS.MONTHS[self.month.month - 1]} {self.month.year}")
+        first = self.month - timedelta(days=self.month.weekday())
+        stats = self.days.days(first, len(self.day_cells))
+        for offset, (cell, day_stats) in enumerate(zip(self.day_cells, stats)):
+            day = first + timedelta(days=offset)
+            cell.show(day, day_stats, day.month == self.month.month)
+
+    def action_next_month(self) -> None:
+        self.month = (self.month + timedelta(days=31)).replace(day=1)
+        self.show_month()
+
+    def action_previous_month(self) -> None:
+        self.month = (self.month - timedelta(days=1)).replace(day=1)
+        self.show_month()
+
+    def action_close(self) -> None:
+        self.dismiss(None)
@@ -0,0 +1,76 @@
+from typing import List, Optional
+
+from textual.app import ComposeResult
+from textual.screen import Screen
+from textual.widgets import Footer, Input, Label, OptionList
+from textual.widgets.option_list import Option
+
+from helpers import timezones as tz
+from helpers.event_record import EventRecord
+from helpers.calendar_set import CalendarSet
+
+import GLOBALS
+
+# the maximum number of events listed
+MAX_RESULTS = 200
+
+
+class SearchScreen(Screen[Optional[EventRecord]]):
+    """Search the events of the calendar as you type.
+
+    The words are looked up in the search indexes of the calendars, see
+    EventStore.search(). Dismissed with the event that was picked, to show
+    its week, or None.
+    """
+
+    BINDINGS = [
+        ("escape", "close", "Close"),
+    ]
+
+    def __init__(self, store: CalendarSet) -> None:
+        """Initialize the search screen.
+
+        Args:
+            store: the calendars to search
+        """
+        super().__init__()
+        self.store = store
+        self.results: List[EventRecord] = []
+
+    def compose(self) -> ComposeResult:
+        yield Input(placeholder="Search title, location and description", id="searchInput")
+        yield Label(id="searchStatus")
+        # the titles are shown as they are, not as markup
+        yield OptionList(id="searchResults", markup=False)
+        yield Footer()
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        self.results = self.store.search(event.value, MAX_RESULTS + 1) if event.value.strip() else []
+        shown = self.results[:MAX_RESULTS]
+
+        options = self.query_one("#searchResults", OptionList)
+        options.clear_options()
+        options.add_options(Option(self._describe(record)) for record in shown)
+        status = f"{len(shown)} events" if event.value.strip() else ""
+        if len(self.results) > MAX_RESULTS:
+            status = f"first {MAX_RESULTS} events"
+        self.query_one("#searchStatus", Label).update(status)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        if self.results:
+            self.dismiss(self.results[0])
+
+    def on_option_list_option_selected(self, event: OptionList.OptionSelected) -> None:
+        self.dismiss(self.results[event.option_index])
+
+    def _describe(self, record: EventRecord) -> str:
+        start = tz.from_timestamp(record.start)
+        text = f"{GLOBALS.WEEK_DAYS[start.weekday()][:3]} {start:%d.%m.%Y %H:%M}  {record.summary}"
+        if record.location:
+            text += f"  ({record.location})"
+        if self.store.is_master(record):
+            text += "  [repeats]"
+        return text
+
+    def action_close(self) -> None:
+        self.dismiss(None)
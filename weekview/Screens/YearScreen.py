@@ -0,0 +1,116 @@
+from calendar import monthrange
+from datetime import date
+from typing import Optional
+
+from rich.text import Text
+
+from textual import events
+from textual.app import ComposeResult
+from textual.screen import Screen
+from textual.widget import Widget
+from textual.widgets import Footer, Label
+
+from helpers.calendar_set import CalendarSet
+from helpers.day_index import DENSITY_MINUTES, density
+
+import GLOBALS
+
+# columns of the names of the months
+NAME_WIDTH = 5
+# columns of a day
+DAY_WIDTH = 2
+
+
+class YearHeatmap(Widget):
+    """How busy every day of a year is, a line per month and a square per day."""
+
+    COMPONENT_CLASSES = {f"year-heatmap--level-{level}" for level in range(len(DENSITY_MINUTES) + 2)}
+
+    DEFAULT_CSS = """
+    YearHeatmap {
+        height: auto;
+        width: auto;
+        padding: 1 2;
+    }
+    YearHeatmap > .year-heatmap--level-0 { color: $surface-lighten-2; }
+    YearHeatmap > .year-heatmap--level-1 { color: $success 40%; }
+    YearHeatmap > .year-heatmap--level-2 { color: $success 65%; }
+    YearHeatmap > .year-heatmap--level-3 { color: $warning; }
+    YearHeatmap > .year-heatmap--level-4 { color: $error; }
+    """
+
+    def __init__(self, days: CalendarSet, year: int) -> None:
+        super().__init__()
+        self.days = days
+        self.year = year
+
+    def render(self) -> Text:
+        """Draw the year, reading one aggregate per day from the DayIndexes."""
+        styles = [self.get_component_rich_style(f"year-heatmap--level-{level}")
+                  for level in range(len(DENSITY_MINUTES) + 2)]
+        first = date(self.year, 1, 1)
+        stats = iter(self.days.days(first, date(self.year + 1, 1, 1).toordinal() - first.toordinal()))
+
+        text = Text(" " * NAME_WIDTH + "".join(f"{day:<{DAY_WIDTH * 5}}" for day in range(1, 32, 5)) + "\n")
+        for month, name in enumerate(GLOBALS.MONTHS, 1):
+            text.append(f"{name[:3]:<{NAME_WIDTH}}")
+            for _ in range(monthrange(self.year, month)[1]):
+                text.append("■".ljust(DAY_WIDTH), styles[density(next(stats))])
+            text.append("\n")
+        return text
+
+    def day_at(self, x: int, y: int) -> Optional[date]:
+        """Get the day drawn at a point of the content of the widget."""
+        month, day = y, (x - NAME_WIDTH) // DAY_WIDTH + 1
+        if x < NAME_WIDTH or not 1 <= month <= 12 or day > monthrange(self.year, month)[1]:
+            return None
+        return date(self.year, month, day)
+
+    def on_click(self, event: events.Click) -> None:
+        offset = event.get_content_offset(self)
+        day = offset and self.day_at(offset.x, offset.y)
+        if day is not None:
+            self.screen.dismiss(day)
+
+
+class YearScreen(Screen[Optional[date]]):
+    """How busy the days of a year are, see MonthScreen.
+
+    Dismissed with the day that was clicked, to show its week, or None.
+    """
+
+    BINDINGS = [
+        ("q,escape", "close", "Close"),
+        ("n", "next_year", "Next Year"),
+        ("p", "previous_year", "Previous Year"),
+    ]
+
+    def __init__(self, days: CalendarSet, year: int) -> None:
+        """Initialize the year screen.
+
+        Args:
+            days: the calendars, see CalendarSet.days()
+            year: the year to show
+        """
+        super().__init__()
+        self.heatmap = YearHeatmap(days, year)
+        self.title_label = Label(str(year), id="yearTitle")
+
+    def compose(self) -> ComposeResult:
+        yield self.title_label
+        yield self.heatmap
+        yield Footer()
+
+    def show_year(self, year: int) -> None:
+        self.heatmap.year = year
+        self.title_label.update(str(year))
+        self.heatmap.refresh()
+
+    def action_next_year(self) -> None:
+        self.show_year(self.heatmap.year + 1)
+
+    def action_previous_year(self) -> None:
+        self.show_year(self.heatmap.year - 1)
+
+    def action_close(self) -> None:
+        self.dismiss(None)
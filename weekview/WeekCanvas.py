@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from rich.segment import Segment
+from rich.style import Style
+
+from textual import events
+from textual.binding import Binding
+from textual.geometry import Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from helpers import general_helpers as gh
+from helpers import layout_helpers as lh
+from helpers.event_record import EventRecord
+
+import GLOBALS
+
+# columns of the times on the left
+TIMES_WIDTH = 6
+# lines of the day names and dates at the top
+BAR_HEIGHT = 2
+
+# a cell in a row of the canvas: (first column, end column, day, index in the layout of the day)
+RowCell = Tuple[int, int, int, int]
+
+
+class WeekCanvas(ScrollView, can_focus=True):
+    """The events of a week, painted line by line.
+
+    An alternative to WeekGrid for weeks with hundreds of events: instead of
+    a widget per event this is a single widget on the Line API that paints
+    the lines that are visible from the layout of the week (see
+    layout_helpers.week_layout()). The cells of every row are indexed once
+    per layout, so painting a line only looks at the cells on it, and painted
+    lines are cached until the week, the size or the selection changes.
+
+    Events are selected with the arrow keys or by clicking them, and opened
+    with enter or a click, like EventCells.
+    """
+
+    BINDINGS = [
+        Binding("up", "select_event(-1)", "Previous Event", show=False),
+        Binding("down", "select_event(1)", "Next Event", show=False),
+        Binding("left", "select_day(-1)", "Previous Day", show=False),
+        Binding("right", "select_day(1)", "Next Day", show=False),
+        Binding("enter", "open_event", "Open Event", show=False),
+    ]
+
+    COMPONENT_CLASSES = {
+        "week-canvas--bar",
+        "week-canvas--time",
+        "week-canvas--day",
+        "week-canvas--selected",
+    }
+
+    DEFAULT_CSS = """
+    WeekCanvas {
+        height: 1fr;
+        overflow-x: hidden;
+    }
+    WeekCanvas > .week-canvas--bar {
+        background: $surface;
+        color: $primary;
+    }
+    WeekCanvas > .week-canvas--time {
+        background: $surface;
+        color: $primary;
+    }
+    WeekCanvas > .week-canvas--day {
+        background: $background;
+        color: $surface-lighten-2;
+    }
+    WeekCanvas > .week-canvas--selected {
+        text-style: bold reverse;
+    }
+    """
+
+    class EventSelected(Message):
+        """Sent when an event is opened."""
+
+        def __init__(self, event: EventRecord) -> None:
+            super().__init__()
+            self.event = event
+
+    def __init__(self, layouts: lh.WeekLayoutCache, week_start: datetime, **kwargs) -> None:
+        """Initialize the WeekCanvas with the layout cache and week start date.
+
+        Args:
+            layouts: The cache of the week layouts of the loaded calendar
+            week_start: Start date of the week (Monday)
+        """
+        super().__init__(**kwargs)
+        self.layouts = layouts
+        self.week_start = week_start
+        self.week_layout: List[lh.DayLayout] = [[] for _ in GLOBALS.WEEK_DAYS]
+        # row -> the cells on it, from left to right
+        self._rows: List[List[RowCell]] = []
+        self._rows_width = -1
+        self._lines: Dict[int, Strip] = {}
+        self._event_styles: Dict[Tuple[int, bool], Style] = {}
+        # (day, index in the layout of the day)
+        self.selected: Optional[Tuple[int, int]] = None
+        self.virtual_size = Size(0, BAR_HEIGHT + 24 * GLOBALS.HOUR_HEIGHT)
+
+    def on_mount(self) -> None:
+        """Show the week and scroll to around 8 AM, like WeekGrid."""
+        self.show_week(self.week_start)
+        self.call_after_refresh(lambda: self.scroll_to(y=8 * GLOBALS.HOUR_HEIGHT, animate=False))
+
+    def show_week(self, week_start: datetime) -> None:
+        """Show the week starting at week_start.
+
+        Args:
+            week_start: Start date of the week (Monday)
+        """
+        self.week_start = week_start
+        self.selected = None
+        self.update_days()
+
+    def update_days(self) -> None:
+        """Show the current layout of the week, e.g. after events were edited."""
+        try:
+            self.week_layout = self.layouts.get(self.week_start)
+        except Exception as e:
+            self.notify(f"Error reading calendar: {e}", severity="error")
+            self.week_layout = [[] for _ in GLOBALS.WEEK_DAYS]
+        if self.selected is not None:
+            day, index = self.selected
+            self.selected = (day, min(index, len(self.week_layout[day]) - 1)) if self.week_layout[day] else None
+        self._rows_width = -1
+        self._refresh_lines()
+
+    def _refresh_lines(self) -> None:
+        self._lines.clear()
+        self.refresh()
+
+    def on_resize(self, event: events.Resize) -> None:
+        self._refresh_lines()
+
+    def notify_style_update(self) -> None:
+        # e.g. the theme changed
+        super().notify_style_update()
+        self._event_styles.clear()
+        self._lines.clear()
+
+    def _day_columns(self) -> List[int]:
+        """The first column of every day, and the end of the last one."""
+        days_width = max(self.size.width - TIMES_WIDTH, len(GLOBALS.WEEK_DAYS))
+        count = len(GLOBALS.WEEK_DAYS)
+        return [TIMES_WIDTH + day * days_width // count for day in range(count + 1)]
+
+    def _index_rows(self) -> List[List[RowCell]]:
+        """Index the cells of every row, once per layout and width."""
+        if self._rows_width == self.size.width:
+            return self._rows
+        columns = self._day_columns()
+        rows: List[List[RowCell]] = [[] for _ in range(24 * GLOBALS.HOUR_HEIGHT)]
+        for day, day_layout in enumerate(self.week_layout):
+            # the first column of a day separates it from the day before
+            left = columns[day] + 1
+            width = columns[day + 1] - left
+            for index, (_, top, height, lane, span, lanes) in enumerate(day_layout):
+                start = left + width * lane // lanes
+                end = left + width * (lane + span) // lanes
+                for row in range(top, min(top + height, len(rows))):
+                    rows[row].append((start, end, day, index))
+        for cells in rows:
+            cells.sort()
+        self._rows, self._rows_width = rows, self.size.width
+        return rows
+
+    def _event_style(self, event: EventRecord) -> Style:
+        dark = self.app.current_theme.dark
+        slot = self.layouts.calendars.color_slot(event)
+        style = self._event_styles.get((slot, dark))
+        if style is None:
+            background, color = gh.palette_color(slot, dark)
+            style = Style(bgcolor=background.rich_color, color=color.rich_color)
+            self._event_styles[(slot, dark)] = style
+        return style
+
+    def render_line(self, y: int) -> Strip:
+        """Paint a line of the canvas; the day names and dates stay on top."""
+        width = self.size.width
+        if y < BAR_HEIGHT:
+            return self._render_bar(y, width)
+        row = y - BAR_HEIGHT + int(self.scroll_offset.y)
+        line = self._lines.get(row)
+        if line is None:
+            line = self._render_row(row, width)
+            self._lines[row] = line
+        return line
+
+    def _render_bar(self, y: int, width: int) -> Strip:
+        style = self.get_component_rich_style("week-canvas--bar")
+        columns = self._day_columns()
+        segments = [Segment(("time" if y == 0 else "").center(TIMES_WIDTH)[:TIMES_WIDTH], style)]
+        for day, name in enumerate(GLOBALS.WEEK_DAYS):
+            shifted_day = self.week_start + timedelta(days=day)
+            text = name if y == 0 else f"{shifted_day.day}.{shifted_day.month}.{shifted_day.year}"
+            day_width = columns[day + 1] - columns[day]
+            segments.append(Segment(text.center(day_width)[:day_width], style))
+        return Strip(segments).adjust_cell_length(width, style)
+
+    def _render_row(self, row: int, width: int) -> Strip:
+        if row >= 24 * GLOBALS.HOUR_HEIGHT:
+            return Strip.blank(width, self.rich_style)
+        day_style = self.get_component_rich_style("week-canvas--day")
+        selected_style = self.get_component_rich_style("week-canvas--selected")
+        columns = self._day_columns()
+
+        hour, rest = divmod(row, GLOBALS.HOUR_HEIGHT)
+        time_label = f"{hour}:00" if rest == 0 else ""
+        segments = [Segment(time_label.center(TIMES_WIDTH), self.get_component_rich_style("week-canvas--time"))]
+        x = TIMES_WIDTH
+        # separators of the days, and the gaps between cells
+        separators = set(columns[:-1])
+        for start, end, day, index in self._index_rows()[row]:
+            while x < start:
+                segments.append(Segment("│" if x in separators else " ", day_style))
+                x += 1
+            if end <= x:
+                continue
+            event, top, _, _, _, _ = self.week_layout[day][index]
+            style = self._event_style(event)
+            if self.selected == (day, index):
+                style += selected_style
+            cell_width = end - x
+            # the summary wraps over the rows of the cell
+            offset = (row - top) * cell_width
+            text = event.summary[offset:offset + cell_width]
+            segments.append(Segment(text.ljust(cell_width), style))
+            x = end
+        while x < columns[-1]:
+            segments.append(Segment("│" if x in separators else " ", day_style))
+            x += 1
+        return Strip(segments).adjust_cell_length(width, day_style)
+
+    def cell_at(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """Get the cell at a point of the widget.
+
+        Args:
+            x: column in the widget
+            y: line in the widget
+
+        Returns:
+            Optional[Tuple[int, int]]: the day and the index of the event in its layout,
+                None if there is no event at the point
+        """
+        row = y - BAR_HEIGHT + int(self.scroll_offset.y)
+        rows = self._index_rows()
+        if y < BAR_HEIGHT or not 0 <= row < len(rows):
+            return None
+        cells = rows[row]
+        i = bisect_right(cells, (x, float("inf"))) - 1
+        if i >= 0 and cells[i][0] <= x < cells[i][1]:
+            return cells[i][2], cells[i][3]
+        return None
+
+    def on_click(self, event: events.Click) -> None:
+        offset = event.get_content_offset(self)
+        if offset is None:
+            return
+        cell = self.cell_at(offset.x, offset.y)
+        if cell is not None:
+            self._select(cell)
+            self.action_open_event()
+
+    def _select(self, cell: Optional[Tuple[int, int]]) -> None:
+        self.selected = cell
+        self._refresh_lines()
+        if cell is None:
+            return
+        _, top, height, _, _, _ = self.week_layout[cell[0]][cell[1]]
+        visible = self.size.height - BAR_HEIGHT
+        if top < self.scroll_y:
+            self.scroll_to(y=top, animate=False)
+        elif top + height > self.scroll_y + visible:
+            self.scroll_to(y=min(top, top + height - visible), animate=False)
+
+    def action_select_event(self, step: int) -> None:
+        """Select the event above or below the selected one in its day."""
+        if self.selected is None:
+            self._select(self._first_event(range(len(self.week_layout))))
+            return
+        day, index = self.selected
+        index += step
+        if 0 <= index < len(self.week_layout[day]):
+            self._select((day, index))
+
+    def action_select_day(self, step: int) -> None:
+        """Select the event closest to the selected one in the next day with events."""
+        if self.selected is None:
+            self._select(self._first_event(range(len(self.week_layout))))
+            return
+        day, index = self.selected
+        top = self.week_layout[day][index][1]
+        days = range(day + step, len(self.week_layout) if step > 0 else -1, step)
+        for other in days:
+            if self.week_layout[other]:
+                tops = [cell[1] for cell in self.week_layout[other]]
+                closest = min(range(len(tops)), key=lambda i: abs(tops[i] - top))
+                self._select((other, closest))
+                return
+
+    def _first_event(self, days) -> Optional[Tuple[int, int]]:
+        for day in days:
+            if self.week_layout[day]:
+                return day, 0
+        return None
+
+    def action_open_event(self) -> None:
+        """Open the selected event."""
+        if self.selected is not None:
+            day, index = self.selected
+            self.post_message(self.EventSelected(self.week_layout[day][index][0]))
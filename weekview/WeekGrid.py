@@ -2,58 +2,49 @@ from __future__ import annotations
 
 from textual.app import ComposeResult
 from textual.widget import Widget
-from textual.widgets import Label, Button
-from textual.containers import HorizontalGroup, Grid, VerticalScroll, Vertical
+from textual.widgets import Label
+from textual.containers import HorizontalGroup, VerticalScroll, Vertical
 
 from datetime import datetime, timedelta
 
-from icalendar import Calendar
 
 # Import helper modules
-from helpers import ical_helpers as ih
 from helpers import layout_helpers as lh
 
 # Import week view components
-from weekview.EventCell import EventCell
+from weekview.DayColumn import DayColumn
 
 # Import constants
 import GLOBALS
 
-class NextButton(Button):
-    """button to increment the overlap event"""
-    def __init__(self, weekday: str, nr_overlaps: int, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.weekday = weekday
-        self.nr_overlaps = nr_overlaps
-
-class PrevButton(Button):
-    """button to decrement the overlap event"""
-    def __init__(self, weekday: str, nr_overlaps: int, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.weekday = weekday
-        self.nr_overlaps = nr_overlaps
-
 class WeekGrid(Widget):
     """The main Grid of events of a week
+
+    The widgets are only composed once. Switching weeks and edits update the
+    labels and the DayColumns in place, and each DayColumn only re-mounts the
+    cells that changed. Overlapping events are shown side by side.
     
     Returns:
         ComposeResult: The result of adding all events into a week grid view
     """
-    def __init__(self, calendar: Calendar, week_start: datetime) -> None:
-        """Initialize the WeekGrid with calendar path and week start date.
+    def __init__(self, layouts: lh.WeekLayoutCache, week_start: datetime, **kwargs) -> None:
+        """Initialize the WeekGrid with the layout cache and week start date.
         
         Args:
-            ics_path: Path to the ICS calendar file
+            layouts: The cache of the week layouts of the loaded calendar
             week_start: Start date of the week (Monday)
         """
-        super().__init__()
-        self.calendar = calendar
+        super().__init__(**kwargs)
+        self.layouts = layouts
         self.week_start = week_start
-        self.overlap_index = {day: 0 for day in GLOBALS.WEEK_DAYS}
         self.vscroll = None
+        self.day_labels = [Label(classes="weekdayTopBar") for _ in GLOBALS.WEEK_DAYS]
+        self.day_columns = [DayColumn(classes="dayContainer") for _ in GLOBALS.WEEK_DAYS]
+        self.week_layout = [[] for _ in GLOBALS.WEEK_DAYS]
 
     def on_mount(self) -> None:
         """Called when the WeekGrid is mounted. Set initial scroll position."""
+        self.show_week(self.week_start)
         # Set initial scroll position to around 8 AM (adjust as needed)
         # scroll_widget = self.query_one("#week-scroll", VerticalScroll)
         initial_scroll_y = 8 * GLOBALS.HOUR_HEIGHT
@@ -62,124 +53,53 @@ class WeekGrid(Widget):
 
     def compose(self) -> ComposeResult:
         """Compose the week grid.
+
+        The days are empty until show_week() fills them.
         
         Returns:
-            ComposeResult: the result of composing the events into the week grid.
+            ComposeResult: the result of composing the week grid.
         """
-        #-----------------------
-        # generating week-array
-        #-----------------------
-        # TODO: this should be in the week.py
-        try:
-            events_this_week = ih.get_week_events(self.week_start, self.calendar)
-        except FileNotFoundError:
-            print(f"ICS file not found at {self.ics_path}")
-            events_this_week = []
-        except Exception as e:
-            print(f"Error reading calendar: {e}")
-            events_this_week = []
-        
-        #-----------------------
-        # generate the buttons
-        #-----------------------
-        
-        # generate the top bar
-        # TODO: clean up this code, put in function or something since it's copy-pasted from below
-        dayList = []
-        for day, dayIndex in zip(GLOBALS.WEEK_DAYS, [i for i in range(7)]):
-            shifted_day = self.week_start + timedelta(days=dayIndex)
-            formatted_date_str = day + "\n" + str(shifted_day.day) + "." + str(shifted_day.month) + "." + str(shifted_day.year)
-            dayList += [Label(formatted_date_str, classes="weekdayTopBar")]
-        
         yield HorizontalGroup(
             # TODO: move this to daylist init
             Label("time\n", classes="timesTopBar"),
-            *dayList,
+            *self.day_labels,
             classes="topBar"
         )
 
-        # generate overlap bar
-        #TODO: should be a grid later (?), for now proof of concept
-        overlap_bar = [Label("overlap", classes="overlapIndicatorLabel")]
-
         # create a column of times
         timesList = [Label(str(i)+":00", classes="timesLabel") for i in range(24)]
         timesListVertical = Vertical(*timesList, classes="timesContainer")
 
-        # create the actual entries
-        weekList = [timesListVertical]
-        for day, dayIndex in zip(GLOBALS.WEEK_DAYS, [i for i in range(7)]):
-            dayList = []
-
-            overlap_list = lh.overlap_list([x for x in events_this_week if x.get("DTSTART").dt.weekday()==dayIndex])
-
-            if len(overlap_list) != 0:
-                height, padding = lh.calc_padding_and_height(overlap_list[0])
-
-            # make the next/prev button and label
-            if len(overlap_list) > 1:
-                g = Grid(
-                    PrevButton(weekday=day, nr_overlaps=len(overlap_list), label="<", classes="nextPrevButton", compact=True),
-                    Label(f"{self.overlap_index[day]+1}/{len(overlap_list)}", classes="innerText"),
-                    NextButton(weekday=day, nr_overlaps=len(overlap_list), label=">", classes="nextPrevButton", compact=True),
-                    classes="overlapGrid"
-                )
-
-                overlap_bar.append(g)
-            else:
-                overlap_bar.append(Label(classes="overlapGridBar"))
-
-            #TODO: remove eventually
-            # lh.write_overlap_list(overlap_list)
-
-            # for event in (x for x in events_this_week if x["weekday"]==dayIndex):
-            # for event in events_this_week:
-            oi = self.overlap_index[day]
-
-            # TODO: fix
-            if len(overlap_list) != 0:
-            # if len(overlap_list) == 0:
-                for event, i in zip(overlap_list[oi], range(len(overlap_list[oi]))):
-                    event_in_cell = EventCell(event)
-                    # event_in_cell = Label("event")
-                    event_in_cell.styles.height = height[i]
-                    event_in_cell.styles.margin = (padding[i], 0, 0, 0)  # (top, right, bottom, left) - vertical spacing
-
-                    dayList.append(event_in_cell)
-
-            # Create a Vertical container for each day
-            dayContainer = Vertical(*dayList, classes="dayContainer")
-            weekList.append(dayContainer)
-
-        #TODO: clean up
-        yield HorizontalGroup(
-            *overlap_bar,
-            classes="overlapBar"
-        )
-        
         # Wrap the entire HorizontalGroup in a single VerticalScroll
-        weekGroup = HorizontalGroup(*weekList)
+        weekGroup = HorizontalGroup(timesListVertical, *self.day_columns)
         weekGroup.styles.height = "auto"
         
         # Create VerticalScroll with an ID so we can access it later
         self.vscroll = VerticalScroll(weekGroup, id="week-scroll")
         yield self.vscroll
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        """Handle button press events.
+
+    def show_week(self, week_start: datetime) -> None:
+        """Show the week starting at week_start.
 
         Args:
-            event: The button press event.
+            week_start: Start date of the week (Monday)
         """
-        if isinstance(event.button, NextButton) or isinstance(event.button, PrevButton):
-            curr_index = self.overlap_index[event.button.weekday]
-            if isinstance(event.button, NextButton):
-                # Increment and wrap around
-                curr_index = (curr_index + 1) % event.button.nr_overlaps
-            else:
-                curr_index = (curr_index - 1) % event.button.nr_overlaps
-
-            self.overlap_index[event.button.weekday] = curr_index
-
-            # Refresh screen
-            lh.refresh_and_restore_scroll(self.app)
\ No newline at end of file
+        self.week_start = week_start
+        for label, dayIndex in zip(self.day_labels, range(7)):
+            shifted_day = self.week_start + timedelta(days=dayIndex)
+            label.update(GLOBALS.WEEK_DAYS[dayIndex] + "\n" + str(shifted_day.day) + "." + str(shifted_day.month) + "." + str(shifted_day.year))
+        self.update_days()
+
+    def update_days(self) -> None:
+        """Show the current layout of the week, e.g. after events were edited."""
+        try:
+            self.week_layout = self.layouts.get(self.week_start)
+        except Exception as e:
+            self.notify(f"Error reading calendar: {e}", severity="error")
+            self.week_layout = [[] for _ in GLOBALS.WEEK_DAYS]
+        color_slot = self.layouts.calendars.color_slot
+        for column, day_layout in zip(self.day_columns, self.week_layout):
+            column.entries = tuple(
+                (event, event.summary, color_slot(event), top, height, lane, span, lanes)
+                for event, top, height, lane, span, lanes in day_layout
+            )
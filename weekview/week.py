@@ -1,19 +1,55 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
 
 from textual.app import App, ComposeResult
+from textual.binding import Binding
 from textual.widgets import Button, Header, Footer
+from textual.worker import Worker
+from icalendar import Event
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 # Import week view components
 from weekview.WeekGrid import WeekGrid
+from weekview.WeekCanvas import WeekCanvas
 from weekview.EventCell import EventCell
 from weekview.Screens.BaseEditEventScreen import BaseEditEventScreen
 from weekview.Screens.EventScreen import EventScreen
+from weekview.Screens.ErrorPopup import ErrorPopup
+from weekview.Screens.MonthScreen import MonthScreen
+from weekview.Screens.YearScreen import YearScreen
+from weekview.Screens.SearchScreen import SearchScreen
 
-from icalendar import Calendar
+from helpers.caldav_sync import CalDavCalendar
+from helpers.feeds import Feed
+from helpers.sqlite_store import SqliteStore
+from helpers.calendar_set import CalendarSet
+from helpers.event_record import EventRecord
+from helpers.event_store import EventStore
+from helpers import timezones as tz
+from helpers.journal import Entry
+from helpers import file_watch as fw
+from helpers import layout_helpers as lh
+from helpers.layout_helpers import WeekLayoutCache
+
+# seconds a save waits for more changes, so a burst of edits is written at once
+SAVE_DELAY = 0.25
+# seconds without navigating before the adjacent weeks are laid out in advance
+PREFETCH_DELAY = 0.3
+# seconds after starting before the search index is built in the background
+SEARCH_INDEX_DELAY = 1.0
+# calendars that can be shown/hidden with the number keys
+TOGGLE_KEYS = 9
+# seconds between checks whether another program changed a calendar file
+WATCH_INTERVAL = 2.0
+# seconds between syncs of the CalDAV calendars
+SYNC_INTERVAL = 300.0
+# seconds between downloads of the subscribed calendars
+FEED_INTERVAL = 900.0
 
 class Week(App):
     """Main week view class."""
@@ -24,23 +60,50 @@ class Week(App):
         ("q", "quit", "Quit App"),
         ("p", "previous_week", "Previous Week"),
         ("n", "next_week", "Next Week"),
-        ("a", "new_event_screen", "New Event")
+        ("a", "new_event_screen", "New Event"),
+        ("m", "month_view", "Month"),
+        ("y", "year_view", "Year"),
+        ("s", "search", "Search"),
+        ("r", "sync", "Sync"),
+        *[Binding(str(i + 1), f"toggle_calendar({i})", "Toggle Calendar", show=False) for i in range(TOGGLE_KEYS)],
     ]
     
-    def __init__(self, ical_path: Path, week_start: datetime) -> None:
-        """Initialize the Week app with calendar path and week start date.
+    def __init__(self, ical_paths: List[Path], week_start: datetime, lazy: bool = False, canvas: bool = False,
+                 remotes: Sequence[CalDavCalendar] = (), feeds: Sequence[Feed] = ()) -> None:
+        """Initialize the Week app with calendar paths and week start date.
         
         Args:
-            ical_path: Path to the ICS calendar file
+            ical_paths: Paths to the ICS calendar files (or SQLite databases), new events are added to the first one
             week_start: Start date of the week (Monday)
+            lazy: only parse the events that are shown, see EventStore.from_path()
+            canvas: paint the week with a WeekCanvas instead of a widget per event
+            remotes: CalDAV calendars, shown after the files from their mirrors (see caldav_sync)
+            feeds: subscribed calendars, shown last from their downloads (see feeds)
         """
         super().__init__()
-        self.ical_path = ical_path
-        self.calendar = Calendar.from_ical(ical_path.read_bytes())
+        self.remotes = list(remotes)
+        self.feeds = list(feeds)
+        self.calendars = CalendarSet.from_paths([*ical_paths, *(remote.path for remote in self.remotes),
+                                                 *(feed.path for feed in self.feeds)], lazy=lazy)
+        # the calendar new events go to
+        self.store = self.calendars.stores[0]
         self.week_start = week_start
+        self.layouts = WeekLayoutCache(self.calendars)
+        self.canvas = canvas
+        self._save_worker: Optional[Worker] = None
+        # only changed on the main thread, so a save requested while the worker finishes isn't lost
+        self._saving = False
+        self._reading_files = False
+        self._syncing = False
+        # the store a batch edit is changing and the worker changing it, see edit_many()
+        self._batch_store: Optional[EventStore] = None
+        self._batch_worker: Optional[Worker] = None
 
     def compose(self) -> ComposeResult:
-        yield WeekGrid(self.calendar, self.week_start)
+        if self.canvas:
+            yield WeekCanvas(self.layouts, self.week_start, id="week")
+        else:
+            yield WeekGrid(self.layouts, self.week_start, id="week")
         yield Header()
         yield Footer()
 
@@ -51,31 +114,360 @@ class Week(App):
             event: The button press event.
         """
         if isinstance(event.button, EventCell):
-            # Create a new EventScreen instance with the event data
-            event_screen = EventScreen(event.button.ical_event, self.calendar, self.ical_path)
-            self.push_screen(event_screen)
+            self.open_event(event.button.event)
+
+    def on_week_canvas_event_selected(self, event: WeekCanvas.EventSelected) -> None:
+        self.open_event(event.event)
+
+    def open_event(self, event: EventRecord) -> None:
+        """Show an event in an EventScreen.
+
+        Args:
+            event: the record of the event
+        """
+        store = self.calendars.store_of(event)
+        event_screen = EventScreen(event, store, store.path)
+        self.push_screen(event_screen)
 
     def on_mount(self) -> None:
         self.theme = "nord"
         # self.title = self.week_start
+        self.prefetch_adjacent_weeks()
+        self.run_worker(self._build_search_index(), group="search")
+        self.set_interval(WATCH_INTERVAL, self.check_files)
+        if self.remotes:
+            self.set_interval(SYNC_INTERVAL, lambda: self.sync(self.remotes, ()))
+        if self.feeds:
+            self.set_interval(FEED_INTERVAL, lambda: self.sync((), self.feeds))
+        if self.remotes or self.feeds:
+            self.action_sync()
+
+    async def _build_search_index(self) -> None:
+        """Build the search index in small steps between other events, so searching is fast right away."""
+        await asyncio.sleep(SEARCH_INDEX_DELAY)
+        for _ in self.calendars.search_index_steps():
+            await asyncio.sleep(0)
 
     def action_next_week(self) -> None:
         """Navigate to the next week."""
         self.week_start += timedelta(days=7)
-        self.refresh(recompose=True)
+        self.query_one("#week").show_week(self.week_start)
+        self.prefetch_adjacent_weeks()
 
     def action_previous_week(self) -> None:
         """Navigate to the previous week."""
         self.week_start -= timedelta(days=7)
-        self.refresh(recompose=True)
+        self.query_one("#week").show_week(self.week_start)
+        self.prefetch_adjacent_weeks()
+
+    def action_month_view(self) -> None:
+        """Show how busy the days of the month of the current week are."""
+        self.push_screen(MonthScreen(self.calendars, self.week_start.date()), callback=self.show_day)
+
+    def action_year_view(self) -> None:
+        """Show how busy the days of the year of the current week are."""
+        self.push_screen(YearScreen(self.calendars, self.week_start.year), callback=self.show_day)
+
+    def action_search(self) -> None:
+        """Search the events and show the week of the one picked."""
+        self.push_screen(SearchScreen(self.calendars), callback=self.show_event_week)
+
+    def show_event_week(self, event: Optional[EventRecord]) -> None:
+        """Show the week of an event picked in the search, if one was picked."""
+        if event is not None:
+            self.show_day(tz.to_date(event.start))
+
+    def action_toggle_calendar(self, index: int) -> None:
+        """Show or hide the calendar with the given index."""
+        if index >= len(self.calendars.stores):
+            return
+        shown = self.calendars.toggle(index)
+        self.notify(f"{self.calendars.names()[index]} {'shown' if shown else 'hidden'}")
+        self.query_one("#week").update_days()
+
+    def show_day(self, day: Optional[date]) -> None:
+        """Show the week of a day picked in the month or year view.
+
+        Args:
+            day: the day, None to stay in the current week
+        """
+        if day is None:
+            return
+        self.week_start = datetime.combine(day - timedelta(days=day.weekday()), datetime.min.time())
+        self.query_one("#week").show_week(self.week_start)
+        self.prefetch_adjacent_weeks()
+
+    def prefetch_adjacent_weeks(self) -> None:
+        """Lay out the previous and next week once the app is idle, so switching to them is fast."""
+        # a new request cancels the one for the week that was left
+        self.run_worker(self._prefetch(self.week_start), group="prefetch", exclusive=True)
+
+    async def _prefetch(self, week_start: datetime) -> None:
+        # runs on the event loop between other events, so it can use the store
+        await asyncio.sleep(PREFETCH_DELAY)
+        for days in (7, -7):
+            self.layouts.get(week_start + timedelta(days=days))
+            await asyncio.sleep(0)
+
+    def check_files(self) -> None:
+        """Merge the changes other programs (e.g. a sync tool) made to the calendar files.
+
+        The files are read in a worker thread. The first check of every file
+        only takes the snapshot that later changes are diffed against, see
+        file_watch. SQLite calendars read the changes other instances made
+        from the database, which only takes a query.
+        """
+        for store in self.calendars.stores:
+            if isinstance(store, SqliteStore) and store is not self._batch_store and store.file_changed():
+                generation = self.calendars.generation
+                spans = store.apply_external_changes()
+                if spans:
+                    self._show_changes(generation, spans, f"{store.path.name} was changed by another instance")
+        if self._saving or self._reading_files or self._batch_store is not None:
+            return
+        stores = [store for store in self.calendars.stores if not isinstance(store, SqliteStore)
+                  and (store.file_snapshot is None or store.file_changed())]
+        if stores:
+            self._reading_files = True
+            self.run_worker(lambda: self._read_files(stores), thread=True, group="watch", exit_on_error=False)
+
+    def _read_files(self, stores: List[EventStore]) -> None:
+        """Diff the files of the stores against their snapshots (runs in a thread)."""
+        try:
+            for store in stores:
+                changes = fw.read_changes(store.path, store.file_stat, store.file_snapshot, keep_mapping=store.lazy)
+                if changes is not None:
+                    self.call_from_thread(self._apply_file_changes, store, changes)
+        except Exception as e:
+            self.call_from_thread(self.notify, f"Error reading calendar: {e}", severity="error")
+        finally:
+            self.call_from_thread(self._files_read)
+
+    def _files_read(self) -> None:
+        self._reading_files = False
+
+    def _apply_file_changes(self, store: EventStore, changes: fw.FileChanges) -> None:
+        # a save that started meanwhile may compact the file or write the journal, try again later
+        if self._saving or changes.base is not store.file_snapshot or changes.loaded != store.file_stat:
+            if changes.source is not None:
+                changes.source.close()
+            return
+        generation = self.calendars.generation
+        spans = store.apply_file_changes(changes)
+        if spans:
+            self._show_changes(generation, spans,
+                               f"{store.path.name} was changed by another program, reloaded {len(changes.events)} events")
+
+    def _show_changes(self, generation: int, spans: List[Tuple[float, float]], message: str) -> None:
+        """Lay out the weeks that changed outside the app again and tell the user.
+
+        Args:
+            generation: the generation of the calendars before the changes
+            spans: start and end of the changed events, see EventStore.apply_file_changes()
+            message: the notification
+        """
+        self.layouts.keep_unchanged(generation, spans)
+        if lh.week_touches(self.week_start, spans):
+            self.query_one("#week").update_days()
+        self.notify(message)
+
+    def action_sync(self) -> None:
+        """Download the changes of the CalDAV calendars and subscribed calendars in the background."""
+        self.sync(self.remotes, self.feeds)
+
+    def sync(self, remotes: Sequence[CalDavCalendar], feeds: Sequence[Feed]) -> None:
+        """Download the changes of some of the remote calendars in the background.
+
+        Args:
+            remotes: the CalDAV calendars to sync
+            feeds: the subscribed calendars to download again
+        """
+        if not self._syncing:
+            self._syncing = True
+            self.sub_title = "Syncing..."
+            self.run_worker(lambda: self._sync(remotes, feeds), thread=True, group="sync", exit_on_error=False)
+
+    def _sync(self, remotes: Sequence[CalDavCalendar], feeds: Sequence[Feed]) -> None:
+        """Sync the CalDAV calendars and download the feeds (runs in a thread).
+
+        The sync state of a calendar is only saved once its changes are in the
+        journal, so changes can't get lost between the two. A changed feed
+        replaces its file, which check_files() merges into the store.
+        """
+        stores = {store.path: store for store in self.calendars.stores}
+        failed = []
+        for remote in remotes:
+            try:
+                events, state = remote.fetch_changes()
+                while not self.call_from_thread(self._apply_remote_changes, remote, stores[remote.path], events):
+                    # a save is running, it may write the same journal
+                    time.sleep(SAVE_DELAY)
+                state.save(remote.state_path)
+            except Exception as e:
+                failed.append(f"{remote.url}: {e}")
+        for feed in feeds:
+            try:
+                # 304 Not Modified: nothing to write or parse
+                if feed.fetch():
+                    while not self.call_from_thread(self._install_feed, feed):
+                        # a save is running, it may compact the same file
+                        time.sleep(SAVE_DELAY)
+            except Exception as e:
+                failed.append(f"{feed.url}: {e}")
+        self.call_from_thread(self._synced, failed)
+
+    def _install_feed(self, feed: Feed) -> bool:
+        if self._saving:
+            return False
+        feed.install()
+        self.check_files()
+        return True
+
+    def _apply_remote_changes(self, remote: CalDavCalendar, store: EventStore, events) -> bool:
+        # the journal is written here, a batch edit of the store is only saved once it is done
+        if self._saving or store is self._batch_store:
+            return False
+        if not events:
+            return True
+        generation = self.calendars.generation
+        spans = store.replace_events(events)
+        entries = store.take_changes()
+        try:
+            store.write_changes(entries)
+        except BaseException:
+            store.return_changes(entries)
+            raise
+        self.layouts.keep_unchanged(generation, spans)
+        if lh.week_touches(self.week_start, spans):
+            self.query_one("#week").update_days()
+        self.notify(f"{remote.url}: {len(events)} events changed")
+        return True
+
+    def _synced(self, failed: List[str]) -> None:
+        self._syncing = False
+        self.sub_title = "Sync failed" if failed else "Synced"
+        for error in failed:
+            self.notify(f"Error syncing {error}", severity="error")
 
     def action_new_event_screen(self):
         """Open the new event screen and handle the returned data."""
-        new_event_screen = BaseEditEventScreen(self.calendar, self.ical_path)
+        new_event_screen = BaseEditEventScreen(self.store, self.store.path)
         self.push_screen(new_event_screen)
         # TODO: maybe find out how to get callbacks to work and do that instead of passing the whole app?
         # self.push_screen(new_event_screen, callback=self._handle_new_event)
 
+    def edit_many(self, store: EventStore, records: List[EventRecord], edit: Callable[[Event], None]) -> bool:
+        """Change many events of a calendar the same way and save them together.
+
+        The events are changed in steps between other events, with the
+        progress in the header, and saved once all of them are changed.
+
+        Args:
+            store: the calendar of the events
+            records: the events (or series masters) to change
+            edit: changes the component of an event in place
+
+        Returns:
+            bool: False if another batch is still running, nothing is changed then
+        """
+        if self._batch_store is not None:
+            return False
+        self._batch_store = store
+        self._batch_worker = self.run_worker(self._edit_many(store, records, edit), group="edit")
+        return True
+
+    async def _edit_many(self, store: EventStore, records: List[EventRecord], edit: Callable[[Event], None]) -> None:
+        try:
+            for done in store.update_many(records, edit):
+                if done < len(records):
+                    self.sub_title = f"Editing {done}/{len(records)}..."
+                await asyncio.sleep(0)
+        finally:
+            self._batch_store = None
+            self.request_save()
+            self.query_one("#week").update_days()
+        self.notify(f"Changed {len(records)} event{'s' if len(records) != 1 else ''}")
+
+    def request_save(self) -> None:
+        """Save the changes made to the calendars in the background.
+
+        Returns immediately; the state of the save is shown in the header.
+        Changes made while a save is running are written by the same worker
+        once it is done with the current ones.
+        """
+        self.sub_title = "Saving..."
+        if not self._saving:
+            self._saving = True
+            self._save_worker = self.run_worker(self._save, thread=True, group="save", exit_on_error=False)
+
+    def _save(self) -> None:
+        """Write the changes of the stores until there are none left (runs in a thread).
+
+        Only the file access happens here; everything that reads or changes a
+        store runs on the main thread through call_from_thread().
+        """
+        time.sleep(SAVE_DELAY)
+        # changes that were taken from their stores but not written yet
+        unsaved: List[Tuple[EventStore, List[Entry]]] = []
+        try:
+            while True:
+                unsaved = self.call_from_thread(self._take_changes)
+                if unsaved is None:
+                    return
+                while unsaved:
+                    store, entries = unsaved[0]
+                    store.write_changes(entries)
+                    unsaved.pop(0)
+                    if store.needs_compaction():
+                        self._compact(store)
+        except Exception as e:
+            self.call_from_thread(self._save_failed, unsaved, e)
+
+    def _compact(self, store: EventStore) -> None:
+        """Fold the journal of a store into its calendar (runs in the save worker)."""
+        parts, placements = self.call_from_thread(store.serialize)
+        try:
+            store.write_calendar(parts)
+        except OSError:
+            # the changes are safe in the journal, compacting is tried again on the next save
+            return
+        self.call_from_thread(store.remap, placements)
+
+    def _take_changes(self) -> Optional[List[Tuple[EventStore, List[Entry]]]]:
+        """Get the changes of every store for the save worker, None if everything is saved."""
+        # a batch edit is saved at once when it is done
+        changes = [(store, entries) for store in self.calendars.stores
+                   if store is not self._batch_store and (entries := store.take_changes())]
+        if not changes:
+            self._saving = False
+            self.sub_title = "Saved"
+            return None
+        return changes
+
+    def _save_failed(self, unsaved: List[Tuple[EventStore, List[Entry]]], error: Exception) -> None:
+        for store, entries in unsaved:
+            store.return_changes(entries)
+        self._saving = False
+        self.sub_title = "Not saved"
+        self.push_screen(ErrorPopup(f"Error saving calendar: {str(error)}"))
+
+    async def action_quit(self) -> None:
+        """Quit the app once all changes are saved."""
+        if self._batch_worker is not None:
+            # a batch edit is saved as a whole, it requests the save when it is done
+            await self._batch_worker.wait()
+        if self._save_worker is not None:
+            await self._save_worker.wait()
+        try:
+            # whatever the worker didn't get to (or failed to write)
+            for store in self.calendars.stores:
+                store.save()
+        except Exception as e:
+            self.sub_title = "Not saved"
+            self.push_screen(ErrorPopup(f"Error saving calendar: {str(e)}"))
+            return
+        self.exit()
+
     def check_action(self, action: str, parameters) -> bool:
         """Disable certain actions when EventScreen or NewEventScreen is active.
         
@@ -86,10 +478,12 @@ class Week(App):
         Returns:
             bool: False if the action should be disabled, True otherwise
         """
+        if action == "sync" and not (self.remotes or self.feeds):
+            return False
         # Disable week navigation when EventScreen or NewEventScreen is active
-        if action in ("next_week", "previous_week", "new_event_screen", "quit"):
+        if action in ("next_week", "previous_week", "new_event_screen", "month_view", "year_view", "search", "quit"):
             # Check if there are any EventScreen or NewEventScreen instances in the screen stack
             for screen in self.screen_stack:
-                if isinstance(screen, (EventScreen, BaseEditEventScreen)):
+                if isinstance(screen, (EventScreen, BaseEditEventScreen, MonthScreen, YearScreen, SearchScreen)):
                     return False
         return super().check_action(action, parameters)
\ No newline at end of file